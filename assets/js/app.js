@@ -12,7 +12,8 @@ import {
   initMap,
   reRenderVisibleSystem,
   reRenderVisible,
-  setBase
+  setBase,
+  setNetworkTilesVisible
 } from './mapLayers.js';
 import {
   fillMetList,
@@ -591,6 +592,14 @@ async function buildUI(){
     });
   }
 
+  const chkNetwork = $('#chkNetwork');
+  if (chkNetwork){
+    chkNetwork.checked = state.showNetwork;
+    chkNetwork.addEventListener('change', async () => {
+      chkNetwork.checked = await setNetworkTilesVisible(chkNetwork.checked);
+    });
+  }
+
   const btnClearAll = $('#btnClearAll');
   if (btnClearAll){
     btnClearAll.addEventListener('click', () => {
@@ -11,6 +11,15 @@ export const PATHS = {
   // Archivo principal de rutas de transporte Wikiroutes
   wrTransporte: 'data/processed/transporte/transporte.json',
 
+  // Trazados y paraderos de todas las rutas empaquetados (wr_build_bundle.py)
+  wrBundle: 'data/processed/transporte/rutas.bin',
+
+  // Trazados simplificados por zoom (wr_build_lod.py)
+  wrLod: 'data/processed/transporte/rutas_lod.bin',
+
+  // Teselas z/x/y de la red completa (build_teselas.py)
+  teselas: 'data/processed/teselas',
+
   // Lista de corredores (metadatos de color y tipo)
   listaCorredores: 'config/lista_corredores.json',
 
@@ -42,6 +51,7 @@ export const state = {
   dir: 'ambas',
   showStops: true,
   autoFit: true,
+  showNetwork: false,
 
   // Catálogo
   catalog: null,
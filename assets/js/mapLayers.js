@@ -1,7 +1,7 @@
 // mapLayers.js
-import { state, getDirFor } from './config.js';
+import { PATHS, state, getDirFor } from './config.js';
 import { $$, uniqueOrder } from './utils.js';
-import { buildWikiroutesLayer } from './parsers.js';
+import { applyWrLod, buildWikiroutesLayer } from './parsers.js';
 
 const MIN_ZOOM = 10;
 const MAX_ZOOM = 19;
@@ -131,6 +131,9 @@ function forceStroke(layer, color){
    =========================== */
 
 const PANES = {
+  // Red completa (teselas) por debajo de todas las rutas seleccionadas
+  network: 'networkPane',
+
   // Wikiroutes (transporte general) se queda en el overlayPane por defecto (zIndex 400)
   alimLine: 'alimLinePane',
   corrLine: 'corrLinePane',
@@ -143,6 +146,8 @@ const PANES = {
 };
 
 const Z = {
+  network: 350,
+
   // overlayPane default ~400. Ponemos capas "prioritarias" por encima.
   alimLine: 430,
   corrLine: 440,
@@ -163,6 +168,7 @@ function ensurePane(map, name, zIndex){
 
 function ensureCustomPanes(){
   const map = state.map;
+  ensurePane(map, PANES.network, Z.network);
   ensurePane(map, PANES.alimLine, Z.alimLine);
   ensurePane(map, PANES.corrLine, Z.corrLine);
   ensurePane(map, PANES.metroLine, Z.metroLine);
@@ -224,6 +230,9 @@ export function initMap(){
 
   L.control.zoom({ position:'bottomright' }).addTo(map);
 
+  // Trazados WR: cambiar de nivel de detalle según el zoom
+  map.on('zoomend', () => applyWrLod(map.getZoom()));
+
   state.map = map;
   state.baseLayers.light = light;
   state.baseLayers.dark  = dark;
@@ -851,6 +860,145 @@ export function reRenderVisibleSystem(sysId){
 
 export function reRenderVisible(){
   ['met','alim','corr','metro','wr'].forEach(reRenderVisibleSystem);
+  if (state.showNetwork) networkLayer?.redraw();
+}
+
+/* ===========================
+   Red completa (teselas de build_teselas.py)
+   =========================== */
+
+// Cada tesela: { extent, l: [{s, r, ids, c, g: [[x,y,...], ...]}], p: [{s, r, ids, c, g: [x,y,...]}] }
+// con coordenadas enteras relativas a la esquina. Solo se piden las teselas de la vista;
+// por encima de zmax se dibuja la tesela padre ampliada.
+
+const NETWORK_CACHE_MAX = 256;
+const networkCache = new Map(); // "z/x/y" -> Promise<tesela | null>
+let networkMeta = null;
+let networkLayer = null;
+
+function fetchTesela(z, x, y){
+  const key = `${z}/${x}/${y}`;
+  let p = networkCache.get(key);
+  if (p){
+    // LRU simple: reinsertar al final
+    networkCache.delete(key);
+    networkCache.set(key, p);
+    return p;
+  }
+  p = fetch(`${PATHS.teselas}/${key}.json`)
+    .then(r => (r.ok ? r.json() : null))
+    .catch(() => null);
+  networkCache.set(key, p);
+  if (networkCache.size > NETWORK_CACHE_MAX){
+    networkCache.delete(networkCache.keys().next().value);
+  }
+  return p;
+}
+
+function drawTesela(canvas, tesela, { scale, offX, offY, zoom }){
+  const ctx = canvas.getContext('2d');
+  const k = (canvas.width / 256) * scale * 256 / (tesela.extent || networkMeta.extent);
+  const ox = offX * canvas.width / 256;
+  const oy = offY * canvas.height / 256;
+  const dpr = canvas.width / 256;
+
+  ctx.lineJoin = 'round';
+  ctx.lineCap = 'round';
+  ctx.lineWidth = (zoom >= 14 ? 2 : zoom >= 12 ? 1.5 : 1) * dpr;
+  ctx.globalAlpha = 0.8;
+  for (const f of tesela.l || []){
+    ctx.strokeStyle = f.c;
+    ctx.beginPath();
+    for (const g of f.g){
+      ctx.moveTo(g[0] * k - ox, g[1] * k - oy);
+      for (let i = 2; i < g.length; i += 2) ctx.lineTo(g[i] * k - ox, g[i + 1] * k - oy);
+    }
+    ctx.stroke();
+  }
+
+  if (!state.showStops) return;
+  const zp = networkMeta.z_paraderos || {};
+  const r = (zoom >= 16 ? 3 : 2) * dpr;
+  ctx.globalAlpha = 1;
+  ctx.lineWidth = dpr;
+  ctx.fillStyle = '#ffffff';
+  for (const f of tesela.p || []){
+    if (zoom < (zp[f.s] ?? networkMeta.zmin)) continue;
+    ctx.strokeStyle = f.c;
+    ctx.beginPath();
+    for (let i = 0; i < f.g.length; i += 2){
+      const x = f.g[i] * k - ox, y = f.g[i + 1] * k - oy;
+      ctx.moveTo(x + r, y);
+      ctx.arc(x, y, r, 0, 2 * Math.PI);
+    }
+    ctx.fill();
+    ctx.stroke();
+  }
+}
+
+const NetworkLayer = L.GridLayer.extend({
+  createTile(coords, done){
+    const tile = L.DomUtil.create('canvas', 'leaflet-tile');
+    const size = this.getTileSize();
+    const dpr = window.devicePixelRatio || 1;
+    tile.width = size.x * dpr;
+    tile.height = size.y * dpr;
+
+    // Overzoom: por encima de zmax se recorta y amplía la tesela padre
+    const dz = Math.max(0, coords.z - networkMeta.zmax);
+    const px = coords.x >> dz, py = coords.y >> dz;
+    const opts = {
+      scale: 2 ** dz,
+      offX: (coords.x - (px << dz)) * 256,
+      offY: (coords.y - (py << dz)) * 256,
+      zoom: coords.z
+    };
+    fetchTesela(coords.z - dz, px, py).then(tesela => {
+      if (tesela) drawTesela(tile, tesela, opts);
+      done(null, tile);
+    });
+    return tile;
+  }
+});
+
+async function loadNetworkMeta(){
+  if (networkMeta) return networkMeta;
+  try {
+    const r = await fetch(`${PATHS.teselas}/meta.json`);
+    networkMeta = r.ok ? await r.json() : null;
+  } catch {
+    networkMeta = null;
+  }
+  return networkMeta;
+}
+
+// Devuelve si la capa quedó visible (false si no hay teselas generadas)
+export async function setNetworkTilesVisible(visible){
+  state.showNetwork = !!visible;
+  if (!state.showNetwork){
+    if (networkLayer) state.map.removeLayer(networkLayer);
+    return false;
+  }
+  if (!networkLayer){
+    const meta = await loadNetworkMeta();
+    if (!meta){
+      console.warn('[teselas] No se encontró meta.json; ejecuta pipeline/scripts/build_teselas.py');
+      state.showNetwork = false;
+      return false;
+    }
+    const [w, s, e, n] = meta.bounds || [];
+    networkLayer = new NetworkLayer({
+      pane: PANES.network,
+      minZoom: meta.zmin,
+      maxZoom: MAX_ZOOM,
+      bounds: meta.bounds ? L.latLngBounds([s, w], [n, e]) : undefined,
+      updateWhenZooming: false,
+      keepBuffer: 1
+    });
+  }
+  // Pudo apagarse mientras se cargaba meta.json
+  if (state.showNetwork) networkLayer.addTo(state.map);
+  return state.showNetwork;
 }
 
 export function setBase(theme){
@@ -1,6 +1,6 @@
 // parsers.js
 import { asLatLng, fetchJSON } from './utils.js';
-import { COLOR_AN, COLOR_AS, COLOR_CORR, state } from './config.js';
+import { COLOR_AN, COLOR_AS, COLOR_CORR, PATHS, state } from './config.js';
 
 /* =========================================
    Catálogo (filter only/exclude)
@@ -656,6 +656,178 @@ function filterGeoJSONByTrip(geojson, trip){
   return pickMultiLineByTrip(geojson, tripNum);
 }
 
+/* =========================================
+   Bundle binario Wikiroutes (rutas.bin)
+   Formato: pipeline/scripts/wikiroutes/wr_build_bundle.py
+   ========================================= */
+const WRB_MAGIC   = 0x31425257;  // 'WRB1' leído como uint32 little-endian
+const WRB_VERSION = 1;
+const WRB_TIPOS   = ['Point', 'LineString'];
+
+// Lee [start, end) con Range; si el servidor no soporta rangos (200),
+// devuelve el archivo entero y se usa ese buffer para todo lo que sigue.
+function wrBundleReader(path){
+  let entero = null;
+  return async (start, end) => {
+    if (!entero) {
+      const r = await fetch(path, { headers: { Range: `bytes=${start}-${end - 1}` } });
+      if (!r.ok) throw new Error(`HTTP ${r.status} - ${path}`);
+      const buf = await r.arrayBuffer();
+      if (r.status === 206) return buf;
+      entero = buf;
+    }
+    return entero.slice(start, end);
+  };
+}
+
+async function openWrBundle(path){
+  const leer = wrBundleReader(path);
+
+  const dv = new DataView(await leer(0, 16));
+  if (dv.getUint32(0, true) !== WRB_MAGIC) throw new Error(`${path} no es un bundle WRB1`);
+  if (dv.getUint32(4, true) !== WRB_VERSION) throw new Error(`${path}: versión no soportada`);
+  const n = dv.getUint32(8, true);
+  const t = dv.getUint32(12, true);
+
+  const finTablas = 16 + t + ((4 - (16 + t) % 4) % 4);
+  const cab = await leer(0, finTablas + 8 * n + 4);
+  const tablas = JSON.parse(new TextDecoder().decode(new Uint8Array(cab, 16, t)));
+
+  return {
+    leer,
+    escala:   tablas.escala,
+    archivos: tablas.archivos,
+    props:    tablas.props.map(p => JSON.parse(p)),
+    ids:      new Uint32Array(cab, finTablas, n),
+    offsets:  new Uint32Array(cab, finTablas + 4 * n, n + 1)
+  };
+}
+
+function decodeWrBundleBlock(bundle, bytes){
+  let pos = 0;
+  const varint = () => {
+    let v = 0, mul = 1, b;
+    do {
+      b = bytes[pos++];
+      v += (b & 0x7F) * mul;
+      mul *= 128;
+    } while (b >= 0x80);
+    return v;
+  };
+  const zz = () => {
+    const v = varint();
+    return (v % 2) ? -(v + 1) / 2 : v / 2;
+  };
+
+  const esc = bundle.escala;
+  const out = new Map();
+  const nArch = varint();
+  for (let a = 0; a < nArch; a++) {
+    const nombre = bundle.archivos[varint()];
+    const nFeat = varint();
+    const features = new Array(nFeat);
+    let x = 0, y = 0;
+    for (let f = 0; f < nFeat; f++) {
+      const tipo = varint();
+      const props = bundle.props[varint()];
+      const nCoords = tipo === 1 ? varint() : 1;
+      const coords = new Array(nCoords);
+      for (let i = 0; i < nCoords; i++) {
+        x += zz();
+        y += zz();
+        coords[i] = [x / esc, y / esc];
+      }
+      features[f] = {
+        type: 'Feature',
+        geometry: { type: WRB_TIPOS[tipo], coordinates: tipo === 1 ? coords : coords[0] },
+        properties: { ...props }
+      };
+    }
+    out.set(nombre, { type: 'FeatureCollection', features });
+  }
+  return out;
+}
+
+// Map nombre de archivo -> FeatureCollection para la carpeta route_<id>,
+// o null si no hay bundle o la ruta no está en él (se cae a los GeoJSON).
+// bundlePath: rutas.bin (GeoJSON completos) o rutas_lod.bin (niveles de detalle).
+export async function readWrBundleRoute(folderPath, bundlePath = PATHS.wrBundle){
+  const m = String(folderPath).match(/route_(\d+)\/?$/);
+  if (!m || !bundlePath) return null;
+
+  const wr = state.systems.wr;
+  if (!wr._bundles) wr._bundles = new Map();
+  if (!wr._bundles.has(bundlePath)) {
+    wr._bundles.set(bundlePath, openWrBundle(bundlePath).catch(e => {
+      console.warn('[WR] Bundle no disponible:', bundlePath, e?.message || e);
+      return null;
+    }));
+  }
+  const bundle = await wr._bundles.get(bundlePath);
+  if (!bundle) return null;
+
+  // Búsqueda binaria del id en la tabla ordenada
+  const id = Number(m[1]);
+  let lo = 0, hi = bundle.ids.length - 1;
+  while (lo <= hi) {
+    const mid = (lo + hi) >> 1;
+    const v = bundle.ids[mid];
+    if (v === id) {
+      const buf = await bundle.leer(bundle.offsets[mid], bundle.offsets[mid + 1]);
+      return decodeWrBundleBlock(bundle, new Uint8Array(buf));
+    }
+    if (v < id) lo = mid + 1; else hi = mid - 1;
+  }
+  return null;
+}
+
+/* =========================================
+   Niveles de detalle de trazados WR
+   ========================================= */
+
+// [{ z, fc }] ordenados por zoom; cada fc tiene las mismas features que full
+function wrLodLevels(lod, lineName, full){
+  if (!lod) return [];
+  const niveles = [];
+  for (const [nombre, fc] of lod) {
+    const m = nombre.match(/^z(\d+)\/(.+)$/);
+    if (!m || m[2] !== lineName) continue;
+    const fixed = fixIfLatLon(fc);
+    if (fixed.features?.length !== full.features?.length) return [];
+    niveles.push({ z: Number(m[1]), fc: fixed });
+  }
+  return niveles.sort((a, b) => a.z - b.z);
+}
+
+// Nivel del menor zoom >= al actual; por encima del último, el trazado completo
+function setWrLodLevel(entry, zoom){
+  if (zoom === undefined || zoom === null) return;
+  const nivel = entry.niveles.find(n => zoom <= n.z);
+  const fc = nivel ? nivel.fc : entry.full;
+  if (fc === entry.actual) return;
+  entry.actual = fc;
+
+  const pos = entry._pos ||= new Map(entry.full.features.map((f, i) => [f, i]));
+  entry.lineLyr.eachLayer(capa => {
+    const geom = fc.features[pos.get(capa.feature)]?.geometry;
+    if (geom?.type === 'LineString' && typeof capa.setLatLngs === 'function') {
+      capa.setLatLngs(geom.coordinates.map(c => [c[1], c[0]]));
+    }
+  });
+}
+
+// Solo las rutas en el mapa; las que vuelven al mapa se ajustan en su evento 'add'.
+// Una entrada cuya capa ya no es la registrada para su id (descartada o reconstruida) se borra.
+export function applyWrLod(zoom){
+  const wr = state.systems.wr;
+  const lod = wr.lod;
+  if (!lod) return;
+  for (const [id, entry] of lod) {
+    if (wr.layers?.get(id) !== entry.group) { lod.delete(id); continue; }
+    if (state.map?.hasLayer(entry.group)) setWrLodLevel(entry, zoom);
+  }
+}
+
 export async function buildWikiroutesLayer(id, folderPath, opts = {}) {
   const color = opts.color || '#00008C';
 
@@ -668,23 +840,24 @@ export async function buildWikiroutesLayer(id, folderPath, opts = {}) {
     trip = null;
   }
 
-  const tryJSON = async (relPath) =>
-    fetchJSON(`${folderPath}/${relPath}`).catch(() => null);
+  // Con bundle, los archivos que no están en él tampoco existen como GeoJSON
+  const fromBundle = await readWrBundleRoute(folderPath).catch(() => null);
+  const tryJSON = async (relPath) => fromBundle
+    ? (fromBundle.get(relPath) ?? null)
+    : fetchJSON(`${folderPath}/${relPath}`).catch(() => null);
 
-  // 1) Trazado
+  // 1) Trazado: preferir el archivo del viaje, si existe; si no, el general
   let lineRaw = null;
+  let lineName = null;
 
-  if (trip) {
-    // Preferir archivos específicos por viaje, si existen
-    lineRaw = await tryJSON(`route_track_trip${trip}.geojson`);
-  }
-
-  if (!lineRaw) {
-    // Fallback a trazado general
-    lineRaw = await tryJSON('route_track.geojson');
-  }
-  if (!lineRaw) {
-    lineRaw = await tryJSON('line_approx.geojson');
+  const lineNames = [
+    ...(trip ? [`route_track_trip${trip}.geojson`] : []),
+    'route_track.geojson',
+    'line_approx.geojson'
+  ];
+  for (const name of lineNames) {
+    lineRaw = await tryJSON(name);
+    if (lineRaw) { lineName = name; break; }
   }
 
   // 2) Paraderos
@@ -737,6 +910,20 @@ export async function buildWikiroutesLayer(id, folderPath, opts = {}) {
       const b = lineLyr.getBounds?.();
       if (b) bounds = bounds ? bounds.extend(b) : b;
     } catch {}
+
+    // Niveles de detalle precalculados (wr_build_lod.py), si hay
+    if (lineName && lineFC === line) {
+      const lod = await readWrBundleRoute(folderPath, PATHS.wrLod).catch(() => null);
+      const niveles = wrLodLevels(lod, lineName, lineFC);
+      if (niveles.length) {
+        const entry = { group, lineLyr, niveles, full: lineFC, actual: lineFC };
+        group.on('add', () => setWrLodLevel(entry, state.map?.getZoom?.()));
+        state.systems.wr.lod ||= new Map();
+        state.systems.wr.lod.set(id, entry);
+      } else {
+        state.systems.wr.lod?.delete(id);
+      }
+    }
   }
 
   if (pts && pts.type === 'FeatureCollection') {
@@ -0,0 +1,286 @@
+"""
+atu_pdf_cache.py
+Caché en disco del texto extraído de los PDFs de la ATU (RUTA_*.pdf),
+compartida por build_lista_rutas_atu.py y comparar_rutas.py.
+
+- Clave: sha1 del contenido del PDF (renombrar o mover el archivo no invalida nada).
+- Un .json.gz por PDF en pipeline/cache/atu_pdf_text/ con el texto por página.
+- La extracción se corta en cuanto `hasta(texto)` es verdadero: se guardan solo
+  las páginas leídas, y si otro script pide más campos se retoma desde ahí.
+- precargar() llena las entradas que faltan en un pool de procesos.
+
+Uso desde los scripts:
+    cache = PdfTextCache()
+    cache.precargar(archivos, hasta=tiene_distritos, jobs=0)
+    texto = cache.texto(path, hasta=tiene_distritos)
+    cache.save()
+
+    python3 pipeline/scripts/atu_pdf_cache.py                       # estado de la caché
+    python3 pipeline/scripts/atu_pdf_cache.py --llenar itinerario --jobs 0
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT      = Path(__file__).resolve().parents[2]
+CACHE_DIR = ROOT / 'pipeline/cache/atu_pdf_text'
+PDF_DIR   = ROOT / 'docs/paraderos_ATU/Actualización del Plan Regulador de Rutas'
+
+CACHE_VERSION = 1
+
+# Campos que buscan los scripts ATU
+ORIGEN_RE  = re.compile(r'DISTRITO DE ORIGEN\s*:\s*(.+)')
+DESTINO_RE = re.compile(r'DISTRITO DE DESTINO\s*:\s*(.+)')
+ITINERARIO_RE = re.compile(
+    r'ITINERARIO IDA\s+ITINERARIO VUELTA\s*\n([\s\S]+?)'
+    r'(?:CARROCERIA|PUNTO INICIAL|LONGITUD|FLOTA|\Z)'
+)
+# Mismo itinerario pero exigiendo el rótulo que lo cierra: sin él, en un texto
+# parcial el \Z de arriba cortaría el itinerario al final de la última página leída
+_ITINERARIO_CERRADO_RE = re.compile(
+    r'ITINERARIO IDA\s+ITINERARIO VUELTA\s*\n[\s\S]+?'
+    r'(?:CARROCERIA|PUNTO INICIAL|LONGITUD|FLOTA)'
+)
+
+
+def tiene_distritos(texto: str) -> bool:
+    """Basta con origen y destino (build_lista_rutas_atu)."""
+    return bool(ORIGEN_RE.search(texto) and DESTINO_RE.search(texto))
+
+
+def tiene_itinerario(texto: str) -> bool:
+    """Origen, destino e itinerario completo (comparar_rutas)."""
+    return tiene_distritos(texto) and bool(_ITINERARIO_CERRADO_RE.search(texto))
+
+
+def unir(paginas: List[str]) -> str:
+    """Mismo texto que `texto += (page.extract_text() or '') + '\\n'`."""
+    return ''.join(p + '\n' for p in paginas)
+
+
+def sha1_archivo(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def extraer(path: Path, hasta: Optional[Callable[[str], bool]] = None,
+            previas: Optional[List[str]] = None) -> Dict:
+    """
+    Extrae páginas de `path` (retomando después de `previas`) hasta que
+    `hasta(texto)` se cumple o se acaban las páginas.
+    """
+    import pdfplumber
+
+    paginas = list(previas or [])
+    with pdfplumber.open(path) as pdf:
+        total = len(pdf.pages)
+        for page in pdf.pages[len(paginas):]:
+            paginas.append(page.extract_text() or '')
+            # Sin flush_cache pdfplumber guarda los objetos de cada página ya leída
+            page.close()
+            if hasta is not None and hasta(unir(paginas)):
+                break
+    return {'version': CACHE_VERSION, 'paginas_total': total, 'paginas': paginas}
+
+
+def _extraer_tarea(args):
+    path, hasta, previas = args
+    try:
+        return extraer(path, hasta, previas), ''
+    except Exception as e:
+        return None, str(e)
+
+
+def _escribir_atomico(destino: Path, datos: bytes) -> None:
+    """
+    Temporal único en la misma carpeta + fsync + os.replace: build_lista_rutas_atu y
+    comparar_rutas corren en paralelo bajo run_pipeline y escriben las mismas entradas.
+    """
+    fd, tmp = tempfile.mkstemp(dir=destino.parent, prefix=destino.name + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, destino)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class PdfTextCache:
+    """
+    Texto de los PDFs ATU por hash de contenido.
+
+    index.json recuerda tamaño/mtime -> sha1 por ruta de archivo para no
+    re-hashear PDFs que no se tocaron.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.dir = Path(cache_dir)
+        self.index_path = self.dir / 'index.json'
+        self.index: Dict[str, List] = {}
+        self._entradas: Dict[str, Dict] = {}
+        self._dirty = False
+        self.extraidos = 0
+        self.reusados = 0
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+            if data.get('version') == CACHE_VERSION:
+                self.index = data.get('files', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def sha1(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.resolve())
+        hit = self.index.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        digest = sha1_archivo(path)
+        self.index[key] = [st.st_size, st.st_mtime_ns, digest]
+        self._dirty = True
+        return digest
+
+    def _archivo(self, digest: str) -> Path:
+        return self.dir / f'{digest}.json.gz'
+
+    def _leer(self, digest: str) -> Optional[Dict]:
+        if digest in self._entradas:
+            return self._entradas[digest]
+        try:
+            with gzip.open(self._archivo(digest), 'rt', encoding='utf-8') as f:
+                entrada = json.load(f)
+        except (FileNotFoundError, OSError, json.JSONDecodeError, EOFError):
+            return None
+        if entrada.get('version') != CACHE_VERSION:
+            return None
+        self._entradas[digest] = entrada
+        return entrada
+
+    def _escribir(self, digest: str, entrada: Dict) -> None:
+        self._entradas[digest] = entrada
+        self.dir.mkdir(parents=True, exist_ok=True)
+        # mtime=0: el mismo texto produce siempre los mismos bytes
+        datos = gzip.compress(json.dumps(entrada, ensure_ascii=False).encode('utf-8'), mtime=0)
+        _escribir_atomico(self._archivo(digest), datos)
+
+    @staticmethod
+    def _suficiente(entrada: Optional[Dict], hasta) -> bool:
+        if entrada is None:
+            return False
+        if len(entrada['paginas']) >= entrada['paginas_total']:
+            return True
+        return hasta is not None and hasta(unir(entrada['paginas']))
+
+    def texto(self, path: Path, hasta: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Texto del PDF como lo armaban los scripts (páginas unidas con '\\n').
+        Con `hasta`, puede ser solo el prefijo de páginas que ya cumple la condición.
+        Propaga la excepción de pdfplumber si el PDF no se puede leer.
+        """
+        path = Path(path)
+        digest = self.sha1(path)
+        entrada = self._leer(digest)
+        if self._suficiente(entrada, hasta):
+            self.reusados += 1
+            return unir(entrada['paginas'])
+        entrada = extraer(path, hasta, entrada['paginas'] if entrada else None)
+        self._escribir(digest, entrada)
+        self.extraidos += 1
+        return unir(entrada['paginas'])
+
+    def precargar(self, paths: List[Path], hasta: Optional[Callable[[str], bool]] = None,
+                  jobs: int = 1) -> None:
+        """
+        Extrae en un pool de procesos los PDFs sin entrada suficiente en la caché.
+        `hasta` tiene que ser una función de módulo (se manda a los procesos).
+        Los errores se ignoran acá: texto() los vuelve a levantar al pedir ese PDF.
+        """
+        jobs = (os.cpu_count() or 1) if jobs <= 0 else jobs
+        if jobs <= 1:
+            return
+        pendientes = []
+        for p in paths:
+            digest = self.sha1(Path(p))
+            entrada = self._leer(digest)
+            if not self._suficiente(entrada, hasta):
+                pendientes.append((digest, Path(p), entrada['paginas'] if entrada else None))
+        if len(pendientes) < 2:
+            return
+        chunksize = max(1, len(pendientes) // (jobs * 4))
+        tareas = [(p, hasta, previas) for _, p, previas in pendientes]
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            for (digest, _, _), (entrada, _err) in zip(pendientes, ex.map(_extraer_tarea, tareas, chunksize=chunksize)):
+                if entrada is not None:
+                    self._escribir(digest, entrada)
+                    self.extraidos += 1
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        # Sumar lo que otro proceso haya guardado mientras tanto (las entradas propias ganan)
+        try:
+            data = json.loads(self.index_path.read_text(encoding='utf-8'))
+            if data.get('version') == CACHE_VERSION:
+                self.index = {**data.get('files', {}), **self.index}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        _escribir_atomico(self.index_path, json.dumps(
+            {'version': CACHE_VERSION, 'files': dict(sorted(self.index.items()))}, ensure_ascii=False
+        ).encode('utf-8'))
+        self._dirty = False
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Caché de texto de los PDFs ATU')
+    ap.add_argument('--dir', type=str, default=str(PDF_DIR), help='Carpeta con los RUTA_*.pdf')
+    ap.add_argument('--llenar', choices=['distritos', 'itinerario', 'todo'],
+                    help='Precarga la caché con lo que necesita cada script (todo = todas las páginas)')
+    ap.add_argument('--jobs', type=int, default=0, help='Procesos para --llenar (0 = todos los núcleos)')
+    args = ap.parse_args()
+
+    cache = PdfTextCache()
+    archivos = sorted(Path(args.dir).glob('RUTA_*.pdf'))
+    if args.llenar:
+        hasta = {'distritos': tiene_distritos, 'itinerario': tiene_itinerario, 'todo': None}[args.llenar]
+        cache.precargar(archivos, hasta, args.jobs)
+        for p in archivos:
+            try:
+                cache.texto(p, hasta)
+            except Exception as e:
+                print(f'  [ERROR] {p.name}: {e}')
+        print(f'Extraídos: {cache.extraidos}  desde caché: {cache.reusados}')
+
+    con, leidas, totales, bytes_gz = 0, 0, 0, 0
+    for p in archivos:
+        digest = cache.sha1(p)
+        entrada = cache._leer(digest)
+        if entrada is None:
+            continue
+        con += 1
+        leidas += len(entrada['paginas'])
+        totales += entrada['paginas_total']
+        bytes_gz += cache._archivo(digest).stat().st_size
+    cache.save()
+    print(f'PDFs: {len(archivos)}  en caché: {con}  páginas leídas: {leidas}/{totales}  '
+          f'tamaño: {bytes_gz / 1024:.0f} KB')
+
+
+if __name__ == '__main__':
+    main()
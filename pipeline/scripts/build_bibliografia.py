@@ -2,7 +2,7 @@ import json
 import csv
 from pathlib import Path
 
-ROOT = Path('/workspaces/limarutas')
+ROOT = Path(__file__).resolve().parents[2]
 
 # --- Configuración ---
 FILTRAR_RANGO_ATU = True   # False para incluir todas las rutas sin filtro
@@ -21,20 +21,16 @@ Produce:
     pipeline/output/lista_rutas_maestro.csv
 """
 
+import argparse
 import csv
 import re
 from pathlib import Path
 
-try:
-    import pdfplumber
-except ImportError:
-    import subprocess, sys
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install',
-                           'pdfplumber', '--break-system-packages', '-q'])
-    import pdfplumber
+from atu_pdf_cache import PdfTextCache, ORIGEN_RE, DESTINO_RE, tiene_distritos
+from empresa_norm import NormalizadorEmpresa, PREFIJOS_ATU
 
 
-ROOT       = Path('/workspaces/limarutas')
+ROOT       = Path(__file__).resolve().parents[2]
 PDF_DIR    = ROOT / 'docs/paraderos_ATU/Actualización del Plan Regulador de Rutas'
 WIKI_CSV   = ROOT / 'pipeline/output/lista_rutas_nuevas.csv'
 OUT_CSV    = ROOT / 'pipeline/output/lista_rutas_maestro.csv'
@@ -507,103 +503,15 @@ PRR_EMPRESAS = {
 }
 
 
-# ── Normalización de empresa (misma lógica que scrap_wikipedia_rutas.py) ──────
-
-PREFIJOS = [
-    r'Corporaci[oó]n Empresa de Transportes Urbano',
-    r'Corporaci[oó]n Inversiones',
-    r'Corporaci[oó]n',
-    r'Cooperativa de Servicios Especiales Transportes',
-    r'Cooperativa de Transportes',
-    r'Cooperativa de Transporte',
-    r'Comunicaci[oó]n Integral Turismo e Inversiones',
-    r'Agrupaci[oó]n de Transportistas en Camionetas\s+S\.?A\.?C?\.?',
-    r'Agrupaci[oó]n de Transportistas en Camionetas',
-    r'Empresa de Servicios y Transportes',
-    r'Empresa de Servicios de Transportes',
-    r'Empresa de Servicios de Transporte',
-    r'Empresa de Servicios M[uú]ltiples',
-    r'Empresa de Servicio Especial de Transporte',
-    r'Empresa de Transportes,?\s+Servicios,?\s+Comercializadora,.+',
-    r'Empresa de Transportes,?\s+Inversiones y Servicios',
-    r'Empresa de Transporte,?\s+Servicios\s+y\s+Comercializaci[oó]n',
-    r'Empresa de Transporte\s+de\s+Servicio\s+de\s+Transportes',
-    r'Empresa de Transporte\s+de\s+Servicio',
-    r'Empresa de Transporte\s+y\s+Turismos?\s+Especiales',
-    r'Empresa de Transporte\s+y\s+Turismos?',
-    r'Empresa de Transportes y Servicios M[uú]ltiples',
-    r'Empresa de Transportes y Servicios',
-    r'Empresa de Transportes',
-    r'Empresa de Transporte y Servicios',
-    r'Empresa de Transporte',
-    r'Empresa Business Corporation',
-    r'Empresa Modelo de Transportes',
-    r'Empresa',
-    r'Grupo Express del Per[uú]\s+S\.?A\.?C?\.?',
-    r'Grupo',
-    r'Multiservicios de Buses de',
-    r'Multiservicios e Inversiones',
-    r'Inversiones\s+Empresariales',
-    r'Inversiones y Servicios M[uú]ltiples',
-    r'Inversiones y Servicios',
-    r'Inversiones\s+Empresa\s+de\s+Transportes',
-    r'Servicios Generales y Transportes',
-    r'Servicio Interconectado de Transporte',
-    r'Transportes e Inversiones',
-    r'Transportes y Servicios M[uú]ltiples',
-    r'Transportes y Servicios',
-    r'Transportes,?\s+Inversiones y Servicios',
-    r'Transportes',
-    r'Trans\.',
-    r'y\s+Representaciones',
-    r'y\s+Multiservicios',
-    r'y\s+Service\b',
-    r'e\s+Inversiones\s+M[uú]ltiples',
-    r'y\s+Turismos?\b',
-    r'de\s+Multiservicios',
-    r'de\s+Servicio\s+R[aá]pido',
-    r'de\s+Servicio\s+Urbano',
-    r'de\s+Servicios\s+Urbanos',
-    r'de\s+Transportes?,\s+Servicios.+',
-    r'de\s+Transportes?,\s+Inversiones.+',
-    r'de\s+Transporte,\s+Servicios.+',
-]
-
-SUFIJOS_JURIDICOS = re.compile(
-    r'\s*\b(S\.A\.C\.|S\.A\.|S\.A\b|E\.I\.R\.L\.|EIRL|Ltda\.|Ltda|S\.R\.L\.)\s*$',
-    re.IGNORECASE
-)
-
-INICIO_RESIDUAL = re.compile(
-    r'^(del?\s+|de\s+los\s+|de\s+las\s+|y\s+|e\s+)',
-    re.IGNORECASE
-)
+# ── Normalización de empresa (compartida con scrap_wikipedia_rutas.py) ───────
 
-
-def extraer_abrev(texto):
-    m = re.search(r'\(([A-Z][A-Z0-9\s\-]{0,14})\)\s*$', texto)
-    return m.group(1).strip() if m else ''
+_EMPRESA = NormalizadorEmpresa(PREFIJOS_ATU)
 
 
 def limpiar_empresa(texto_raw):
     if not texto_raw or texto_raw.strip() in ('', 'Desconocido'):
         return 'Desconocido', ''
-    texto = texto_raw.strip().split('/')[0].strip()
-    texto = re.sub(r'\s*\([^)]{16,}\)', '', texto).strip()
-    abrev = extraer_abrev(texto)
-    texto = re.sub(r'\s*\([A-Z][A-Z0-9\s\-]{0,14}\)\s*$', '', texto).strip()
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-    for prefijo in PREFIJOS:
-        nuevo = re.sub(r'^\s*' + prefijo + r'\s*', '', texto, flags=re.IGNORECASE)
-        if nuevo != texto:
-            texto = nuevo.strip()
-            break
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-    texto = INICIO_RESIDUAL.sub('', texto).strip()
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-    if not texto and abrev:
-        return abrev, abrev
-    return (texto if texto else 'Desconocido'), abrev
+    return _EMPRESA.limpiar(texto_raw.strip())
 
 
 # Normalizar PRR_EMPRESAS al cargarse
@@ -640,7 +548,7 @@ def color_placeholder(codigo_nuevo):
 
 
 
-def leer_pdf(filepath):
+def leer_pdf(filepath, cache):
     """Extrae cod_antiguo, cod_nuevo, origen, destino desde un PDF suelto."""
     filepath = Path(filepath)
     m = PDF_PATTERN.search(filepath.name)
@@ -650,10 +558,7 @@ def leer_pdf(filepath):
     cod_nuevo   = m.group(2)
 
     try:
-        texto = ''
-        with pdfplumber.open(filepath) as pdf:
-            for page in pdf.pages:
-                texto += (page.extract_text() or '') + '\n'
+        texto = cache.texto(filepath, hasta=tiene_distritos)
     except Exception:
         return {
             'codigo_antiguo':    cod_antiguo,
@@ -667,8 +572,8 @@ def leer_pdf(filepath):
             'fuente':            'atu_zip_error',
         }
 
-    origen  = re.search(r'DISTRITO DE ORIGEN\s*:\s*(.+)',  texto)
-    destino = re.search(r'DISTRITO DE DESTINO\s*:\s*(.+)', texto)
+    origen  = ORIGEN_RE.search(texto)
+    destino = DESTINO_RE.search(texto)
 
     return {
         'codigo_antiguo':    cod_antiguo,
@@ -686,6 +591,11 @@ def leer_pdf(filepath):
 # ── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
+    ap = argparse.ArgumentParser(description='Construye lista_rutas_maestro.csv (Wikipedia + PDFs ATU)')
+    ap.add_argument('--jobs', type=int, default=0,
+                    help='Procesos para extraer los PDFs que no están en caché (0 = todos los núcleos)')
+    args = ap.parse_args()
+
     # 1. Cargar Wikipedia (fuente principal)
     wiki = {}
     with open(WIKI_CSV, encoding='utf-8') as f:
@@ -699,8 +609,10 @@ def main():
     atu = {}
     archivos = sorted(PDF_DIR.glob('RUTA_*.pdf'))
     print(f'PDFs encontrados: {len(archivos)}')
+    cache = PdfTextCache()
+    cache.precargar(archivos, hasta=tiene_distritos, jobs=args.jobs)
     for filepath in archivos:
-        row = leer_pdf(filepath)
+        row = leer_pdf(filepath, cache)
         if row:
             cod = row['codigo_nuevo']
             if cod not in atu:
@@ -708,6 +620,8 @@ def main():
             print(f'  {cod} ({row["codigo_antiguo"]}) [{row["fuente"]}] '
                   f'| {row["distrito_origen"]} -> {row["distrito_destino"]}')
 
+    cache.save()
+    print(f'Texto de PDFs: {cache.extraidos} extraídos, {cache.reusados} desde caché')
     print(f'\nRutas desde ATU zip:    {len(atu)}')
 
     # 3. Fusionar: Wikipedia gana, ATU zip como fallback
@@ -0,0 +1,554 @@
+"""
+build_teselas.py
+Corta la red completa en teselas z/x/y estáticas para la vista "Red completa"
+del mapa: trazados y paraderos de WikiRoutes, Metro, Metropolitano
+(troncales y alimentadores) y corredores.
+
+Cada tesela es un JSON en data/processed/teselas/{z}/{x}/{y}.json:
+
+    {"extent": 4096,
+     "l": [{"s": sistema, "r": ruta, "ids": [...], "c": "#rrggbb", "g": [[x, y, x, y, ...], ...]}],
+     "p": [{"s": sistema, "r": ruta, "ids": [...], "c": "#rrggbb", "g": [x, y, x, y, ...]}]}
+
+con coordenadas enteras relativas a la esquina de la tesela (0..extent, con
+un margen de BUFFER para que los trazos no se corten en el borde). Las líneas
+se simplifican por zoom (Douglas-Peucker, TOLERANCIA_PX) con los mismos pesos
+que wr_build_lod.py.
+
+Incremental: cada "unidad" (una carpeta route_* o un archivo de sistema) se
+hashea con sus archivos y metadatos. Solo se recortan las unidades que
+cambiaron y solo se reescriben las teselas que tocan (antes o ahora),
+reemplazando en ellas las features de esas unidades; los fragmentos de cada
+unidad quedan en pipeline/cache/teselas/ para rearmar teselas perdidas.
+
+Uso:
+    python3 pipeline/scripts/build_teselas.py
+    python3 pipeline/scripts/build_teselas.py --completo   # ignora la caché
+    python3 pipeline/scripts/build_teselas.py --bench      # corpus completo en una carpeta temporal
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'wikiroutes'))
+from wr_build_lod import pesos_dp  # noqa: E402
+
+
+ROOT        = Path(__file__).resolve().parents[2]
+TRANSPORTE  = ROOT / 'data/processed/transporte'
+WR_MAP      = ROOT / 'pipeline/output/wr_map.json'
+METRO       = ROOT / 'data/processed/metro/metro.geojson'
+CORREDORES  = ROOT / 'data/processed/corredores/corredores.json'
+ALIM        = ROOT / 'data/processed/metropolitano/alimentadores.json'
+MET_STOPS   = ROOT / 'data/processed/metropolitano/metropolitano_stops.json'
+MET_SVCS    = ROOT / 'data/processed/metropolitano/metropolitano_services.json'
+OUT_DIR     = ROOT / 'data/processed/teselas'
+CACHE_DIR   = ROOT / 'pipeline/cache/teselas'
+
+TESELAS_VERSION = 1
+Z_MIN, Z_MAX    = 10, 15
+EXTENT          = 4096
+BUFFER          = 128            # en unidades de extent
+TOLERANCIA_PX   = 0.5
+Z_PARADEROS     = {'wr': 14}     # zoom mínimo con paraderos; el resto de sistemas desde Z_PARADEROS_OTROS
+Z_PARADEROS_OTROS = 12
+
+# Mismos colores que assets/js/config.js
+COLOR_WR   = '#00008C'
+COLOR_AN   = '#FF4500'
+COLOR_AS   = '#FFCD00'
+COLOR_MET  = '#0ea5e9'
+COLOR_CORR = {'1': '#ffc928', '2': '#e4002b', '3': '#003594', '4': '#662d91', '5': '#00843d'}
+COLOR_CORR_DEF = '#10b981'
+
+PARAMS = json.dumps([TESELAS_VERSION, Z_MIN, Z_MAX, EXTENT, BUFFER, TOLERANCIA_PX,
+                     Z_PARADEROS, Z_PARADEROS_OTROS])
+
+
+# ── Proyección ───────────────────────────────────────────────────────────────
+
+def mercator(coords) -> np.ndarray:
+    """lon/lat -> Web Mercator normalizado a [0, 1) (x hacia el este, y hacia el sur)."""
+    ll = np.asarray(coords, dtype=float)[:, :2]
+    lat = np.radians(np.clip(ll[:, 1], -85.0511, 85.0511))
+    x = (ll[:, 0] + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0
+    return np.column_stack((x, y))
+
+
+def tesela_bounds(z, x, y):
+    """(oeste, sur, este, norte) en grados."""
+    n = 2 ** z
+    lat = lambda t: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+# ── Elementos de cada sistema ────────────────────────────────────────────────
+#
+# Un elemento es (tipo, sistema, ruta, ids, color, coords) con tipo 'l' o 'p';
+# para 'p', coords es la lista de puntos de esa ruta.
+
+def _leer_json(path):
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+def _partes(geom):
+    t = (geom or {}).get('type')
+    if t == 'LineString':
+        return [geom['coordinates']]
+    if t == 'MultiLineString':
+        return list(geom['coordinates'])
+    return []
+
+
+def ids_wr(wr_map_path=WR_MAP):
+    """{carpeta: {viaje: [(id, color)]}} desde wr_map.json; viaje None = todos."""
+    out = defaultdict(lambda: defaultdict(list))
+    if not Path(wr_map_path).exists():
+        return out
+    for rid, conf in (_leer_json(wr_map_path).get('routes') or {}).items():
+        carpeta = Path(conf.get('folder') or f'route_{rid}').name
+        trip = conf.get('trip')
+        out[carpeta][int(trip) if trip not in (None, '') else None].append((rid, conf.get('color') or COLOR_WR))
+    return out
+
+
+def elementos_wr(carpeta: Path, por_viaje):
+    elems = []
+    tracks = sorted(carpeta.glob('route_track*.geojson'))
+    for path in tracks:
+        sufijo = path.stem[len('route_track'):]            # '_trip2' o ''
+        trip = int(sufijo[5:]) if sufijo.startswith('_trip') and sufijo[5:].isdigit() else None
+        refs = por_viaje.get(trip, []) + (por_viaje.get(None, []) if trip is not None else [])
+        ids = sorted({r for r, _ in refs})
+        color = refs[0][1] if refs else COLOR_WR
+        ruta = carpeta.name.replace('route_', '') + (f'/{trip}' if trip else '')
+        for f in _leer_json(path).get('features') or []:
+            for parte in _partes(f.get('geometry')):
+                if len(parte) >= 2:
+                    elems.append(('l', 'wr', ruta, ids, color, parte))
+        stops = carpeta / (f'stops{sufijo}.geojson' if sufijo else 'stops_from_map.geojson')
+        if stops.exists():
+            pts = [f['geometry']['coordinates'] for f in _leer_json(stops).get('features') or []
+                   if (f.get('geometry') or {}).get('type') == 'Point']
+            if pts:
+                elems.append(('p', 'wr', ruta, ids, color, pts))
+    return elems
+
+
+def _color_corr(ref, props):
+    return COLOR_CORR.get(str(ref)[:1]) or props.get('stroke') or props.get('color') or COLOR_CORR_DEF
+
+
+def _color_alim(ref, props):
+    return props.get('stroke') or (COLOR_AN if str(ref).upper().startswith('AN') else COLOR_AS)
+
+
+def _color_metro(ref, props):
+    return props.get('stroke') or props.get('marker-color') or COLOR_MET
+
+
+def elementos_fc(path, sistema, color_de):
+    """metro / corredores / alimentadores: features con ref, líneas y paradas."""
+    elems = []
+    puntos = defaultdict(list)
+    for f in _leer_json(path).get('features') or []:
+        p = f.get('properties') or {}
+        ref = str(p.get('ref_norm') or p.get('ref') or p.get('route_ref') or '').upper()
+        geom = f.get('geometry') or {}
+        if geom.get('type') == 'Point':
+            puntos[ref].append((geom['coordinates'], color_de(ref, p)))
+            continue
+        for parte in _partes(geom):
+            if len(parte) >= 2:
+                elems.append(('l', sistema, ref, [ref] if ref else [], color_de(ref, p), parte))
+    for ref, pts in sorted(puntos.items()):
+        elems.append(('p', sistema, ref, [ref] if ref else [], pts[0][1], [c for c, _ in pts]))
+    return elems
+
+
+def elementos_met(stops_path=MET_STOPS, svcs_path=MET_SVCS):
+    """Troncales: polilínea por las estaciones de cada servicio (como renderService)."""
+    estaciones = {s['id']: s for s in _leer_json(stops_path).get('stations') or []}
+    svcs = _leer_json(svcs_path)
+    colores = svcs.get('colors') or {}
+    elems = []
+    for s in svcs.get('services') or []:
+        coords = [[estaciones[i]['lon'], estaciones[i]['lat']] for i in s.get('stops') or [] if i in estaciones]
+        color = colores.get(str(s['id'])) or COLOR_MET
+        if len(coords) >= 2:
+            elems.append(('l', 'met', str(s['id']), [str(s['id'])], color, coords))
+    pts = [[e['lon'], e['lat']] for e in estaciones.values()]
+    if pts:
+        elems.append(('p', 'met', '', [], COLOR_MET, pts))
+    return elems
+
+
+class Unidad:
+    """Lo que se recorta y cachea junto: una carpeta route_* o un archivo de sistema."""
+
+    def __init__(self, clave, archivos, extra, cargar):
+        self.clave = clave
+        self.archivos = archivos
+        self.extra = extra
+        self.cargar = cargar
+
+
+def unidades(transporte=TRANSPORTE, wr_map_path=WR_MAP):
+    out = []
+    refs = ids_wr(wr_map_path)
+    for carpeta in sorted(p for p in Path(transporte).glob('route_*') if p.is_dir()):
+        archivos = sorted(carpeta.glob('*.geojson'))
+        if not archivos:
+            continue
+        por_viaje = {k: sorted(v) for k, v in refs.get(carpeta.name, {}).items()}
+        extra = json.dumps(sorted(por_viaje.items(), key=lambda kv: (kv[0] is None, kv[0] or 0)))
+        out.append(Unidad(f'wr/{carpeta.name}', archivos, extra,
+                          lambda c=carpeta, pv=por_viaje: elementos_wr(c, pv)))
+    for path, sistema, color_de in ((METRO, 'metro', _color_metro), (CORREDORES, 'corr', _color_corr),
+                                    (ALIM, 'alim', _color_alim)):
+        if path.exists():
+            out.append(Unidad(sistema, [path], '', lambda p=path, s=sistema, c=color_de: elementos_fc(p, s, c)))
+    if MET_STOPS.exists() and MET_SVCS.exists():
+        out.append(Unidad('met', [MET_STOPS, MET_SVCS], '', elementos_met))
+    return out
+
+
+# ── Recorte ──────────────────────────────────────────────────────────────────
+
+def _local(pts: np.ndarray, tx: int, ty: int) -> list:
+    return np.rint((pts - (tx, ty)) * EXTENT).astype(np.int64).ravel().tolist()
+
+
+def cortar_linea(m: np.ndarray, pesos: np.ndarray, z: int, destino: dict, feat_de) -> None:
+    """
+    Reparte la polilínea (mercator, ya con pesos DP) entre las teselas de zoom z
+    cuyo recuadro con margen toca cada segmento. Tramos consecutivos en una
+    misma tesela quedan en una sola polilínea.
+    """
+    pts = m[pesos > TOLERANCIA_PX / (256 * 2 ** z)] * (2 ** z)
+    if len(pts) < 2:
+        return
+    buf = BUFFER / EXTENT
+    a, b = pts[:-1], pts[1:]
+    x0 = np.floor(np.minimum(a[:, 0], b[:, 0]) - buf).astype(np.int64)
+    x1 = np.floor(np.maximum(a[:, 0], b[:, 0]) + buf).astype(np.int64)
+    y0 = np.floor(np.minimum(a[:, 1], b[:, 1]) - buf).astype(np.int64)
+    y1 = np.floor(np.maximum(a[:, 1], b[:, 1]) + buf).astype(np.int64)
+    nx, ny = x1 - x0 + 1, y1 - y0 + 1
+    cuantos = nx * ny
+    seg = np.repeat(np.arange(len(a)), cuantos)
+    k = np.arange(int(cuantos.sum())) - np.repeat(np.cumsum(cuantos) - cuantos, cuantos)
+    tx = x0[seg] + k % nx[seg]
+    ty = y0[seg] + k // nx[seg]
+
+    orden = np.lexsort((seg, ty, tx))
+    seg, tx, ty = seg[orden], tx[orden], ty[orden]
+    nuevo = np.ones(len(seg), dtype=bool)
+    nuevo[1:] = (tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1]) | (seg[1:] != seg[:-1] + 1)
+    ini = np.flatnonzero(nuevo)
+    fin = np.append(ini[1:], len(seg)) - 1
+
+    # Cada tramo: los puntos de inicio de sus segmentos más el final del último;
+    # todos los tramos van juntos en un arreglo y se cortan al final
+    tramo = np.cumsum(nuevo) - 1
+    total = len(seg) + len(ini)
+    punto = np.empty(total, dtype=np.int64)
+    origen = np.empty((total, 2), dtype=np.int64)
+    punto[np.arange(len(seg)) + tramo] = seg
+    origen[np.arange(len(seg)) + tramo] = np.column_stack((tx, ty))
+    punto[fin + np.arange(len(ini)) + 1] = seg[fin] + 1
+    origen[fin + np.arange(len(ini)) + 1] = np.column_stack((tx[ini], ty[ini]))
+    plano = np.rint((pts[punto] - origen) * EXTENT).astype(np.int64).ravel().tolist()
+
+    limites = 2 * (np.append(ini, len(seg)) + np.arange(len(ini) + 1))
+    for r, (x, y) in enumerate(zip(tx[ini].tolist(), ty[ini].tolist())):
+        feat_de(destino.setdefault(f'{z}/{x}/{y}', {'l': [], 'p': []}), 'l')['g'].append(
+            plano[limites[r]:limites[r + 1]])
+
+
+def cortar_puntos(m: np.ndarray, z: int, destino: dict, feat_de) -> None:
+    pts = m * (2 ** z)
+    buf = BUFFER / EXTENT
+    por_tesela = defaultdict(list)
+    for p in pts:
+        for tx in range(int(math.floor(p[0] - buf)), int(math.floor(p[0] + buf)) + 1):
+            for ty in range(int(math.floor(p[1] - buf)), int(math.floor(p[1] + buf)) + 1):
+                por_tesela[(tx, ty)].append(p)
+    for (tx, ty), ps in por_tesela.items():
+        clave = f'{z}/{tx}/{ty}'
+        feat_de(destino.setdefault(clave, {'l': [], 'p': []}), 'p')['g'].extend(
+            _local(np.asarray(ps), tx, ty))
+
+
+def fragmentos(unidad: Unidad) -> dict:
+    """{"z/x/y": {"l": [...], "p": [...]}} de una unidad."""
+    destino = {}
+    for tipo, sistema, ruta, ids, color, coords in unidad.cargar():
+        props = {'s': sistema, 'r': ruta, 'ids': ids, 'c': color}
+        # Una feature por elemento y tesela; se crea al primer tramo que cae ahí
+        memo = {}
+
+        def feat_de(tesela, capa, props=props, memo=memo):
+            f = memo.get((id(tesela), capa))
+            if f is None:
+                f = memo[(id(tesela), capa)] = dict(props, g=[])
+                tesela[capa].append(f)
+            return f
+
+        m = mercator(coords)
+        if tipo == 'l':
+            pesos = pesos_dp(m) if len(m) > 2 else np.full(len(m), np.inf)
+            for z in range(Z_MIN, Z_MAX + 1):
+                cortar_linea(m, pesos, z, destino, feat_de)
+        else:
+            for z in range(max(Z_MIN, Z_PARADEROS.get(sistema, Z_PARADEROS_OTROS)), Z_MAX + 1):
+                cortar_puntos(m, z, destino, feat_de)
+    return destino
+
+
+# ── Caché incremental ────────────────────────────────────────────────────────
+
+class Cache:
+    """manifest.json (hash y teselas de cada unidad) + un .json.gz de fragmentos por unidad."""
+
+    def __init__(self, cache_dir: Path):
+        self.dir = Path(cache_dir)
+        self.manifest_path = self.dir / 'manifest.json'
+        self.archivos = {}       # ruta -> [size, mtime_ns, sha1]
+        self.unidades = {}       # clave -> {"hash": ..., "teselas": [...]}
+        self.huerfanas = set()   # teselas de una caché con otros parámetros: se reescriben o borran
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding='utf-8'))
+            if data.get('params') == PARAMS:
+                self.archivos = data.get('archivos', {})
+                self.unidades = data.get('unidades', {})
+            else:
+                self.huerfanas = {t for info in data.get('unidades', {}).values() for t in info['teselas']}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        self._frag = {}
+
+    def sha1_archivo(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path)
+        hit = self.archivos.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        digest = hashlib.sha1(path.read_bytes()).hexdigest()
+        self.archivos[key] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def hash_unidad(self, u: Unidad) -> str:
+        h = hashlib.sha1(PARAMS.encode('utf-8'))
+        h.update(u.extra.encode('utf-8'))
+        for p in u.archivos:
+            h.update(p.name.encode('utf-8'))
+            h.update(self.sha1_archivo(p).encode('ascii'))
+        return h.hexdigest()
+
+    def _archivo(self, clave: str) -> Path:
+        return self.dir / 'frag' / (clave.replace('/', '__') + '.json.gz')
+
+    def frag(self, clave: str) -> dict:
+        if clave not in self._frag:
+            with gzip.open(self._archivo(clave), 'rt', encoding='utf-8') as f:
+                self._frag[clave] = json.load(f)
+        return self._frag[clave]
+
+    def guardar_frag(self, clave: str, frag: dict) -> None:
+        self._frag[clave] = frag
+        path = self._archivo(clave)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.GzipFile(path, 'wb', mtime=0) as f:
+            f.write(json.dumps(frag, separators=(',', ':')).encode('utf-8'))
+
+    def borrar_frag(self, clave: str) -> None:
+        self._frag.pop(clave, None)
+        self._archivo(clave).unlink(missing_ok=True)
+
+    def save(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_name(self.manifest_path.name + '.tmp')
+        tmp.write_text(json.dumps({'params': PARAMS, 'archivos': self.archivos, 'unidades': self.unidades},
+                                  separators=(',', ':')), encoding='utf-8')
+        os.replace(tmp, self.manifest_path)
+
+
+def _unidad_de(feat: dict) -> str:
+    """Clave de la unidad que produjo una feature (ver unidades())."""
+    if feat['s'] == 'wr':
+        return 'wr/route_' + feat['r'].split('/')[0]
+    return feat['s']
+
+
+def escribir_tesela(out_dir: Path, clave: str, contenido: dict) -> int:
+    path = out_dir / f'{clave}.json'
+    if not contenido['l'] and not contenido['p']:
+        path.unlink(missing_ok=True)
+        return 0
+    data = json.dumps({'extent': EXTENT, **contenido}, ensure_ascii=False, separators=(',', ':'))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(data, encoding='utf-8')
+    return len(data.encode('utf-8'))
+
+
+def build(out_dir=OUT_DIR, cache_dir=CACHE_DIR, completo=False, forzar=(), transporte=TRANSPORTE,
+          wr_map_path=WR_MAP, verbose=True) -> dict:
+    t0 = time.perf_counter()
+    cache = Cache(cache_dir)
+    previas = dict(cache.unidades)
+
+    lista = unidades(transporte, wr_map_path)
+    hashes = {u.clave: cache.hash_unidad(u) for u in lista}
+    t_hash = time.perf_counter() - t0
+
+    # Unidades nuevas o cambiadas: recortar de nuevo. Sin meta.json la salida
+    # se da por perdida y se reescriben todas las teselas desde la caché
+    out_dir = Path(out_dir)
+    afectadas = set(cache.huerfanas)
+    if not (out_dir / 'meta.json').exists():
+        afectadas.update(t for info in previas.values() for t in info['teselas'])
+    tocadas = set()
+    cambiadas = 0
+    for u in lista:
+        prev = previas.get(u.clave)
+        if prev and prev['hash'] == hashes[u.clave] and not completo and u.clave not in forzar:
+            continue
+        frag = fragmentos(u)
+        cache.guardar_frag(u.clave, frag)
+        cache.unidades[u.clave] = {'hash': hashes[u.clave], 'teselas': sorted(frag)}
+        afectadas.update(frag)
+        if prev:
+            afectadas.update(prev['teselas'])
+        tocadas.add(u.clave)
+        cambiadas += 1
+    # Unidades que ya no existen
+    vigentes = set(hashes)
+    for clave in [c for c in cache.unidades if c not in vigentes]:
+        afectadas.update(cache.unidades.pop(clave)['teselas'])
+        cache.borrar_frag(clave)
+        tocadas.add(clave)
+    t_cortar = time.perf_counter() - t0 - t_hash
+
+    # Teselas afectadas: si la tesela ya existe se quitan las features de las
+    # unidades tocadas y se insertan sus fragmentos nuevos; si no, se arma con
+    # los fragmentos de todas las unidades que la tocan
+    por_tesela = defaultdict(list)
+    for clave, info in cache.unidades.items():
+        for t in info['teselas']:
+            if t in afectadas:
+                por_tesela[t].append(clave)
+    escritas = bytes_escritos = 0
+    for t in sorted(afectadas):
+        path = out_dir / f'{t}.json'
+        previa = None
+        if t not in cache.huerfanas and path.exists():
+            previa = _leer_json(path)
+        if previa is not None:
+            contenido = {capa: [f for f in previa.get(capa, []) if _unidad_de(f) not in tocadas]
+                         for capa in ('l', 'p')}
+            fuentes = sorted(c for c in por_tesela.get(t, ()) if c in tocadas)
+        else:
+            contenido = {'l': [], 'p': []}
+            fuentes = sorted(por_tesela.get(t, ()))
+        for clave in fuentes:
+            parte = cache.frag(clave).get(t)
+            if parte:
+                contenido['l'].extend(parte['l'])
+                contenido['p'].extend(parte['p'])
+        if previa is not None:
+            # Mismo orden que una construcción completa (estable dentro de cada unidad)
+            for capa in ('l', 'p'):
+                contenido[capa].sort(key=_unidad_de)
+        bytes_escritos += escribir_tesela(out_dir, t, contenido)
+        escritas += 1
+
+    total = {t for info in cache.unidades.values() for t in info['teselas']}
+    meta = {'version': TESELAS_VERSION, 'zmin': Z_MIN, 'zmax': Z_MAX, 'extent': EXTENT,
+            'z_paraderos': {**{s: Z_PARADEROS_OTROS for s in ('metro', 'corr', 'alim', 'met')}, **Z_PARADEROS},
+            'teselas': len(total)}
+    # Recuadro con datos (teselas de Z_MAX) para que el mapa no pida teselas fuera de él
+    xy = [tuple(map(int, t.split('/')[1:])) for t in total if t.startswith(f'{Z_MAX}/')]
+    if xy:
+        oeste, sur, _, _ = tesela_bounds(Z_MAX, min(x for x, _ in xy), max(y for _, y in xy))
+        _, _, este, norte = tesela_bounds(Z_MAX, max(x for x, _ in xy), min(y for _, y in xy))
+        meta['bounds'] = [round(v, 6) for v in (oeste, sur, este, norte)]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+    cache.save()
+
+    info = {'unidades': len(lista), 'cambiadas': cambiadas, 'teselas': len(total), 'escritas': escritas,
+            'bytes_escritos': bytes_escritos, 't_hash': t_hash, 't_cortar': t_cortar,
+            't_total': time.perf_counter() - t0}
+    if verbose:
+        print(f"Unidades: {info['unidades']}  recortadas: {cambiadas}  teselas: {len(total)}  "
+              f"reescritas: {escritas} ({bytes_escritos / 1e6:.1f} MB)")
+        print(f"Tiempo: hash {t_hash:.1f}s  recorte {t_cortar:.1f}s  total {info['t_total']:.1f}s -> {out_dir}")
+    return info
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+# Vista de ciudad de mapLayers.js (LIMA_BOUNDS)
+LIMA = (-77.25, -12.55, -76.70, -11.70)
+
+
+def teselas_en(bounds, z):
+    (x0, y0), (x1, y1) = (mercator([[bounds[0], bounds[3]], [bounds[2], bounds[1]]]) * 2 ** z).astype(int)
+    return [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def bench():
+    tmp = Path(tempfile.mkdtemp(prefix='teselas_'))
+    try:
+        out, cache = tmp / 'out', tmp / 'cache'
+        print('== Completo (caché vacía)')
+        full = build(out, cache)
+        print('== Sin cambios')
+        build(out, cache)
+        carpeta = next(iter(sorted(TRANSPORTE.glob('route_*'))), None)
+        if carpeta is not None:
+            print(f'== Una ruta cambiada ({carpeta.name})')
+            build(out, cache, forzar={f'wr/{carpeta.name}'})
+
+        tamanos = sorted(p.stat().st_size for p in out.rglob('*.json') if p.name != 'meta.json')
+        geojson = [p.stat().st_size for p in TRANSPORTE.glob('route_*/*.geojson')]
+        print(f'Teselas: {len(tamanos)}  total {sum(tamanos) / 1e6:.1f} MB  '
+              f'mediana {tamanos[len(tamanos) // 2] / 1024:.1f} KB  máx {tamanos[-1] / 1024:.0f} KB')
+        for z in (Z_MIN, Z_MIN + 1, 12):
+            vis = [out / f'{z}/{x}/{y}.json' for _, x, y in teselas_en(LIMA, z)]
+            existentes = [p.stat().st_size for p in vis if p.exists()]
+            print(f'Vista Lima a z{z}: {len(existentes)} teselas, {sum(existentes) / 1e6:.1f} MB')
+        print(f'"Mostrar todo" con GeoJSON por ruta: {len(geojson)} archivos, {sum(geojson) / 1e6:.1f} MB '
+              f'(recorte completo del corpus: {full["t_total"]:.0f}s)')
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Genera las teselas z/x/y de la red completa')
+    ap.add_argument('--completo', action='store_true', help='Ignora la caché y recorta todo')
+    ap.add_argument('--bench', action='store_true',
+                    help='Mide build completo, sin cambios y con una ruta cambiada en una carpeta temporal')
+    args = ap.parse_args()
+    if args.bench:
+        bench()
+        return
+    build(completo=args.completo)
+
+
+if __name__ == '__main__':
+    main()
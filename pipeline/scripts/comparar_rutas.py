@@ -4,39 +4,35 @@ Compara itinerarios ATU (PDFs) vs Wikiroutes (route.html) para detectar
 si el codigo nuevo asignado en wr_codes_master.csv corresponde realmente
 a la misma ruta fisica.
 
+Ademas sugiere, para cada itinerario ATU, las rutas WR mas parecidas de todo
+el corpus (indice TF-IDF): columnas top_wr y rank_asignado.
+
 Uso:
     python3 pipeline/scripts/comparar_rutas.py
+    python3 pipeline/scripts/comparar_rutas.py --top-k 10
+    python3 pipeline/scripts/comparar_rutas.py --bench   # todos contra todos
 
 Salida:
     pipeline/output/comparacion_rutas.csv
 """
 
+import argparse
 import csv
+import heapq
+import math
 import re
 import sys
-import subprocess
+import time
+from collections import Counter, defaultdict
 from pathlib import Path
 
 
-def instalar(pkg):
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install',
-                           pkg, '--break-system-packages', '-q'])
-
-
-try:
-    import pdfplumber
-except ImportError:
-    instalar('pdfplumber')
-    import pdfplumber
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'wikiroutes'))
+from wr_route_meta import RouteMetaCache  # noqa: E402
+from atu_pdf_cache import PdfTextCache, ORIGEN_RE, DESTINO_RE, ITINERARIO_RE, tiene_itinerario  # noqa: E402
 
-try:
-    from bs4 import BeautifulSoup
-except ImportError:
-    instalar('beautifulsoup4')
-    from bs4 import BeautifulSoup
 
-
-ROOT       = Path('/workspaces/limarutas')
+ROOT       = Path(__file__).resolve().parents[2]
 PDF_DIR    = ROOT / 'docs/paraderos_ATU/Actualización del Plan Regulador de Rutas'
 MASTER_CSV = ROOT / 'pipeline/output/wr_codes_master.csv'
 DATA_DIR   = ROOT / 'data/processed/transporte'
@@ -80,32 +76,103 @@ def similitud(set_a, set_b):
     return round(inter / union, 3) if union else 0.0
 
 
+# ── Índice TF-IDF sobre todos los itinerarios WR ──────────────────────────────
+
+class IndiceItinerarios:
+    """
+    Índice invertido palabra -> [(ruta, peso)] sobre las palabras_clave de cada
+    itinerario WR. Peso TF-IDF con tf binario (palabras_clave es un conjunto),
+    idf suavizado y vectores normalizados: el puntaje es el coseno, calculado
+    recorriendo solo las listas de las palabras de la consulta.
+    """
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.ids = sorted(docs)
+        n = len(self.ids)
+        df = Counter(w for kw in docs.values() for w in kw)
+        self.idf = {w: math.log((1 + n) / (1 + c)) + 1 for w, c in df.items()}
+        # Una palabra que ningún itinerario WR tiene igual pesa en la norma de la consulta
+        self.idf_ausente = math.log(1 + n) + 1
+        self.postings = defaultdict(list)
+        for i, rid in enumerate(self.ids):
+            kw = docs[rid]
+            norma = math.sqrt(sum(self.idf[w] ** 2 for w in kw)) or 1.0
+            for w in kw:
+                self.postings[w].append((i, self.idf[w] / norma))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def consultar(self, palabras, k=5):
+        """Top-k (route_id, coseno) para un conjunto de palabras clave."""
+        if not palabras or not self.ids:
+            return []
+        norma = math.sqrt(sum(self.idf.get(w, self.idf_ausente) ** 2 for w in palabras))
+        puntajes = defaultdict(float)
+        for w in palabras:
+            lista = self.postings.get(w)
+            if not lista:
+                continue
+            wq = self.idf[w] / norma
+            for i, wd in lista:
+                puntajes[i] += wq * wd
+        top = heapq.nlargest(k, puntajes.items(), key=lambda x: (x[1], -x[0]))
+        return [(self.ids[i], round(p, 3)) for i, p in top]
+
+
+def construir_indice(jobs=1):
+    """Palabras clave del itinerario de cada carpeta route_* con route.html."""
+    global _META
+    if _META is None:
+        _META = RouteMetaCache(DATA_DIR)
+    docs = {}
+    for folder, meta in _META.all(jobs).items():
+        kw = palabras_clave(meta.get('itinerario') or '')
+        if kw:
+            docs[meta.get('route_id') or folder.replace('route_', '', 1)] = kw
+    return IndiceItinerarios(docs)
+
+
+def bench_indice(indice, k=5):
+    """Todos contra todos (cada itinerario WR como consulta): índice vs Jaccard por fuerza bruta."""
+    docs = [indice.docs[rid] for rid in indice.ids]
+    t0 = time.perf_counter()
+    for kw in docs:
+        indice.consultar(kw, k)
+    t_ind = time.perf_counter() - t0
+    print(f'Índice:       {len(docs)} consultas en {t_ind:.2f}s')
+    muestra = docs[:200]
+    t0 = time.perf_counter()
+    for kw in muestra:
+        heapq.nlargest(k, (similitud(kw, otro) for otro in docs))
+    t_fb = (time.perf_counter() - t0) * len(docs) / max(1, len(muestra))
+    print(f'Fuerza bruta: ~{t_fb:.2f}s estimado ({len(muestra)} consultas medidas)')
+
+
+def formatear_top(top):
+    return ' | '.join(f'{rid}:{p}' for rid, p in top)
+
+
 # ── Leer PDFs ATU ─────────────────────────────────────────────────────────────
 
-def leer_pdf_atu(path):
+def leer_pdf_atu(path, cache):
     nombre      = path.stem
     partes      = nombre.split('_')
     cod_antiguo = partes[1] if len(partes) >= 3 else ''
     cod_nuevo   = partes[2] if len(partes) >= 3 else ''
 
-    texto = ''
     try:
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                texto += (page.extract_text() or '') + '\n'
+        texto = cache.texto(path, hasta=tiene_itinerario)
     except Exception as e:
         return cod_antiguo, cod_nuevo, '', '', '', str(e)
 
-    origen  = re.search(r'DISTRITO DE ORIGEN\s*:\s*(.+)',  texto)
-    destino = re.search(r'DISTRITO DE DESTINO\s*:\s*(.+)', texto)
+    origen  = ORIGEN_RE.search(texto)
+    destino = DESTINO_RE.search(texto)
     origen  = origen.group(1).strip()  if origen  else ''
     destino = destino.group(1).strip() if destino else ''
 
-    m = re.search(
-        r'ITINERARIO IDA\s+ITINERARIO VUELTA\s*\n([\s\S]+?)'
-        r'(?:CARROCERIA|PUNTO INICIAL|LONGITUD|FLOTA|\Z)',
-        texto
-    )
+    m = ITINERARIO_RE.search(texto)
     itinerario = m.group(1).strip() if m else ''
 
     return cod_antiguo, cod_nuevo, origen, destino, itinerario, ''
@@ -113,29 +180,22 @@ def leer_pdf_atu(path):
 
 # ── Leer route.html WR ────────────────────────────────────────────────────────
 
+_META = None
+
+
 def leer_itinerario_wr(route_id):
-    html_path = DATA_DIR / f'route_{route_id}' / 'route.html'
-    if not html_path.exists():
+    """Itinerario de route.html, tomado de la caché compartida de metadatos WR."""
+    global _META
+    folder = DATA_DIR / f'route_{route_id}'
+    if not (folder / 'route.html').exists():
         return '', 'no_html'
+    if _META is None:
+        _META = RouteMetaCache(DATA_DIR)
     try:
-        with open(html_path, encoding='utf-8', errors='ignore') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-        texto = soup.get_text(separator=' ')
-        m = re.search(
-            r'Itinerario\s*:\s*(.*?)(?:Fechas|Horario|Ciudad|Empresa|\Z)',
-            texto, re.DOTALL
-        )
-        if not m:
-            return '', 'no_itinerario'
-        itin = m.group(1).strip()
-        # Cortar en el primer punto seguido de espacio y mayuscula
-        # para no capturar texto de UI que viene despues del itinerario
-        corte = re.search(r'\.\s+(?=[A-Z])', itin)
-        if corte:
-            itin = itin[:corte.start() + 1]
-        return itin, ''
+        meta = _META.get(folder)
     except Exception as e:
         return '', str(e)
+    return meta['itinerario'], meta['itinerario_error']
 
 
 # ── Cargar master CSV ─────────────────────────────────────────────────────────
@@ -160,6 +220,23 @@ def cargar_master():
 # ── Main ─────────────────────────────────────────────────────────────────────
 
 def main():
+    ap = argparse.ArgumentParser(description='Compara itinerarios ATU vs Wikiroutes')
+    ap.add_argument('--jobs', type=int, default=0,
+                    help='Procesos para extraer PDFs y parsear route.html que no están en caché (0 = todos los núcleos)')
+    ap.add_argument('--top-k', type=int, default=5,
+                    help='Rutas WR sugeridas por itinerario ATU (índice TF-IDF sobre todo el corpus)')
+    ap.add_argument('--bench', action='store_true',
+                    help='Solo mide todos-contra-todos sobre los itinerarios WR y termina')
+    args = ap.parse_args()
+
+    if args.bench:
+        t0 = time.perf_counter()
+        indice = construir_indice(args.jobs)
+        print(f'Índice TF-IDF: {len(indice)} itinerarios WR ({time.perf_counter() - t0:.2f}s)')
+        bench_indice(indice, args.top_k)
+        _META.save()
+        return
+
     print(f'PDF_DIR: {PDF_DIR}')
     print(f'Existe: {PDF_DIR.exists()}')
     print('Cargando wr_codes_master.csv...')
@@ -167,11 +244,19 @@ def main():
 
     pdfs = sorted(PDF_DIR.glob('RUTA_*.pdf'))
     print(f'PDFs encontrados: {len(pdfs)}')
+    cache = PdfTextCache()
+    cache.precargar(pdfs, hasta=tiene_itinerario, jobs=args.jobs)
+
+    t0 = time.perf_counter()
+    indice = construir_indice(args.jobs)
+    t_indice = time.perf_counter() - t0
+    t_consultas, n_consultas = 0.0, 0
+    print(f'Índice TF-IDF: {len(indice)} itinerarios WR, {len(indice.postings)} palabras ({t_indice:.2f}s)')
 
     resultados = []
 
     for pdf_path in pdfs:
-        cod_ant, cod_nuevo, ori_atu, des_atu, itin_atu, err_pdf = leer_pdf_atu(pdf_path)
+        cod_ant, cod_nuevo, ori_atu, des_atu, itin_atu, err_pdf = leer_pdf_atu(pdf_path, cache)
 
         if not cod_nuevo:
             continue
@@ -186,6 +271,12 @@ def main():
         kw_atu      = palabras_clave(itin_atu)
         entradas_wr = master.get(cod_nuevo, [])
 
+        t0 = time.perf_counter()
+        top = indice.consultar(kw_atu, args.top_k)
+        t_consultas += time.perf_counter() - t0
+        n_consultas += 1
+        rank = {rid: i for i, (rid, _) in enumerate(top, start=1)}
+
         if not entradas_wr:
             resultados.append({
                 'codigo_nuevo':       cod_nuevo,
@@ -201,6 +292,8 @@ def main():
                 'palabras_wr':        '',
                 'palabras_comunes':   '',
                 'error':              err_pdf or 'no_match_en_master',
+                'top_wr':             formatear_top(top),
+                'rank_asignado':      '',
             })
             continue
 
@@ -227,6 +320,8 @@ def main():
                 'palabras_wr':        ' | '.join(sorted(kw_wr))[:200],
                 'palabras_comunes':   ' | '.join(sorted(comun))[:200],
                 'error':              err_pdf or err_wr,
+                'top_wr':             formatear_top(top),
+                'rank_asignado':      rank.get(wr['route_id'], ''),
             })
 
         print(f'  {cod_nuevo} ({cod_ant}) — {len(entradas_wr)} entrada(s) WR')
@@ -240,7 +335,7 @@ def main():
         'codigo_nuevo', 'codigo_antiguo_atu', 'wr_antiguo', 'route_id',
         'display_id', 'origen_atu', 'destino_atu', 'similitud',
         'match_antiguo', 'palabras_atu', 'palabras_wr', 'palabras_comunes',
-        'error'
+        'error', 'top_wr', 'rank_asignado'
     ]
 
     OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
@@ -249,6 +344,12 @@ def main():
         w.writeheader()
         w.writerows(resultados)
 
+    cache.save()
+    print(f'Texto de PDFs: {cache.extraidos} extraídos, {cache.reusados} desde caché')
+    if _META is not None:
+        _META.save()
+        print(f'Metadatos WR: {_META.parsed} parseados, {_META.reused} desde caché')
+
     print(f'\nListo. {len(resultados)} filas en {OUT_CSV}')
 
     sim_vals = [float(r['similitud']) for r in resultados if r['similitud']]
@@ -265,6 +366,13 @@ def main():
     sin_wr = sum(1 for r in resultados if r['match_antiguo'] == 'SIN_ENTRADA_WR')
     print(f'DIFF codigo antiguo: {diffs}')
     print(f'Sin entrada WR: {sin_wr}')
+    con_rank = [r for r in resultados if r['route_id']]
+    if con_rank and len(indice):
+        primero = sum(1 for r in con_rank if r['rank_asignado'] == 1)
+        fuera   = sum(1 for r in con_rank if r['rank_asignado'] == '')
+        print(f'Ruta asignada es la 1ª sugerida: {primero}  fuera del top-{args.top_k}: {fuera}')
+    if n_consultas:
+        print(f'Consultas TF-IDF: {n_consultas} en {t_consultas * 1000:.0f} ms')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,281 @@
+"""
+empresa_norm.py
+Normalización de nombres de empresa compartida por scrap_wikipedia_rutas.py
+y build_lista_rutas_atu.py.
+
+Cada script tiene su propia lista de prefijos (PREFIJOS_WIKIPEDIA, PREFIJOS_ATU);
+NormalizadorEmpresa compila la lista en una sola alternancia ordenada, que
+conserva la semántica de "primer prefijo que calza", y memoriza los resultados.
+
+Uso:
+    python3 pipeline/scripts/empresa_norm.py --verificar   # compara contra el bucle original
+"""
+
+import argparse
+import itertools
+import re
+import time
+from functools import lru_cache
+from typing import List, Tuple
+
+PREFIJOS_WIKIPEDIA = [
+    r'Corporaci[oó]n Empresa de Transportes Urbano',
+    r'Corporaci[oó]n Inversiones',
+    r'Corporaci[oó]n',
+    r'Cooperativa de Servicios Especiales Transportes',
+    r'Cooperativa de Transportes',
+    r'Cooperativa de Transporte',
+    r'Comunicaci[oó]n Integral Turismo e Inversiones',
+    r'Agrupaci[oó]n de Transportistas en Camionetas\s+S\.?A\.?C?\.?',
+    r'Agrupaci[oó]n de Transportistas en Camionetas',
+    r'Empresa de Servicios y Transportes',
+    r'Empresa de Servicios de Transportes',
+    r'Empresa de Servicios de Transporte',
+    r'Empresa de Servicios M[uú]ltiples',
+    r'Empresa de Servicio Especial de Transporte',
+    r'Empresa de Transportes,?\s+Servicios,?\s+Comercializadora,.+',
+    r'Empresa de Transportes,?\s+Inversiones y Servicios',
+    r'Empresa de Transporte,?\s+Servicios\s+y\s+Comercializaci[oó]n',
+    r'Empresa de Transporte\s+de\s+Servicio\s+de\s+Transportes',
+    r'Empresa de Transporte\s+de\s+Servicio',
+    r'Empresa de Transporte\s+y\s+Turismos?\s+Especiales',
+    r'Empresa de Transporte\s+y\s+Turismos?',
+    r'Empresa de Transportes y Servicios M[uú]ltiples',
+    r'Empresa de Transportes y Servicios',
+    r'Empresa de Transportes',
+    r'Empresa de Transporte y Servicios',
+    r'Empresa de Transporte',
+    r'Empresa Business Corporation',
+    r'Empresa',
+    r'Grupo Express del Per[uú]\s+S\.?A\.?C?\.?',
+    r'Grupo',
+    r'Multiservicios de Buses de',
+    r'Multiservicios e Inversiones',
+    r'Inversiones\s+Empresa\s+de\s+Transportes',
+    r'Inversiones y Servicios M[uú]ltiples',
+    r'Inversiones y Servicios',
+    r'Servicios Generales y Transportes',
+    r'Servicio Interconectado de Transporte',
+    r'Transportes e Inversiones',
+    r'Transportes y Servicios M[uú]ltiples',
+    r'Transportes y Servicios',
+    r'Transportes,?\s+Inversiones y Servicios',
+    r'Transportes',
+    r'Trans\.',
+    r'y\s+Representaciones',
+    r'y\s+Multiservicios',
+    r'y\s+Service\b',
+    r'e\s+Inversiones\s+M[uú]ltiples',
+    r'y\s+Turismos?\b',
+    r'de\s+Multiservicios',
+    r'de\s+Servicio\s+R[aá]pido',
+    r'de\s+Servicio\s+Urbano',
+    r'de\s+Servicios\s+Urbanos',
+    r'de\s+Transportes?,\s+Servicios.+',
+    r'de\s+Transportes?,\s+Inversiones.+',
+    r'de\s+Transporte,\s+Servicios.+',
+]
+
+# Los nombres del PRR traen variantes que no aparecen en Wikipedia
+# ("Empresa Modelo de Transportes", "Inversiones Empresariales"); el orden
+# también difiere, así que cada fuente mantiene su lista.
+PREFIJOS_ATU = [
+    r'Corporaci[oó]n Empresa de Transportes Urbano',
+    r'Corporaci[oó]n Inversiones',
+    r'Corporaci[oó]n',
+    r'Cooperativa de Servicios Especiales Transportes',
+    r'Cooperativa de Transportes',
+    r'Cooperativa de Transporte',
+    r'Comunicaci[oó]n Integral Turismo e Inversiones',
+    r'Agrupaci[oó]n de Transportistas en Camionetas\s+S\.?A\.?C?\.?',
+    r'Agrupaci[oó]n de Transportistas en Camionetas',
+    r'Empresa de Servicios y Transportes',
+    r'Empresa de Servicios de Transportes',
+    r'Empresa de Servicios de Transporte',
+    r'Empresa de Servicios M[uú]ltiples',
+    r'Empresa de Servicio Especial de Transporte',
+    r'Empresa de Transportes,?\s+Servicios,?\s+Comercializadora,.+',
+    r'Empresa de Transportes,?\s+Inversiones y Servicios',
+    r'Empresa de Transporte,?\s+Servicios\s+y\s+Comercializaci[oó]n',
+    r'Empresa de Transporte\s+de\s+Servicio\s+de\s+Transportes',
+    r'Empresa de Transporte\s+de\s+Servicio',
+    r'Empresa de Transporte\s+y\s+Turismos?\s+Especiales',
+    r'Empresa de Transporte\s+y\s+Turismos?',
+    r'Empresa de Transportes y Servicios M[uú]ltiples',
+    r'Empresa de Transportes y Servicios',
+    r'Empresa de Transportes',
+    r'Empresa de Transporte y Servicios',
+    r'Empresa de Transporte',
+    r'Empresa Business Corporation',
+    r'Empresa Modelo de Transportes',
+    r'Empresa',
+    r'Grupo Express del Per[uú]\s+S\.?A\.?C?\.?',
+    r'Grupo',
+    r'Multiservicios de Buses de',
+    r'Multiservicios e Inversiones',
+    r'Inversiones\s+Empresariales',
+    r'Inversiones y Servicios M[uú]ltiples',
+    r'Inversiones y Servicios',
+    r'Inversiones\s+Empresa\s+de\s+Transportes',
+    r'Servicios Generales y Transportes',
+    r'Servicio Interconectado de Transporte',
+    r'Transportes e Inversiones',
+    r'Transportes y Servicios M[uú]ltiples',
+    r'Transportes y Servicios',
+    r'Transportes,?\s+Inversiones y Servicios',
+    r'Transportes',
+    r'Trans\.',
+    r'y\s+Representaciones',
+    r'y\s+Multiservicios',
+    r'y\s+Service\b',
+    r'e\s+Inversiones\s+M[uú]ltiples',
+    r'y\s+Turismos?\b',
+    r'de\s+Multiservicios',
+    r'de\s+Servicio\s+R[aá]pido',
+    r'de\s+Servicio\s+Urbano',
+    r'de\s+Servicios\s+Urbanos',
+    r'de\s+Transportes?,\s+Servicios.+',
+    r'de\s+Transportes?,\s+Inversiones.+',
+    r'de\s+Transporte,\s+Servicios.+',
+]
+
+SUFIJOS_JURIDICOS = re.compile(
+    r'\s*\b(S\.A\.C\.|S\.A\.|S\.A\b|E\.I\.R\.L\.|EIRL|Ltda\.|Ltda|S\.R\.L\.)\s*$',
+    re.IGNORECASE
+)
+
+INICIO_RESIDUAL = re.compile(
+    r'^(del?\s+|de\s+los\s+|de\s+las\s+|y\s+|e\s+)',
+    re.IGNORECASE
+)
+
+ABREV_RE         = re.compile(r'\(([A-Z][A-Z0-9\s\-]{0,14})\)\s*$')
+ABREV_FINAL_RE   = re.compile(r'\s*\([A-Z][A-Z0-9\s\-]{0,14}\)\s*$')
+PARENTESIS_LARGO = re.compile(r'\s*\([^)]{16,}\)')
+
+
+def extraer_abrev(texto):
+    m = ABREV_RE.search(texto)
+    return m.group(1).strip() if m else ''
+
+
+class NormalizadorEmpresa:
+    """
+    limpiar(texto) -> (empresa, abrev) para un nombre ya sin estado/'¿?'.
+
+    Los prefijos se prueban todos juntos en `^\\s*(?:p1|p2|...)\\s*`: la
+    alternancia de `re` prueba las ramas en orden en la misma posición, así
+    que gana el primer prefijo de la lista que calza, igual que el bucle.
+    """
+
+    def __init__(self, prefijos: List[str]):
+        self.prefijos = list(prefijos)
+        self._prefijo_re = re.compile(
+            r'^\s*(?:' + '|'.join(f'(?:{p})' for p in self.prefijos) + r')\s*',
+            re.IGNORECASE
+        )
+        self.limpiar = lru_cache(maxsize=None)(self._limpiar)
+
+    def quitar_prefijo(self, texto: str) -> str:
+        m = self._prefijo_re.match(texto)
+        return texto[m.end():].strip() if m else texto
+
+    def _limpiar(self, texto: str) -> Tuple[str, str]:
+        texto = texto.split('/')[0].strip()
+        # Quitar paréntesis con contenido largo (nombre alternativo)
+        texto = PARENTESIS_LARGO.sub('', texto).strip()
+        abrev = extraer_abrev(texto)
+        # Quitar paréntesis de abreviatura
+        texto = ABREV_FINAL_RE.sub('', texto).strip()
+        texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+        texto = self.quitar_prefijo(texto)
+        texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+        texto = INICIO_RESIDUAL.sub('', texto).strip()
+        texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+        # Si quedó vacío pero había abreviatura, usarla como nombre
+        if not texto and abrev:
+            return abrev, abrev
+        return (texto if texto else 'Desconocido'), abrev
+
+
+# ── Verificación contra la implementación original ──────────────────────────
+
+def limpiar_referencia(texto: str, prefijos: List[str]) -> Tuple[str, str]:
+    """El cuerpo de limpiar_empresa antes de compartirlo: un re.sub por prefijo."""
+    texto = texto.split('/')[0].strip()
+    texto = re.sub(r'\s*\([^)]{16,}\)', '', texto).strip()
+    m = re.search(r'\(([A-Z][A-Z0-9\s\-]{0,14})\)\s*$', texto)
+    abrev = m.group(1).strip() if m else ''
+    texto = re.sub(r'\s*\([A-Z][A-Z0-9\s\-]{0,14}\)\s*$', '', texto).strip()
+    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+    for prefijo in prefijos:
+        nuevo = re.sub(r'^\s*' + prefijo + r'\s*', '', texto, flags=re.IGNORECASE)
+        if nuevo != texto:
+            texto = nuevo.strip()
+            break
+    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+    texto = INICIO_RESIDUAL.sub('', texto).strip()
+    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
+    if not texto and abrev:
+        return abrev, abrev
+    return (texto if texto else 'Desconocido'), abrev
+
+
+def _ejemplos_prefijo(prefijo: str) -> List[str]:
+    """Instancias concretas de un prefijo (con y sin tildes, opcionales, etc.)."""
+    base = prefijo.replace(r'\b', '').replace(r'\s+', ' ').replace(r'\.', '.')
+    out = []
+    for tilde, opc in itertools.product((0, 1), (0, 1)):
+        t = re.sub(r'\[(\w)(\w)\]', lambda m: m.group(2 if tilde else 1), base)
+        t = re.sub(r'(.)\?', lambda m: m.group(1) if opc else '', t)
+        t = t.replace('.+', ' Lima Norte')
+        out.append(t)
+    return sorted(set(out))
+
+
+def corpus_verificacion() -> List[str]:
+    nucleos = ['Santa Cruz', 'Los Alizos', 'de Los Olivos', 'y Turismo Sol', 'Express', '']
+    sufijos = ['', ' S.A.', ' S.A.C.', ' SAC', ' E.I.R.L.', ' (ETSAC)', ' (Nombre comercial largo)', ' / Otra']
+    corpus = set()
+    prefijos = sorted(set(PREFIJOS_WIKIPEDIA) | set(PREFIJOS_ATU))
+    for p in prefijos:
+        for ej in _ejemplos_prefijo(p):
+            for nucleo, suf in itertools.product(nucleos, sufijos):
+                s = f'{ej} {nucleo}{suf}'.strip()
+                corpus.update({s, s.upper(), s.lower(), '  ' + s})
+    try:
+        from build_lista_rutas_atu import PRR_EMPRESAS
+        corpus.update(PRR_EMPRESAS.values())
+    except Exception as e:
+        print(f'  (sin PRR_EMPRESAS: {e})')
+    return sorted(c for c in corpus if c.strip())
+
+
+def verificar() -> bool:
+    corpus = corpus_verificacion()
+    ok = True
+    for nombre, prefijos in (('wikipedia', PREFIJOS_WIKIPEDIA), ('atu', PREFIJOS_ATU)):
+        norm = NormalizadorEmpresa(prefijos)
+        t0 = time.perf_counter()
+        ref = [limpiar_referencia(s, prefijos) for s in corpus]
+        t_ref = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        nue = [norm.limpiar(s) for s in corpus]
+        t_nue = time.perf_counter() - t0
+        difs = [(s, a, b) for s, a, b in zip(corpus, ref, nue) if a != b]
+        print(f'{nombre}: {len(corpus)} nombres, {len(difs)} diferencias  '
+              f'(bucle {t_ref * 1000:.0f} ms, compilado {t_nue * 1000:.0f} ms)')
+        for s, a, b in difs[:10]:
+            print(f'  {s!r}: {a} != {b}')
+        ok = ok and not difs
+    return ok
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Normalizador compartido de nombres de empresa')
+    ap.add_argument('--verificar', action='store_true',
+                    help='Compara la alternancia compilada con el bucle original de re.sub')
+    args = ap.parse_args()
+    if args.verificar:
+        raise SystemExit(0 if verificar() else 1)
+    ap.print_help()
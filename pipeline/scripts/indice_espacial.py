@@ -0,0 +1,557 @@
+"""
+indice_espacial.py
+Índice espacial persistente sobre los trazados y paraderos de toda la red
+(WikiRoutes, Metro, Metropolitano con alimentadores y corredores), con los
+mismos elementos que build_teselas.py.
+
+- Rejilla uniforme de CELDA grados. Cada tramo (par de vértices consecutivos
+  de un trazado) se registra en las celdas que atraviesa y cada paradero en
+  la suya.
+- En disco: pipeline/output/indice_espacial.npz con las rejillas en formato
+  CSR (celdas ordenadas, inicio de cada una e ítems) y las coordenadas en
+  micro-grados enteros, como rutas.bin.
+- Distancias en metros con una proyección local en la latitud consultada.
+
+Uso desde los scripts:
+    idx = IndiceEspacial()
+    idx.en_radio(-77.03, -12.05, 300)                   # viajes a <= 300 m
+    idx.cercanos(-77.03, -12.05, k=5, capa='paraderos')
+    idx.en_bbox(-77.05, -12.07, -77.02, -12.04)
+
+Cada consulta devuelve una secuencia Resultados de Resultado(sistema, ruta, ids,
+metros, lon, lat), guardada como columnas numpy (viaje, metros, lon, lat) y que
+arma cada Resultado al pedirlo. Con capa='rutas' hay uno por viaje, con el punto
+más cercano del trazado; con capa='paraderos' uno por paradero. en_bbox no
+calcula distancias (metros None).
+
+    python3 pipeline/scripts/indice_espacial.py                      # construye
+    python3 pipeline/scripts/indice_espacial.py --consulta -77.03 -12.05 --radio 300
+    python3 pipeline/scripts/indice_espacial.py --verificar          # contra fuerza bruta
+    python3 pipeline/scripts/indice_espacial.py --bench
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from collections import namedtuple
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'wikiroutes'))
+from build_teselas import LIMA, TRANSPORTE, WR_MAP, unidades  # noqa: E402
+from wr_build_lod import M_POR_GRADO  # noqa: E402
+
+
+ROOT       = Path(__file__).resolve().parents[2]
+INDEX_PATH = ROOT / 'pipeline/output/indice_espacial.npz'
+
+INDICE_VERSION = 1
+CELDA          = 0.002           # grados (~220 m)
+ESCALA         = 1_000_000       # micro-grados, como rutas.bin
+BLOQUE         = 200_000         # tramos por bloque al asignar celdas
+MAX_METROS     = 50_000          # radio máximo de búsqueda de cercanos()
+ANILLOS        = 4               # anillos de celdas que cercanos() recorre antes de pasar a celdas gruesas
+GRUESA         = 4               # celdas por lado de las celdas gruesas de cercanos() lejos de la red
+ANILLOS_GRUESOS = 16             # anillos de celdas gruesas antes de ir por bandas de distancia
+
+CAPAS = ('rutas', 'paraderos')
+
+Resultado = namedtuple('Resultado', 'sistema ruta ids metros lon lat')
+
+
+# ── Construcción ─────────────────────────────────────────────────────────────
+
+def celdas_tramos(a: np.ndarray, b: np.ndarray):
+    """
+    (cx, cy, tramo) de cada celda que atraviesa cada tramo a->b (grados).
+    Se parte del recuadro del tramo y se descartan las celdas que quedan
+    enteras a un lado de la recta (importa en tramos largos en diagonal).
+    """
+    x0 = np.floor(np.minimum(a[:, 0], b[:, 0]) / CELDA).astype(np.int64)
+    x1 = np.floor(np.maximum(a[:, 0], b[:, 0]) / CELDA).astype(np.int64)
+    y0 = np.floor(np.minimum(a[:, 1], b[:, 1]) / CELDA).astype(np.int64)
+    y1 = np.floor(np.maximum(a[:, 1], b[:, 1]) / CELDA).astype(np.int64)
+    nx = x1 - x0 + 1
+    cuantos = nx * (y1 - y0 + 1)
+    tramo = np.repeat(np.arange(len(a)), cuantos)
+    k = np.arange(int(cuantos.sum())) - np.repeat(np.cumsum(cuantos) - cuantos, cuantos)
+    cx = x0[tramo] + k % nx[tramo]
+    cy = y0[tramo] + k // nx[tramo]
+
+    dx = (b[:, 0] - a[:, 0])[tramo]
+    dy = (b[:, 1] - a[:, 1])[tramo]
+    ax, ay = a[tramo, 0], a[tramo, 1]
+    lado = [dx * (Y - ay) - dy * (X - ax)
+            for X in (cx * CELDA, (cx + 1) * CELDA) for Y in (cy * CELDA, (cy + 1) * CELDA)]
+    cruza = (np.minimum.reduce(lado) <= 0) & (np.maximum.reduce(lado) >= 0)
+    return cx[cruza], cy[cruza], tramo[cruza]
+
+
+def _csr(cx: np.ndarray, cy: np.ndarray, item: np.ndarray):
+    orden = np.lexsort((item, cy, cx))
+    cx, cy, item = cx[orden], cy[orden], item[orden]
+    nuevo = np.ones(len(cx), dtype=bool)
+    nuevo[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+    ini = np.flatnonzero(nuevo)
+    return (np.column_stack((cx[ini], cy[ini])).astype(np.int32),
+            np.append(ini, len(cx)).astype(np.int64),
+            item.astype(np.int32))
+
+
+def build(out_path=INDEX_PATH, transporte=TRANSPORTE, wr_map_path=WR_MAP, verbose=True) -> dict:
+    t0 = time.perf_counter()
+    viajes, clave_viaje = [], {}
+    v_xy, v_viaje, v_sigue = [], [], []
+    p_xy, p_viaje = [], []
+    for u in unidades(transporte, wr_map_path):
+        for tipo, sistema, ruta, ids, _color, coords in u.cargar():
+            j = clave_viaje.get((sistema, ruta))
+            if j is None:
+                j = clave_viaje[(sistema, ruta)] = len(viajes)
+                viajes.append([sistema, ruta, ids])
+            xy = np.rint(np.asarray(coords, dtype=float)[:, :2] * ESCALA).astype(np.int32)
+            if tipo == 'l':
+                sigue = np.ones(len(xy), dtype=bool)
+                sigue[-1] = False
+                v_xy.append(xy)
+                v_viaje.append(np.full(len(xy), j, dtype=np.int32))
+                v_sigue.append(sigue)
+            else:
+                p_xy.append(xy)
+                p_viaje.append(np.full(len(xy), j, dtype=np.int32))
+    t_leer = time.perf_counter() - t0
+
+    v = np.concatenate(v_xy)
+    sigue = np.concatenate(v_sigue)
+    p = np.concatenate(p_xy)
+    grados = v / ESCALA
+
+    # Tramos: se guardan por el índice de su primer vértice
+    inicios = np.flatnonzero(sigue)
+    partes = [celdas_tramos(grados[i], grados[i + 1])
+              for i in (inicios[s:s + BLOQUE] for s in range(0, len(inicios), BLOQUE))]
+    cx = np.concatenate([c[0] for c in partes])
+    cy = np.concatenate([c[1] for c in partes])
+    tramo = np.concatenate([inicios[s:s + BLOQUE][c[2]] for s, c in zip(range(0, len(inicios), BLOQUE), partes)])
+    t_celdas, t_inicio, t_items = _csr(cx, cy, tramo)
+
+    pg = p / ESCALA
+    p_celdas, p_inicio, p_items = _csr(np.floor(pg[:, 0] / CELDA).astype(np.int64),
+                                       np.floor(pg[:, 1] / CELDA).astype(np.int64),
+                                       np.arange(len(p)))
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        out_path, version=np.int32(INDICE_VERSION), celda=np.float64(CELDA),
+        viajes=np.array(json.dumps(viajes, ensure_ascii=False, separators=(',', ':'))),
+        v=v, v_viaje=np.concatenate(v_viaje), v_sigue=sigue, p=p, p_viaje=np.concatenate(p_viaje),
+        t_celdas=t_celdas, t_inicio=t_inicio, t_items=t_items,
+        p_celdas=p_celdas, p_inicio=p_inicio, p_items=p_items)
+
+    info = {'viajes': len(viajes), 'tramos': len(inicios), 'paraderos': len(p),
+            'celdas': len(t_celdas), 'items': len(t_items), 'bytes': out_path.stat().st_size,
+            't_leer': t_leer, 't_total': time.perf_counter() - t0}
+    if verbose:
+        print(f"Viajes: {info['viajes']}  tramos: {info['tramos']}  paraderos: {info['paraderos']}")
+        print(f"Celdas con tramos: {info['celdas']}  entradas: {info['items']} "
+              f"({info['items'] / max(info['tramos'], 1):.2f} por tramo)")
+        print(f"Archivo: {out_path} ({info['bytes'] / 1e6:.1f} MB)  "
+              f"lectura {t_leer:.1f}s  total {info['t_total']:.1f}s")
+    return info
+
+
+# ── Consultas ────────────────────────────────────────────────────────────────
+
+class Resultados(Sequence):
+    """
+    Resultados de una consulta como columnas: índice de viaje, metros y punto más
+    cercano. len() y los cortes no crean objetos; cada Resultado se arma al pedirlo.
+    """
+
+    __slots__ = ('_viajes', 'viaje', 'metros', 'lon', 'lat')
+
+    def __init__(self, viajes: list, viaje: np.ndarray, metros=None, lon=None, lat=None):
+        self._viajes = viajes
+        self.viaje, self.metros, self.lon, self.lat = viaje, metros, lon, lat
+
+    def __len__(self):
+        return len(self.viaje)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Resultados(self._viajes, self.viaje[i],
+                              *(None if c is None else c[i] for c in (self.metros, self.lon, self.lat)))
+        extra = [None if c is None else float(c[i]) for c in (self.metros, self.lon, self.lat)]
+        return Resultado(*self._viajes[int(self.viaje[i])], *extra)
+
+    def __eq__(self, otro):
+        return list(self) == list(otro)
+
+    def __repr__(self):
+        return f'Resultados({list(self)!r})'
+
+
+class IndiceEspacial:
+    """
+    Carga indice_espacial.npz y responde consultas por punto, radio y recuadro.
+    cercanos() reusa un arreglo de mínimos por viaje entre llamadas: una
+    instancia no se comparte entre hilos.
+    """
+
+    def __init__(self, path: Path = INDEX_PATH):
+        with np.load(path) as z:
+            if int(z['version']) != INDICE_VERSION or float(z['celda']) != CELDA:
+                raise SystemExit(f'{path} es de otra versión; reconstruir con indice_espacial.py')
+            self.viajes = json.loads(str(z['viajes']))
+            self.v = z['v'] / ESCALA
+            self.v_viaje = z['v_viaje']
+            self.v_sigue = z['v_sigue']
+            self.p = z['p'] / ESCALA
+            self.p_viaje = z['p_viaje']
+            self._rejillas, self._celdas, self._rejillas_gruesas = {}, {}, {}
+            for capa, pre in (('rutas', 't'), ('paraderos', 'p')):
+                celdas, inicio, items = z[f'{pre}_celdas'], z[f'{pre}_inicio'], z[f'{pre}_items']
+                self._rejillas[capa] = self._rejilla(celdas, inicio, items)
+                self._celdas[capa] = self._gruesas(celdas, inicio, items)
+                x0, y0, ini, its = self._celdas[capa]
+                lado = CELDA * GRUESA
+                self._rejillas_gruesas[capa] = {
+                    (round(x / lado), round(y / lado)): its[ini[i]:ini[i + 1]]
+                    for i, (x, y) in enumerate(zip(x0.tolist(), y0.tolist()))}
+        # Columnas contiguas: los gather de x e y son más rápidos que sobre v[:, 0]
+        self._x = {'rutas': np.ascontiguousarray(self.v[:, 0]), 'paraderos': np.ascontiguousarray(self.p[:, 0])}
+        self._y = {'rutas': np.ascontiguousarray(self.v[:, 1]), 'paraderos': np.ascontiguousarray(self.p[:, 1])}
+        self._item_viaje = {'rutas': self.v_viaje, 'paraderos': self.p_viaje}
+        # Mínimo por viaje de cercanos(): se rellena con inf en cada consulta
+        self._mejor = np.full(len(self.viajes), np.inf)
+
+    @staticmethod
+    def _rejilla(celdas, inicio, items) -> dict:
+        """{(cx, cy): ítems de la celda} con vistas sobre un único arreglo."""
+        ini = inicio.tolist()
+        return {(x, y): items[ini[i]:ini[i + 1]] for i, (x, y) in enumerate(celdas.tolist())}
+
+    @staticmethod
+    def _gruesas(celdas, inicio, items):
+        """
+        Celdas de GRUESA x GRUESA con los ítems de sus celdas: (oeste, sur,
+        inicio, ítems) para recorrer por distancia cuando el punto está lejos
+        de la red.
+        """
+        g = np.floor_divide(celdas, GRUESA)
+        orden = np.lexsort((g[:, 1], g[:, 0]))
+        g = g[orden]
+        largos = np.diff(inicio)[orden]
+        desde = np.concatenate(([0], np.cumsum(largos)))
+        items = items[np.repeat(inicio[:-1][orden] - desde[:-1], largos) + np.arange(desde[-1])]
+        nuevo = np.ones(len(g), dtype=bool)
+        nuevo[1:] = (g[1:] != g[:-1]).any(axis=1)
+        ini = np.flatnonzero(nuevo)
+        lado = CELDA * GRUESA
+        return g[ini, 0] * lado, g[ini, 1] * lado, np.append(desde[ini], desde[-1]).tolist(), items
+
+    def _candidatos(self, capa: str, oeste, sur, este, norte) -> np.ndarray:
+        rejilla = self._rejillas[capa]
+        x0, x1 = math.floor(oeste / CELDA), math.floor(este / CELDA)
+        y0, y1 = math.floor(sur / CELDA), math.floor(norte / CELDA)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(rejilla):
+            # Recuadro más grande que la red: recorrer las celdas existentes
+            partes = [it for (x, y), it in rejilla.items() if x0 <= x <= x1 and y0 <= y <= y1]
+        else:
+            partes = [it for it in (rejilla.get((x, y)) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+                      if it is not None]
+        if not partes:
+            return np.empty(0, dtype=np.int32)
+        # Un tramo puede repetirse (está en varias celdas): _resultados deja uno por viaje
+        return np.concatenate(partes)
+
+    def _proyectar(self, capa: str, ids: np.ndarray, lon: float, lat: float):
+        """Vector (m) del punto al ítem, o a su punto más cercano si es un tramo, y kx."""
+        kx = M_POR_GRADO * math.cos(math.radians(lat))
+        ky = M_POR_GRADO
+        xs, ys = self._x[capa], self._y[capa]
+        ax, ay = (xs[ids] - lon) * kx, (ys[ids] - lat) * ky
+        if capa == 'paraderos':
+            return ax, ay, kx
+        dx, dy = (xs[ids + 1] - lon) * kx - ax, (ys[ids + 1] - lat) * ky - ay
+        l2 = dx * dx + dy * dy
+        t = np.clip(-(ax * dx + ay * dy) / np.where(l2 > 0, l2, 1.0), 0.0, 1.0)
+        return ax + t * dx, ay + t * dy, kx
+
+    def _distancias(self, capa: str, ids: np.ndarray, lon: float, lat: float):
+        """Distancia (m) y punto más cercano (lon, lat) de cada ítem."""
+        qx, qy, kx = self._proyectar(capa, ids, lon, lat)
+        return np.sqrt(qx * qx + qy * qy), lon + qx / kx, lat + qy / M_POR_GRADO
+
+    def _resultados(self, capa: str, ids, metros=None, lon=None, lat=None) -> Resultados:
+        viaje = self._item_viaje[capa][ids]
+        if capa == 'rutas' and len(viaje):
+            # Un resultado por viaje: el primero en el orden dado (el más cercano)
+            _, primero = np.unique(viaje, return_index=True)
+            sel = np.sort(primero)
+            viaje = viaje[sel]
+            metros, lon, lat = (None if c is None else c[sel] for c in (metros, lon, lat))
+        return Resultados(self.viajes, viaje, metros, lon, lat)
+
+    def en_radio(self, lon: float, lat: float, metros: float, capa: str = 'rutas') -> Resultados:
+        """Viajes (o paraderos) a <= metros del punto, del más cercano al más lejano."""
+        dlat = metros / M_POR_GRADO
+        dlon = metros / (M_POR_GRADO * math.cos(math.radians(lat)))
+        return self._filtrar(capa, self._candidatos(capa, lon - dlon, lat - dlat, lon + dlon, lat + dlat),
+                             lon, lat, metros)
+
+    def _filtrar(self, capa: str, ids: np.ndarray, lon: float, lat: float, metros: float) -> Resultados:
+        if not len(ids):
+            return Resultados(self.viajes, np.empty(0, dtype=np.int32))
+        qx, qy, kx = self._proyectar(capa, ids, lon, lat)
+        # Misma cuenta que _distancias: d <= metros da lo mismo que allí
+        d = np.sqrt(qx * qx + qy * qy)
+        dentro = np.flatnonzero(d <= metros)
+        orden = dentro[np.argsort(d[dentro], kind='stable')]
+        # Punto más cercano solo de lo que se devuelve
+        return self._resultados(capa, ids[orden], d[orden],
+                                lon + qx[orden] / kx, lat + qy[orden] / M_POR_GRADO)
+
+    def _acumular(self, capa: str, ids: np.ndarray, lon: float, lat: float, mejor, k: int, vistos: list):
+        """
+        Suma ítems a la búsqueda de cercanos(); devuelve (mejor, k-ésima distancia).
+        En rutas el mínimo por viaje va en self._mejor y `mejor` no se usa.
+        """
+        qx, qy, _ = self._proyectar(capa, ids, lon, lat)
+        d = np.sqrt(qx * qx + qy * qy)
+        vistos.append((ids, d))
+        if capa == 'rutas':
+            np.minimum.at(self._mejor, self.v_viaje[ids], d)    # mejor distancia por viaje
+            return mejor, float(np.partition(self._mejor, k - 1)[k - 1])
+        mejor = np.concatenate((mejor, d))
+        if len(mejor) > k:
+            mejor = np.partition(mejor, k - 1)[:k]          # las k mejores
+        return mejor, (float(np.partition(mejor, k - 1)[k - 1]) if len(mejor) >= k else math.inf)
+
+    @staticmethod
+    def _anillo(cx: int, cy: int, r: int) -> list:
+        if r == 0:
+            return [(cx, cy)]
+        return ([(x, y) for x in range(cx - r, cx + r + 1) for y in (cy - r, cy + r)] +
+                [(x, y) for x in (cx - r, cx + r) for y in range(cy - r + 1, cy + r)])
+
+    def cercanos(self, lon: float, lat: float, k: int = 5, capa: str = 'rutas',
+                 max_metros: float = MAX_METROS) -> Resultados:
+        """Los k viajes (o paraderos) más cercanos, hasta max_metros."""
+        if capa == 'rutas':
+            k = min(k, len(self._mejor))
+        self._mejor.fill(np.inf)
+        kx = M_POR_GRADO * math.cos(math.radians(lat))
+        mejor, kesimo, vistos = np.empty(0), math.inf, []
+
+        def terminar(metros):
+            # Solo se devuelven (con su punto más cercano) los ítems a <= metros
+            if not vistos:
+                return Resultados(self.viajes, np.empty(0, dtype=np.int32))
+            ids = np.concatenate([i for i, _ in vistos])
+            d = np.concatenate([d for _, d in vistos])
+            return self._filtrar(capa, ids[d <= metros], lon, lat, metros)[:k]
+
+        # Anillos de celdas alrededor del punto: tras el anillo r, lo que falta
+        # está a más de r celdas en algún eje
+        fx, fy = math.floor(lon / CELDA), math.floor(lat / CELDA)
+        rejilla = self._rejillas[capa]
+        for r in range(ANILLOS + 1):
+            partes = [it for it in map(rejilla.get, self._anillo(fx, fy, r)) if it is not None]
+            if partes:
+                mejor, kesimo = self._acumular(capa, np.concatenate(partes), lon, lat, mejor, k, vistos)
+            cubierto = r * CELDA * kx
+            if kesimo <= cubierto or cubierto >= max_metros:
+                return terminar(min(kesimo, max_metros))
+
+        # Luego anillos de celdas gruesas. Se saltan las que los anillos finos ya
+        # cubrieron enteras y las que están más lejos que la k-ésima distancia.
+        # Un paradero de una gruesa a medio cubrir contaría dos veces: en
+        # paraderos se cuenta de nuevo desde cero
+        if capa == 'paraderos':
+            mejor, kesimo, vistos = np.empty(0), math.inf, []
+        lado = CELDA * GRUESA
+        cx, cy = math.floor(lon / lado), math.floor(lat / lado)
+        rejilla = self._rejillas_gruesas[capa]
+        for r in range(ANILLOS_GRUESOS + 1):
+            partes = []
+            for x, y in self._anillo(cx, cy, r):
+                it = rejilla.get((x, y))
+                if it is None:
+                    continue
+                if (capa == 'rutas' and fx - ANILLOS <= x * GRUESA and
+                        x * GRUESA + GRUESA - 1 <= fx + ANILLOS and
+                        fy - ANILLOS <= y * GRUESA and y * GRUESA + GRUESA - 1 <= fy + ANILLOS):
+                    continue
+                dx = max(x * lado - lon, lon - (x + 1) * lado, 0.0) * kx
+                dy = max(y * lado - lat, lat - (y + 1) * lado, 0.0) * M_POR_GRADO
+                if dx * dx + dy * dy <= kesimo * kesimo:
+                    partes.append(it)
+            if partes:
+                mejor, kesimo = self._acumular(capa, np.concatenate(partes), lon, lat, mejor, k, vistos)
+            cubierto = r * lado * kx
+            if kesimo <= cubierto or cubierto >= max_metros:
+                return terminar(min(kesimo, max_metros))
+
+        # Muy lejos de la red: bandas de distancia crecientes sobre las celdas
+        # gruesas, desde cero. Todo ítem a <= hi está en una celda cuyo
+        # rectángulo está a <= hi
+        x0, y0, inicio, items = self._celdas[capa]
+        if not len(items):
+            return Resultados(self.viajes, np.empty(0, dtype=np.int32))
+        self._mejor.fill(np.inf)
+        mejor, kesimo, vistos = np.empty(0), math.inf, []
+        dc = np.hypot(np.maximum(np.maximum(x0 - lon, lon - x0 - lado), 0) * kx,
+                      np.maximum(np.maximum(y0 - lat, lat - y0 - lado), 0) * M_POR_GRADO)
+        paso = 1.5 * lado * M_POR_GRADO
+        lo, hi = -1.0, float(dc.min()) + paso
+        while True:
+            hi = min(hi, max_metros)
+            banda = np.flatnonzero((dc > lo) & (dc <= hi)).tolist()
+            if banda:
+                ids = np.concatenate([items[inicio[i]:inicio[i + 1]] for i in banda])
+                mejor, kesimo = self._acumular(capa, ids, lon, lat, mejor, k, vistos)
+            if kesimo <= hi or hi >= max_metros:
+                return terminar(min(kesimo, hi))
+            lo, hi, paso = hi, hi + paso, paso * 2
+
+    def en_bbox(self, oeste: float, sur: float, este: float, norte: float, capa: str = 'rutas') -> Resultados:
+        """Viajes que cruzan el recuadro (o paraderos dentro de él)."""
+        ids = self._candidatos(capa, oeste, sur, este, norte)
+        if not len(ids):
+            return Resultados(self.viajes, np.empty(0, dtype=np.int32))
+        if capa == 'paraderos':
+            q = self.p[ids]
+            dentro = (q[:, 0] >= oeste) & (q[:, 0] <= este) & (q[:, 1] >= sur) & (q[:, 1] <= norte)
+            return self._resultados(capa, np.sort(ids[dentro]))
+        a, b = self.v[ids], self.v[ids + 1]
+        solapa = ((np.minimum(a[:, 0], b[:, 0]) <= este) & (np.maximum(a[:, 0], b[:, 0]) >= oeste) &
+                  (np.minimum(a[:, 1], b[:, 1]) <= norte) & (np.maximum(a[:, 1], b[:, 1]) >= sur))
+        dx, dy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+        lado = [dx * (Y - a[:, 1]) - dy * (X - a[:, 0]) for X in (oeste, este) for Y in (sur, norte)]
+        cruza = solapa & (np.minimum.reduce(lado) <= 0) & (np.maximum.reduce(lado) >= 0)
+        sel = ids[cruza]
+        return self._resultados(capa, sel[np.argsort(self.v_viaje[sel], kind='stable')])
+
+
+# ── Verificación y benchmark ─────────────────────────────────────────────────
+
+def _puntos_lima(n: int, semilla: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(semilla)
+    oeste, sur, este, norte = LIMA
+    return np.column_stack((rng.uniform(oeste, este, n), rng.uniform(sur, norte, n)))
+
+
+def verificar(idx: IndiceEspacial, n: int = 40) -> bool:
+    """Compara radio, cercanos y recuadro contra fuerza bruta sobre todos los tramos y paraderos."""
+    todos = {'rutas': np.flatnonzero(idx.v_sigue), 'paraderos': np.arange(len(idx.p))}
+    rng = np.random.default_rng(1)
+    problemas = 0
+    for lon, lat in _puntos_lima(n).tolist():
+        for capa in CAPAS:
+            d, _, _ = idx._distancias(capa, todos[capa], lon, lat)
+            viaje = (idx.v_viaje if capa == 'rutas' else idx.p_viaje)[todos[capa]]
+            for metros in (300.0, 1500.0):
+                dentro = d <= metros
+                if capa == 'rutas':
+                    esperado = {}
+                    for j, dj in zip(viaje[dentro].tolist(), d[dentro].tolist()):
+                        esperado[j] = min(dj, esperado.get(j, math.inf))
+                    esperado = sorted(round(x, 6) for x in esperado.values())
+                else:
+                    esperado = sorted(np.round(d[dentro], 6).tolist())
+                obtenido = sorted(round(r.metros, 6) for r in idx.en_radio(lon, lat, metros, capa))
+                if obtenido != esperado:
+                    problemas += 1
+                    print(f'  [radio] {capa} {lon:.5f},{lat:.5f} r={metros:.0f}: '
+                          f'{len(obtenido)} vs {len(esperado)} esperados')
+            # cercanos: las k distancias deben ser las k menores de la fuerza bruta
+            if capa == 'rutas':
+                minimo = np.full(len(idx.viajes), np.inf)
+                np.minimum.at(minimo, viaje, d)
+                esperado = np.sort(minimo[np.isfinite(minimo)])[:5]
+            else:
+                esperado = np.sort(d)[:5]
+            obtenido = [r.metros for r in idx.cercanos(lon, lat, 5, capa)]
+            if not np.allclose(obtenido, esperado, atol=1e-6):
+                problemas += 1
+                print(f'  [cercanos] {capa} {lon:.5f},{lat:.5f}: {obtenido} vs {esperado.tolist()}')
+        # Recuadro: contra la prueba exacta sobre todos los tramos
+        ancho, alto = rng.uniform(0.002, 0.03, 2).tolist()
+        caja = (lon, lat, lon + ancho, lat + alto)
+        antes = idx._candidatos
+        idx._candidatos = lambda capa, *c: todos[capa]
+        try:
+            esperado = {c: idx.en_bbox(*caja, capa=c) for c in CAPAS}
+        finally:
+            idx._candidatos = antes
+        for capa in CAPAS:
+            if idx.en_bbox(*caja, capa=capa) != esperado[capa]:
+                problemas += 1
+                print(f'  [bbox] {capa} {caja}')
+    print(f'Puntos verificados: {n}  con problemas: {problemas}')
+    return problemas == 0
+
+
+def bench(idx: IndiceEspacial, n: int = 5000) -> None:
+    """Consultas desde puntos junto a la red (paraderos con ~400 m de ruido) y al azar en Lima."""
+    rng = np.random.default_rng(2)
+    cerca = (idx.p[rng.integers(0, len(idx.p), n)] + rng.normal(0, 0.004, (n, 2))).tolist()
+    consultas = [
+        ('en_radio rutas 300 m', lambda lon, lat: idx.en_radio(lon, lat, 300)),
+        ('en_radio paraderos 300 m', lambda lon, lat: idx.en_radio(lon, lat, 300, 'paraderos')),
+        ('cercanos rutas k=5', lambda lon, lat: idx.cercanos(lon, lat, 5)),
+        ('cercanos paraderos k=5', lambda lon, lat: idx.cercanos(lon, lat, 5, 'paraderos')),
+        ('en_bbox rutas 1 km', lambda lon, lat: idx.en_bbox(lon, lat, lon + 0.009, lat + 0.009)),
+    ]
+    for grupo, puntos in (('junto a la red', cerca), ('al azar en Lima', _puntos_lima(n, semilla=2).tolist())):
+        print(f'== {n} puntos {grupo}')
+        for nombre, f in consultas:
+            tiempos, hallados = [], 0
+            for lon, lat in puntos:
+                t = time.perf_counter()
+                hallados += len(f(lon, lat))
+                tiempos.append(time.perf_counter() - t)
+            ms = np.array(tiempos) * 1000
+            print(f'{nombre:<26} media {ms.mean():.3f} ms  p50 {np.median(ms):.3f}  '
+                  f'p99 {np.percentile(ms, 99):.3f}  resultados/consulta {hallados / n:.1f}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Índice espacial de trazados y paraderos')
+    ap.add_argument('--out', type=str, default=str(INDEX_PATH), help='Archivo .npz del índice')
+    ap.add_argument('--consulta', nargs=2, type=float, metavar=('LON', 'LAT'),
+                    help='Consulta sobre el índice ya construido')
+    ap.add_argument('--radio', type=float, default=300.0, help='Radio en metros para --consulta')
+    ap.add_argument('--verificar', action='store_true', help='Compara consultas contra fuerza bruta')
+    ap.add_argument('--bench', action='store_true', help='Mide consultas puntuales sobre Lima')
+    args = ap.parse_args()
+
+    if not (args.consulta or args.verificar or args.bench):
+        build(args.out)
+        return
+
+    t = time.perf_counter()
+    idx = IndiceEspacial(Path(args.out))
+    print(f'Índice cargado en {time.perf_counter() - t:.2f}s: {len(idx.viajes)} viajes, '
+          f'{int(idx.v_sigue.sum())} tramos, {len(idx.p)} paraderos')
+    if args.consulta:
+        lon, lat = args.consulta
+        for capa in CAPAS:
+            res = idx.en_radio(lon, lat, args.radio, capa)
+            print(f'{capa} a <= {args.radio:.0f} m: {len(res)}')
+            for r in res[:20]:
+                print(f'  {r.sistema:<5} {r.ruta:<14} {r.metros:7.1f} m  {",".join(r.ids)}')
+    if args.verificar and not verificar(idx):
+        sys.exit(1)
+    if args.bench:
+        bench(idx)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,399 @@
+"""
+operadores.py
+Agrupa las variantes de nombre de empresa operadora de las tres fuentes
+(tablas de Wikipedia, tabla PRR de la ATU, titles y fichas de WikiRoutes) en
+operadores canónicos con un ID estable.
+
+Resolución:
+  1. Cada nombre se normaliza con limpiar_empresa (empresa_norm.py) y luego a
+     una clave: minúsculas, sin tildes ni puntuación, sin palabras vacías.
+  2. Bloqueo por tokens: solo se comparan claves que comparten un token poco
+     frecuente (o el mismo arranque de 5 letras). Los tokens presentes en más
+     de --max-bloque claves no forman bloque, así el costo no crece con el
+     cuadrado de la cantidad de nombres.
+  3. Similitud: parecido token a token en ambos sentidos, o SequenceMatcher
+     sobre la clave sin espacios si es casi idéntica. Los pares sobre
+     --umbral se unen (union-find).
+  4. IDs: cada grupo hereda el ID del operadores.csv anterior con el que
+     comparte el nombre canónico o la mayoría de variantes; solo un grupo
+     sin pareja estrena ID (hash de su clave raíz).
+
+Uso:
+    python3 pipeline/scripts/operadores.py
+    python3 pipeline/scripts/operadores.py --umbral 0.9 --verbose
+    python3 pipeline/scripts/operadores.py --verificar   # estabilidad de IDs
+
+Produce:
+    pipeline/output/operadores.csv        (operador_id, nombre, variantes, fuentes, n_rutas)
+    pipeline/output/rutas_operador.csv    (fuente, codigo, empresa_raw, empresa, operador_id)
+"""
+
+import argparse
+import csv
+import hashlib
+import re
+import sys
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from empresa_norm import NormalizadorEmpresa, PREFIJOS_WIKIPEDIA, PREFIJOS_ATU
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'wikiroutes'))
+from wr_route_meta import RouteMetaCache  # noqa: E402
+
+
+ROOT        = Path(__file__).resolve().parents[2]
+WIKI_NUEVAS = ROOT / 'pipeline/output/lista_rutas_nuevas.csv'
+WIKI_ANTIG  = ROOT / 'pipeline/output/lista_rutas_antiguas.csv'
+DATA_DIR    = ROOT / 'data/processed/transporte'
+OUT_OPS     = ROOT / 'pipeline/output/operadores.csv'
+OUT_RUTAS   = ROOT / 'pipeline/output/rutas_operador.csv'
+
+UMBRAL          = 0.88
+UMBRAL_TOKEN    = 0.8    # dos tokens "son el mismo" (errores de tipeo)
+UMBRAL_COMPACTO = 0.95   # clave sin espacios casi idéntica
+MAX_BLOQUE      = 40
+
+PALABRAS_VACIAS = {
+    'de', 'del', 'la', 'las', 'los', 'el', 'y', 'e', 'en',
+    's', 'a', 'c', 'sa', 'sac', 'srl', 'eirl', 'ltda',
+    'et', 'emp', 'empresa', 'transportes', 'transporte', 'trans', 'transp', 'serv',
+}
+
+PLACEHOLDERS = {'', 'desconocido', '¿?', '?'}
+
+
+# ── Normalización ────────────────────────────────────────────────────────────
+
+def sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def tokens_de(nombre):
+    t = re.sub(r'[^a-z0-9]+', ' ', sin_tildes(nombre).lower())
+    # Letras sueltas: siglas tipo "E.T." o "E.S.T." que preceden al nombre
+    return [w for w in t.split() if w not in PALABRAS_VACIAS and not (len(w) == 1 and w.isalpha())]
+
+
+def _ratio(a, b):
+    return SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def _cobertura(a, b):
+    """Promedio, para cada token de a, de su mejor parecido en b (0 si no llega a UMBRAL_TOKEN)."""
+    total = 0.0
+    for t in a:
+        mejor = max(1.0 if t == u else _ratio(t, u) for u in b)
+        total += mejor if mejor >= UMBRAL_TOKEN else 0.0
+    return total / len(a)
+
+
+def similitud(a, b):
+    """
+    a, b: tuplas de tokens. Parecido token a token en ambos sentidos
+    (Carbajal/Carvajal cuenta, Doce/Once no), o la clave compacta casi
+    idéntica para nombres partidos distinto (Chim Pum / Chimpum).
+    """
+    if set(a) == set(b):
+        return 1.0
+    tokens = (_cobertura(a, b) + _cobertura(b, a)) / 2
+    if tokens >= UMBRAL_COMPACTO:
+        return tokens
+    compacto = _ratio(''.join(a), ''.join(b))
+    return max(tokens, compacto if compacto >= UMBRAL_COMPACTO else 0.0)
+
+
+# ── Union-find ───────────────────────────────────────────────────────────────
+
+class UnionFind:
+    def __init__(self):
+        self.padre = {}
+
+    def find(self, x):
+        self.padre.setdefault(x, x)
+        raiz = x
+        while self.padre[raiz] != raiz:
+            raiz = self.padre[raiz]
+        while self.padre[x] != raiz:
+            self.padre[x], x = raiz, self.padre[x]
+        return raiz
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # La raíz es la menor, así el resultado no depende del orden de llegada
+            if rb < ra:
+                ra, rb = rb, ra
+            self.padre[rb] = ra
+
+
+# ── Fuentes ──────────────────────────────────────────────────────────────────
+
+def menciones_wikipedia():
+    """(fuente, codigo, empresa_raw, empresa) desde los CSV de scrap_wikipedia_rutas."""
+    out = []
+    for path, fuente in ((WIKI_NUEVAS, 'wikipedia'), (WIKI_ANTIG, 'wikipedia_antigua')):
+        if not path.exists():
+            print(f'  (no existe {path.relative_to(ROOT)})')
+            continue
+        with open(path, encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                cod = row.get('codigo_nuevo') or row.get('codigo_antiguo') or ''
+                emp = (row.get('empresa_operadora') or '').strip()
+                out.append((fuente, cod, emp, emp))
+    return out
+
+
+def menciones_prr():
+    from build_lista_rutas_atu import PRR_EMPRESAS
+    norm = NormalizadorEmpresa(PREFIJOS_ATU)
+    return [('prr', cod, raw, norm.limpiar(raw.strip())[0]) for cod, raw in PRR_EMPRESAS.items()]
+
+
+def menciones_wikiroutes(jobs=1):
+    if not DATA_DIR.exists():
+        return []
+    cache = RouteMetaCache(DATA_DIR)
+    metas = cache.all(jobs)
+    cache.save()
+    norm = NormalizadorEmpresa(PREFIJOS_WIKIPEDIA)
+    out = []
+    for folder, meta in metas.items():
+        raw = (meta.get('empresa') or '').strip()
+        if raw:
+            out.append(('wikiroutes', meta.get('route_id') or folder.replace('route_', ''), raw,
+                        norm.limpiar(raw)[0]))
+    return out
+
+
+# ── Resolución ───────────────────────────────────────────────────────────────
+
+def resolver(nombres, umbral=UMBRAL, max_bloque=MAX_BLOQUE, verbose=False):
+    """
+    nombres: iterable de nombres ya limpios. Devuelve {nombre: clave_raiz}
+    y estadísticas de comparación.
+    """
+    claves = {}
+    for n in nombres:
+        toks = tuple(tokens_de(n))
+        if toks:
+            claves.setdefault(toks, []).append(n)
+    lista = sorted(claves)
+    uf = UnionFind()
+    for k in lista:
+        uf.find(k)
+
+    # Bloques: token -> claves, y arranque compacto -> claves (Trans Lima / Translima)
+    bloques = defaultdict(list)
+    for i, k in enumerate(lista):
+        for t in set(k):
+            bloques['t:' + t].append(i)
+        bloques['p:' + ''.join(k)[:5]].append(i)
+
+    pares = set()
+    omitidos = 0
+    for nombre, idx in bloques.items():
+        if len(idx) > max_bloque:
+            omitidos += 1
+            continue
+        for x in range(len(idx)):
+            for y in range(x + 1, len(idx)):
+                pares.add((idx[x], idx[y]))
+
+    unidos = 0
+    for i, j in sorted(pares):
+        a, b = lista[i], lista[j]
+        s = similitud(a, b)
+        if s >= umbral:
+            if verbose and uf.find(a) != uf.find(b):
+                print(f'  {s:.2f}  {claves[a][0]!r} ~ {claves[b][0]!r}')
+            uf.union(a, b)
+            unidos += 1
+
+    asignacion = {}
+    for k, ns in claves.items():
+        raiz = uf.find(k)
+        for n in ns:
+            asignacion[n] = raiz
+    stats = {'claves': len(lista), 'pares': len(pares), 'unidos': unidos,
+             'bloques': len(bloques), 'bloques_omitidos': omitidos,
+             'pares_todos': len(lista) * (len(lista) - 1) // 2}
+    return asignacion, stats
+
+
+def operador_id(raiz, usados=()):
+    """ID nuevo: hash de la clave raíz (con sufijo si ya lo lleva otro operador)."""
+    base = ' '.join(raiz)
+    for n in range(1000):
+        oid = 'op_' + hashlib.sha1((base if n == 0 else f'{base}#{n}').encode('utf-8')).hexdigest()[:8]
+        if oid not in usados:
+            return oid
+    raise RuntimeError(f'Sin ID libre para {base!r}')
+
+
+def leer_operadores(path):
+    """{operador_id: (nombre, {variantes})} del operadores.csv anterior ({} si no existe)."""
+    previos = {}
+    if not path.exists():
+        return previos
+    with open(path, encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            variantes = {v for v in (row.get('variantes') or '').split(' | ') if v}
+            previos[row['operador_id']] = (row.get('nombre') or '', variantes)
+    return previos
+
+
+def asignar_ids(grupos, previos):
+    """
+    grupos: {raiz: {variantes}}. Cada grupo hereda el ID del operador anterior
+    cuyo nombre canónico contiene, o con el que comparte más de la mitad de sus
+    variantes; solo los grupos sin pareja estrenan ID. Si un operador anterior
+    se parte, el ID queda para la parte que más variantes conserva.
+    Devuelve {raiz: operador_id}.
+    """
+    por_variante = defaultdict(set)
+    for oid, (_, variantes) in previos.items():
+        for v in variantes:
+            por_variante[v].add(oid)
+
+    candidatos = []
+    for raiz, variantes in grupos.items():
+        for oid in set().union(*(por_variante.get(v, ()) for v in variantes)):
+            nombre, previas = previos[oid]
+            comunes = len(variantes & previas)
+            if nombre in variantes or 2 * comunes > len(previas):
+                candidatos.append((-(nombre in variantes), -comunes, oid, raiz))
+
+    ids = {}
+    usados = set()
+    for _, _, oid, raiz in sorted(candidatos):
+        if raiz not in ids and oid not in usados:
+            ids[raiz] = oid
+            usados.add(oid)
+    # Los IDs anteriores sin pareja quedan reservados: no se reciclan para otro operador
+    reservados = usados | set(previos)
+    for raiz in sorted(grupos):
+        if raiz not in ids:
+            ids[raiz] = operador_id(raiz, reservados)
+            reservados.add(ids[raiz])
+    return ids
+
+
+def _grupos_de(nombres):
+    asignacion, _ = resolver(nombres)
+    grupos = defaultdict(set)
+    for n, raiz in asignacion.items():
+        grupos[raiz].add(n)
+    return grupos
+
+
+def verificar():
+    """Casos fijos de estabilidad de IDs entre corridas. Devuelve nº de fallos."""
+    fallos = []
+
+    def ids_de(nombres, previos):
+        grupos = _grupos_de(nombres)
+        ids = asignar_ids(grupos, previos)
+        return ({n: ids[r] for r, vs in grupos.items() for n in vs},
+                {ids[r]: (sorted(vs)[0], vs) for r, vs in grupos.items()})
+
+    base, previos = ids_de(['Santa Rosa', 'Santa Rosa SAC', 'Translima'], {})
+    # Una variante con error de tipeo nueva cambia la raíz del grupo, no su ID
+    con_typo, _ = ids_de(['Santa Rosa', 'Santa Rosa SAC', 'Sanla Rosa', 'Translima'], previos)
+    if con_typo['Santa Rosa'] != base['Santa Rosa'] or con_typo['Sanla Rosa'] != base['Santa Rosa']:
+        fallos.append('variante nueva cambió el ID del grupo')
+    if con_typo['Translima'] != base['Translima']:
+        fallos.append('grupo sin cambios cambió de ID')
+    # Un operador nuevo no hereda IDs de otros
+    nuevo, _ = ids_de(['Santa Rosa', 'Santa Rosa SAC', 'Translima', 'Etuchisa'], previos)
+    if nuevo['Etuchisa'] in set(base.values()):
+        fallos.append('operador nuevo reutilizó un ID existente')
+    # Si el operador desaparece y vuelve otro con otro nombre, no se recicla su ID
+    otro, _ = ids_de(['Translima', 'Chama Express'], previos)
+    if otro['Chama Express'] == base['Santa Rosa']:
+        fallos.append('ID de un operador desaparecido reciclado')
+    print(f'IDs de operador: 4 escenarios  fallos: {len(fallos)}')
+    for f in fallos:
+        print(f'  {f}')
+    return len(fallos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Resuelve variantes de empresa operadora en operadores canónicos')
+    ap.add_argument('--umbral', type=float, default=UMBRAL, help='Similitud mínima para unir dos nombres')
+    ap.add_argument('--max-bloque', type=int, default=MAX_BLOQUE,
+                    help='Tokens presentes en más claves que esto no generan candidatos')
+    ap.add_argument('--jobs', type=int, default=1, help='Procesos para parsear route.html (0 = todos los núcleos)')
+    ap.add_argument('--verbose', action='store_true', help='Muestra cada unión con su similitud')
+    ap.add_argument('--verificar', action='store_true', help='Casos fijos de estabilidad de IDs y sale')
+    args = ap.parse_args()
+
+    if args.verificar:
+        if verificar():
+            raise SystemExit(1)
+        return
+
+    t0 = time.perf_counter()
+    menciones = menciones_wikipedia() + menciones_prr() + menciones_wikiroutes(args.jobs)
+    validas = [m for m in menciones if m[3].strip().lower() not in PLACEHOLDERS]
+    print(f'Menciones: {len(menciones)}  con empresa: {len(validas)}  '
+          f'por fuente: {dict(Counter(m[0] for m in validas))}')
+
+    asignacion, stats = resolver((m[3] for m in validas), args.umbral, args.max_bloque, args.verbose)
+
+    # Nombre canónico: la variante más mencionada (desempate: más larga, luego alfabético)
+    por_raiz = defaultdict(list)
+    for m in validas:
+        raiz = asignacion.get(m[3])
+        if raiz is not None:
+            por_raiz[raiz].append(m)
+
+    # IDs heredados del operadores.csv anterior: el ID no depende de qué variante es la raíz
+    previos = leer_operadores(OUT_OPS)
+    ids = asignar_ids({raiz: {m[3] for m in ms} for raiz, ms in por_raiz.items()}, previos)
+
+    operadores = []
+    for raiz, ms in por_raiz.items():
+        cuenta = Counter(m[3] for m in ms)
+        nombre = sorted(cuenta, key=lambda n: (-cuenta[n], -len(n), n))[0]
+        operadores.append({
+            'operador_id': ids[raiz],
+            'nombre':      nombre,
+            'variantes':   ' | '.join(sorted(cuenta)),
+            'fuentes':     ' | '.join(sorted({m[0] for m in ms})),
+            'n_rutas':     len(ms),
+        })
+    operadores.sort(key=lambda o: (-o['n_rutas'], o['nombre']))
+
+    filas = []
+    for fuente, cod, raw, emp in menciones:
+        raiz = asignacion.get(emp) if emp.strip().lower() not in PLACEHOLDERS else None
+        filas.append({'fuente': fuente, 'codigo': cod, 'empresa_raw': raw, 'empresa': emp,
+                      'operador_id': ids[raiz] if raiz else ''})
+    filas.sort(key=lambda r: (r['fuente'], r['codigo']))
+
+    OUT_OPS.parent.mkdir(parents=True, exist_ok=True)
+    with open(OUT_OPS, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=['operador_id', 'nombre', 'variantes', 'fuentes', 'n_rutas'])
+        w.writeheader()
+        w.writerows(operadores)
+    with open(OUT_RUTAS, 'w', newline='', encoding='utf-8') as f:
+        w = csv.DictWriter(f, fieldnames=['fuente', 'codigo', 'empresa_raw', 'empresa', 'operador_id'])
+        w.writeheader()
+        w.writerows(filas)
+
+    multi = sum(1 for o in operadores if ' | ' in o['variantes'])
+    print(f'Nombres distintos: {stats["claves"]}  operadores: {len(operadores)}  '
+          f'(con más de una variante: {multi})')
+    print(f'Pares comparados: {stats["pares"]} de {stats["pares_todos"]} posibles  '
+          f'uniones: {stats["unidos"]}  bloques omitidos: {stats["bloques_omitidos"]}')
+    heredados = sum(1 for oid in ids.values() if oid in previos)
+    print(f'IDs heredados de la corrida anterior: {heredados}  nuevos: {len(ids) - heredados}')
+    print(f'Listo en {time.perf_counter() - t0:.1f}s -> {OUT_OPS.name}, {OUT_RUTAS.name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+"""
+run_pipeline.py
+Corre las etapas del pipeline (WikiRoutes + ATU + Wikipedia) según sus
+entradas y salidas declaradas en ETAPAS.
+
+- Una etapa se salta si el hash de contenido de sus entradas (y de su propio
+  script) no cambió desde la última corrida exitosa y sus salidas siguen ahí.
+- Las etapas independientes corren en paralelo; una etapa espera a las que
+  producen sus entradas.
+- --watch vigila pipeline/input/* y data/processed/transporte y vuelve a correr
+  solo lo afectado cuando algo cambia.
+
+Uso:
+    python3 pipeline/scripts/run_pipeline.py              # todo lo automático
+    python3 pipeline/scripts/run_pipeline.py --list       # etapas y estado
+    python3 pipeline/scripts/run_pipeline.py --stage wr_build_codes --force
+    python3 pipeline/scripts/run_pipeline.py --stage wr_build_catalog   # descarga (manual)
+    python3 pipeline/scripts/run_pipeline.py --watch
+
+Estado y hashes en pipeline/cache/run_pipeline_state.json
+Qué salidas se versionan y cuáles no: docs/ARTEFACTOS.md
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT       = Path(__file__).resolve().parents[2]
+SCRIPTS    = ROOT / 'pipeline/scripts'
+STATE_JSON = ROOT / 'pipeline/cache/run_pipeline_state.json'
+
+TRANSPORTE = 'data/processed/transporte'
+PDF_ATU    = 'docs/paraderos_ATU/Actualización del Plan Regulador de Rutas/RUTA_*.pdf'
+
+# Lo que vigila --watch
+WATCH_GLOBS = ['pipeline/input/*', f'{TRANSPORTE}/route_*/*']
+
+
+@dataclass
+class Etapa:
+    nombre: str
+    script: str                      # relativo a pipeline/scripts
+    entradas: List[str]              # globs relativos a ROOT
+    salidas: List[str]               # archivos relativos a ROOT
+    args: List[str] = field(default_factory=list)
+    codigo: List[str] = field(default_factory=list)   # módulos propios que importa el script
+    manual: bool = False             # solo corre si se pide con --stage
+
+
+ETAPAS = [
+    Etapa('wr_build_catalog', 'wikiroutes/wr_build_catalog.py',
+          entradas=[],
+          salidas=['pipeline/output/wr_map.json', 'config/wr_overrides.json'],
+          codigo=['wikiroutes/wr_scrape.py', 'wikiroutes/wr_crawl.py', 'wikiroutes/wr_journal.py'],
+          manual=True),   # red + Chrome visible: no se dispara solo
+    Etapa('scrap_wikipedia_rutas', 'scrap_wikipedia_rutas.py',
+          entradas=['pipeline/input/wikipedia.html'],
+          salidas=['pipeline/output/lista_rutas_nuevas.csv', 'pipeline/output/lista_rutas_antiguas.csv'],
+          codigo=['empresa_norm.py', 'wikiroutes/wr_route_meta.py']),
+    Etapa('build_lista_rutas_atu', 'build_lista_rutas_atu.py',
+          entradas=['pipeline/output/lista_rutas_nuevas.csv', PDF_ATU],
+          salidas=['pipeline/output/lista_rutas_maestro.csv'],
+          codigo=['atu_pdf_cache.py', 'empresa_norm.py']),
+    Etapa('wr_sync_indexes', 'wikiroutes/wr_sync_indexes.py',
+          entradas=['pipeline/input/lista_rutas.csv', 'config/wr_overrides.json',
+                    f'{TRANSPORTE}/route_*/route.json', f'{TRANSPORTE}/route_*/route.html',
+                    f'{TRANSPORTE}/route_*/route_track_trip*.geojson'],
+          salidas=['pipeline/output/wr_map.json', 'config/wr_overrides.json',
+                   'pipeline/output/unmatched_routes.json', 'config/no_display_id_skips.json'],
+          args=['--mode', 'incremental'],
+          codigo=['wikiroutes/wr_route_meta.py', 'wikiroutes/wr_journal.py']),
+    Etapa('wr_build_codes', 'wikiroutes/wr_build_codes.py',
+          entradas=['pipeline/input/lista_rutas.csv',
+                    f'{TRANSPORTE}/route_*/route.json', f'{TRANSPORTE}/route_*/route.html'],
+          salidas=['pipeline/output/wr_codes_master.csv'],
+          codigo=['wikiroutes/wr_route_meta.py', 'wikiroutes/wr_journal.py']),
+    Etapa('wr_build_extremes', 'wikiroutes/wr_build_extremes.py',
+          entradas=[f'{TRANSPORTE}/route_*/route.html'],
+          salidas=['pipeline/output/wr_extremes.json'],
+          codigo=['wikiroutes/wr_route_meta.py', 'wikiroutes/wr_journal.py']),
+    Etapa('wr_build_bundle', 'wikiroutes/wr_build_bundle.py',
+          entradas=[f'{TRANSPORTE}/route_*/*.geojson'],
+          salidas=[f'{TRANSPORTE}/rutas.bin']),
+    Etapa('wr_build_lod', 'wikiroutes/wr_build_lod.py',
+          entradas=[f'{TRANSPORTE}/route_*/route_track*.geojson', f'{TRANSPORTE}/route_*/line_approx.geojson'],
+          salidas=[f'{TRANSPORTE}/rutas_lod.bin'],
+          codigo=['wikiroutes/wr_build_bundle.py']),
+    Etapa('wr_build_stops', 'wikiroutes/wr_build_stops.py',
+          entradas=[f'{TRANSPORTE}/route_*/stops_trip*.geojson'],
+          salidas=['data/processed/paraderos/paraderos.json', 'data/processed/paraderos/viajes.json'],
+          codigo=['wikiroutes/wr_build_bundle.py']),
+    Etapa('build_teselas', 'build_teselas.py',
+          entradas=[f'{TRANSPORTE}/route_*/*.geojson', 'pipeline/output/wr_map.json',
+                    'data/processed/metro/metro.geojson', 'data/processed/corredores/corredores.json',
+                    'data/processed/metropolitano/*.json'],
+          salidas=['data/processed/teselas/meta.json'],
+          codigo=['wikiroutes/wr_build_lod.py']),
+    Etapa('indice_espacial', 'indice_espacial.py',
+          entradas=[f'{TRANSPORTE}/route_*/*.geojson', 'pipeline/output/wr_map.json',
+                    'data/processed/metro/metro.geojson', 'data/processed/corredores/corredores.json',
+                    'data/processed/metropolitano/*.json'],
+          salidas=['pipeline/output/indice_espacial.npz'],
+          codigo=['build_teselas.py', 'wikiroutes/wr_build_lod.py']),
+    Etapa('comparar_rutas', 'comparar_rutas.py',
+          entradas=['pipeline/output/wr_codes_master.csv', PDF_ATU, f'{TRANSPORTE}/route_*/route.html'],
+          salidas=['pipeline/output/comparacion_rutas.csv'],
+          codigo=['atu_pdf_cache.py', 'wikiroutes/wr_route_meta.py', 'wikiroutes/wr_journal.py']),
+    Etapa('operadores', 'operadores.py',
+          entradas=['pipeline/output/lista_rutas_nuevas.csv', 'pipeline/output/lista_rutas_antiguas.csv',
+                    f'{TRANSPORTE}/route_*/route.json', f'{TRANSPORTE}/route_*/route.html'],
+          salidas=['pipeline/output/operadores.csv', 'pipeline/output/rutas_operador.csv'],
+          codigo=['empresa_norm.py', 'build_lista_rutas_atu.py', 'wikiroutes/wr_route_meta.py',
+                  'wikiroutes/wr_journal.py']),
+    Etapa('build_bibliografia', 'build_bibliografia.py',
+          entradas=['pipeline/output/wr_codes_master.csv', 'pipeline/input/lista_rutas.csv',
+                    'pipeline/output/wr_extremes.json'],
+          salidas=['pipeline/output/bibliografia_rutas.csv']),
+]
+
+
+# ── Hashes de contenido (memorizados por tamaño/mtime) ───────────────────────
+
+class Hashes:
+    def __init__(self, memo: Optional[Dict] = None):
+        self.memo: Dict[str, List] = memo or {}
+        self._lock = threading.Lock()
+
+    def archivo(self, rel: str) -> str:
+        p = ROOT / rel
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            return ''
+        with self._lock:
+            hit = self.memo.get(rel)
+            if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+                return hit[2]
+        h = hashlib.sha1()
+        with open(p, 'rb') as f:
+            for bloque in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloque)
+        digest = h.hexdigest()
+        with self._lock:
+            self.memo[rel] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def globs(self, patrones: List[str]) -> str:
+        h = hashlib.sha1()
+        for pat in patrones:
+            h.update(pat.encode('utf-8'))
+            for rel in expandir(pat):
+                h.update(rel.encode('utf-8'))
+                h.update(self.archivo(rel).encode('ascii'))
+        return h.hexdigest()
+
+
+def expandir(patron: str) -> List[str]:
+    if not glob.has_magic(patron):
+        return [patron] if (ROOT / patron).is_file() else []
+    return sorted(Path(p).relative_to(ROOT).as_posix()
+                  for p in glob.glob(str(ROOT / patron)) if Path(p).is_file())
+
+
+def firma_stat(patrones: List[str]) -> str:
+    """Firma barata (solo stat) para detectar cambios en --watch."""
+    h = hashlib.sha1()
+    for pat in patrones:
+        for p in sorted(glob.glob(str(ROOT / pat))):
+            try:
+                st = Path(p).stat()
+            except FileNotFoundError:
+                continue
+            h.update(f'{p}|{st.st_size}|{st.st_mtime_ns}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+# ── Estado ──────────────────────────────────────────────────────────────────
+
+def cargar_estado() -> Dict:
+    try:
+        return json.loads(STATE_JSON.read_text(encoding='utf-8'))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'stages': {}, 'files': {}}
+
+
+def guardar_estado(estado: Dict) -> None:
+    STATE_JSON.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_JSON.with_name(STATE_JSON.name + '.tmp')
+    tmp.write_text(json.dumps(estado, ensure_ascii=False, indent=1), encoding='utf-8')
+    tmp.replace(STATE_JSON)
+
+
+# ── Grafo ───────────────────────────────────────────────────────────────────
+
+def dependencias(etapas: List[Etapa]) -> Dict[str, List[str]]:
+    """Etapa -> etapas que producen alguna de sus entradas (sin contar la propia)."""
+    productores: Dict[str, List[str]] = {}
+    for e in etapas:
+        for s in e.salidas:
+            productores.setdefault(s, []).append(e.nombre)
+    deps: Dict[str, List[str]] = {}
+    orden = [e.nombre for e in etapas]
+    for e in etapas:
+        ds = set()
+        for pat in e.entradas:
+            for salida, prods in productores.items():
+                if salida == pat or (glob.has_magic(pat) and Path(salida).match(pat)):
+                    ds.update(p for p in prods if p != e.nombre and orden.index(p) < orden.index(e.nombre))
+        deps[e.nombre] = sorted(ds, key=orden.index)
+    return deps
+
+
+def hash_entradas(e: Etapa, hashes: Hashes) -> str:
+    codigo = [f'pipeline/scripts/{c}' for c in [e.script] + e.codigo]
+    h = hashlib.sha1()
+    h.update(hashes.globs(codigo + e.entradas).encode('ascii'))
+    h.update(json.dumps(e.args).encode('utf-8'))
+    return h.hexdigest()
+
+
+def al_dia(e: Etapa, estado: Dict, hashes: Hashes) -> bool:
+    prev = estado['stages'].get(e.nombre)
+    if not prev or prev.get('inputs') != hash_entradas(e, hashes):
+        return False
+    return all(hashes.archivo(s) == prev.get('outputs', {}).get(s) for s in e.salidas)
+
+
+def correr_etapa(e: Etapa) -> subprocess.CompletedProcess:
+    cmd = [sys.executable, str(SCRIPTS / e.script)] + e.args
+    return subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+
+
+def correr(seleccion: Optional[List[str]], force: bool, jobs: int, dry_run: bool) -> bool:
+    etapas = {e.nombre: e for e in ETAPAS}
+    deps = dependencias(ETAPAS)
+    if seleccion:
+        desconocidas = [s for s in seleccion if s not in etapas]
+        if desconocidas:
+            raise SystemExit(f'Etapas desconocidas: {desconocidas}. Ver --list')
+        objetivo = set(seleccion)
+    else:
+        objetivo = {n for n, e in etapas.items() if not e.manual}
+
+    estado = cargar_estado()
+    hashes = Hashes(estado.get('files'))
+    pendientes = [n for n in etapas if n in objetivo]
+    hechas: Dict[str, str] = {}     # nombre -> 'ok' | 'skip' | 'error' | 'bloqueada'
+    en_curso = {}
+    t0 = time.perf_counter()
+
+    def listas():
+        out = []
+        for n in pendientes:
+            ds = [d for d in deps[n] if d in objetivo]
+            if all(d in hechas for d in ds):
+                out.append(n)
+        return out
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        while pendientes or en_curso:
+            for n in listas():
+                pendientes.remove(n)
+                e = etapas[n]
+                ds = [d for d in deps[n] if d in objetivo]
+                if any(hechas[d] in ('error', 'bloqueada') for d in ds):
+                    hechas[n] = 'bloqueada'
+                    print(f'[--] {n}: no corre, falló una etapa previa')
+                    continue
+                # Si ninguna dependencia cambió nada, vale el hash de entradas
+                # (en --dry-run no hay salidas nuevas: lo que sigue a algo que correría, también correría)
+                previa = dry_run and any(hechas[d] == 'ok' for d in ds)
+                if not force and not previa and al_dia(e, estado, hashes):
+                    hechas[n] = 'skip'
+                    print(f'[=] {n}: sin cambios')
+                    continue
+                if dry_run:
+                    hechas[n] = 'ok'
+                    print(f'[>] {n}: correría')
+                    continue
+                print(f'[>] {n}: corriendo...')
+                en_curso[ex.submit(correr_etapa, e)] = (n, time.perf_counter())
+            if not en_curso:
+                continue
+            listos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for fut in listos:
+                n, t_ini = en_curso.pop(fut)
+                e = etapas[n]
+                dt = time.perf_counter() - t_ini
+                res = fut.result()
+                if res.returncode == 0:
+                    hechas[n] = 'ok'
+                    # Hashes después de correr: si la etapa reescribe una de sus
+                    # entradas (wr_overrides.json), la próxima vez ya cuenta como vista
+                    estado['stages'][n] = {
+                        'inputs': hash_entradas(e, hashes),
+                        'outputs': {s: hashes.archivo(s) for s in e.salidas},
+                        'seconds': round(dt, 2),
+                        'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    }
+                    estado['files'] = hashes.memo
+                    guardar_estado(estado)
+                    print(f'[OK] {n} ({dt:.1f}s)')
+                else:
+                    hechas[n] = 'error'
+                    print(f'[ERROR] {n} ({dt:.1f}s) código {res.returncode}')
+                    cola = (res.stderr or res.stdout or '').strip().splitlines()[-15:]
+                    for linea in cola:
+                        print(f'    {linea}')
+
+    estado['files'] = hashes.memo
+    if not dry_run:
+        guardar_estado(estado)
+    resumen = {k: sum(1 for v in hechas.values() if v == k) for k in ('ok', 'skip', 'error', 'bloqueada')}
+    print(f'Pipeline en {time.perf_counter() - t0:.1f}s: '
+          + ', '.join(f'{k}={v}' for k, v in resumen.items()))
+    return resumen['error'] == 0 and resumen['bloqueada'] == 0
+
+
+def listar() -> None:
+    estado = cargar_estado()
+    hashes = Hashes(estado.get('files'))
+    deps = dependencias(ETAPAS)
+    for e in ETAPAS:
+        st = 'manual' if e.manual else ('al día' if al_dia(e, estado, hashes) else 'pendiente')
+        prev = estado['stages'].get(e.nombre, {})
+        extra = f"  última: {prev['ts']} ({prev['seconds']}s)" if prev else ''
+        print(f'{e.nombre:<22} {st:<9} depende de: {", ".join(deps[e.nombre]) or "-"}{extra}')
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Corre el pipeline saltando etapas sin cambios')
+    ap.add_argument('--stage', nargs='+', help='Corre solo estas etapas (incluye las manuales)')
+    ap.add_argument('--force', action='store_true', help='Corre aunque las entradas no hayan cambiado')
+    ap.add_argument('--jobs', type=int, default=3, help='Etapas en paralelo')
+    ap.add_argument('--dry-run', action='store_true', help='Muestra qué correría sin ejecutar nada')
+    ap.add_argument('--list', action='store_true', help='Lista etapas, dependencias y estado')
+    ap.add_argument('--watch', action='store_true',
+                    help='Vigila pipeline/input/* y data/processed/transporte y re-corre lo afectado')
+    ap.add_argument('--interval', type=float, default=2.0, help='Segundos entre sondeos de --watch')
+    args = ap.parse_args(argv)
+
+    if args.list:
+        listar()
+        return
+
+    ok = correr(args.stage, args.force, args.jobs, args.dry_run)
+    if not args.watch:
+        raise SystemExit(0 if ok else 1)
+
+    sys.stdout.reconfigure(line_buffering=True)
+    print(f'Vigilando {", ".join(WATCH_GLOBS)} (Ctrl-C para salir)')
+    firma = firma_stat(WATCH_GLOBS)
+    try:
+        while True:
+            time.sleep(args.interval)
+            nueva = firma_stat(WATCH_GLOBS)
+            if nueva == firma:
+                continue
+            # Esperar a que termine de escribirse (p. ej. una descarga en curso)
+            time.sleep(args.interval)
+            firma = firma_stat(WATCH_GLOBS)
+            print(f'\n[{time.strftime("%H:%M:%S")}] cambios detectados')
+            correr(args.stage, False, args.jobs, args.dry_run)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
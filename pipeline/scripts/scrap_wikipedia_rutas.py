@@ -9,103 +9,49 @@ y produce dos CSVs:
 
 Uso:
     python3 pipeline/scripts/scrap_wikipedia_rutas.py
+    python3 pipeline/scripts/scrap_wikipedia_rutas.py --verificar   # stream vs BeautifulSoup
+    python3 pipeline/scripts/scrap_wikipedia_rutas.py --bench
 
 El archivo wikipedia.html debe estar en pipeline/input/wikipedia.html
+(no se versiona). --verificar y --bench usan la página sintética de
+pipeline/scripts/fixtures/wikipedia/ cuando no está.
 """
 
+import argparse
 import csv
+import json
 import re
+import sys
+import time
+from collections import namedtuple
 from pathlib import Path
 from bs4 import BeautifulSoup
 
+from empresa_norm import NormalizadorEmpresa, PREFIJOS_WIKIPEDIA
 
-ROOT    = Path('/workspaces/limarutas')
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'wikiroutes'))
+from wr_route_meta import FragmentosRuta  # noqa: E402
+
+
+ROOT    = Path(__file__).resolve().parents[2]
 HTML_IN = ROOT / 'pipeline/input/wikipedia.html'
 OUT_NEW = ROOT / 'pipeline/output/lista_rutas_nuevas.csv'
 OUT_OLD = ROOT / 'pipeline/output/lista_rutas_antiguas.csv'
 
+# Página sintética con las tablas de Wikipedia (wikitable nuevas, antiguas con
+# y sin alias) y las filas que se esperan; --verificar la usa siempre
+FIXTURE_HTML     = ROOT / 'pipeline/scripts/fixtures/wikipedia/wikipedia_rutas.html'
+FIXTURE_ESPERADO = ROOT / 'pipeline/scripts/fixtures/wikipedia/esperado.json'
 
-# ── Normalización de empresa ──────────────────────────────────────────────────
+
+# ── Normalización de empresa (prefijos y limpieza en empresa_norm.py) ────────
 
 ESTADO_KEYWORDS = re.compile(
     r'^\s*(desierta|inactiva|activa|proyectada|suspendida)',
     re.IGNORECASE
 )
 
-PREFIJOS = [
-    r'Corporaci[oó]n Empresa de Transportes Urbano',
-    r'Corporaci[oó]n Inversiones',
-    r'Corporaci[oó]n',
-    r'Cooperativa de Servicios Especiales Transportes',
-    r'Cooperativa de Transportes',
-    r'Cooperativa de Transporte',
-    r'Comunicaci[oó]n Integral Turismo e Inversiones',
-    r'Agrupaci[oó]n de Transportistas en Camionetas\s+S\.?A\.?C?\.?',
-    r'Agrupaci[oó]n de Transportistas en Camionetas',
-    r'Empresa de Servicios y Transportes',
-    r'Empresa de Servicios de Transportes',
-    r'Empresa de Servicios de Transporte',
-    r'Empresa de Servicios M[uú]ltiples',
-    r'Empresa de Servicio Especial de Transporte',
-    r'Empresa de Transportes,?\s+Servicios,?\s+Comercializadora,.+',
-    r'Empresa de Transportes,?\s+Inversiones y Servicios',
-    r'Empresa de Transporte,?\s+Servicios\s+y\s+Comercializaci[oó]n',
-    r'Empresa de Transporte\s+de\s+Servicio\s+de\s+Transportes',
-    r'Empresa de Transporte\s+de\s+Servicio',
-    r'Empresa de Transporte\s+y\s+Turismos?\s+Especiales',
-    r'Empresa de Transporte\s+y\s+Turismos?',
-    r'Empresa de Transportes y Servicios M[uú]ltiples',
-    r'Empresa de Transportes y Servicios',
-    r'Empresa de Transportes',
-    r'Empresa de Transporte y Servicios',
-    r'Empresa de Transporte',
-    r'Empresa Business Corporation',
-    r'Empresa',
-    r'Grupo Express del Per[uú]\s+S\.?A\.?C?\.?',
-    r'Grupo',
-    r'Multiservicios de Buses de',
-    r'Multiservicios e Inversiones',
-    r'Inversiones\s+Empresa\s+de\s+Transportes',
-    r'Inversiones y Servicios M[uú]ltiples',
-    r'Inversiones y Servicios',
-    r'Servicios Generales y Transportes',
-    r'Servicio Interconectado de Transporte',
-    r'Transportes e Inversiones',
-    r'Transportes y Servicios M[uú]ltiples',
-    r'Transportes y Servicios',
-    r'Transportes,?\s+Inversiones y Servicios',
-    r'Transportes',
-    r'Trans\.',
-    r'y\s+Representaciones',
-    r'y\s+Multiservicios',
-    r'y\s+Service\b',
-    r'e\s+Inversiones\s+M[uú]ltiples',
-    r'y\s+Turismos?\b',
-    r'de\s+Multiservicios',
-    r'de\s+Servicio\s+R[aá]pido',
-    r'de\s+Servicio\s+Urbano',
-    r'de\s+Servicios\s+Urbanos',
-    r'de\s+Transportes?,\s+Servicios.+',
-    r'de\s+Transportes?,\s+Inversiones.+',
-    r'de\s+Transporte,\s+Servicios.+',
-]
-
-SUFIJOS_JURIDICOS = re.compile(
-    r'\s*\b(S\.A\.C\.|S\.A\.|S\.A\b|E\.I\.R\.L\.|EIRL|Ltda\.|Ltda|S\.R\.L\.)\s*$',
-    re.IGNORECASE
-)
-
-INICIO_RESIDUAL = re.compile(
-    r'^(del?\s+|de\s+los\s+|de\s+las\s+|y\s+|e\s+)',
-    re.IGNORECASE
-)
-
-
-def extraer_abrev(texto):
-    m = re.search(r'\(([A-Z][A-Z0-9\s\-]{0,14})\)\s*$', texto)
-    if m:
-        return m.group(1).strip()
-    return ''
+_EMPRESA = NormalizadorEmpresa(PREFIJOS_WIKIPEDIA)
 
 
 def limpiar_empresa(texto_raw):
@@ -120,34 +66,7 @@ def limpiar_empresa(texto_raw):
     if texto in ('', '¿?', 'Desconocido'):
         return 'Desconocido', ''
 
-    texto = texto.split('/')[0].strip()
-
-    # Quitar paréntesis con contenido largo (nombre alternativo)
-    texto = re.sub(r'\s*\([^)]{16,}\)', '', texto).strip()
-
-    abrev = extraer_abrev(texto)
-
-    # Quitar paréntesis de abreviatura
-    texto = re.sub(r'\s*\([A-Z][A-Z0-9\s\-]{0,14}\)\s*$', '', texto).strip()
-
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-
-    # Quitar prefijo (primer match)
-    for prefijo in PREFIJOS:
-        nuevo = re.sub(r'^\s*' + prefijo + r'\s*', '', texto, flags=re.IGNORECASE)
-        if nuevo != texto:
-            texto = nuevo.strip()
-            break
-
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-    texto = INICIO_RESIDUAL.sub('', texto).strip()
-    texto = SUFIJOS_JURIDICOS.sub('', texto).strip()
-
-    # Si quedó vacío pero había abreviatura, usarla como nombre
-    if not texto and abrev:
-        return abrev, abrev
-
-    return (texto if texto else 'Desconocido'), abrev
+    return _EMPRESA.limpiar(texto)
 
 
 # ── Normalización de color ────────────────────────────────────────────────────
@@ -185,15 +104,20 @@ def normalizar_color(hex_color, l_min=0.35, l_max=0.58):
 
 # ── Extracción de color ───────────────────────────────────────────────────────
 
-def extraer_color(td):
-    span = td.find('span', style=True)
-    if span:
-        m = re.search(r'background\s*:\s*(#[0-9A-Fa-f]{3,6})', span.get('style', ''))
+def color_de_estilo(estilo):
+    """Color de fondo del primer <span style=...> de la celda."""
+    if estilo is not None:
+        m = re.search(r'background\s*:\s*(#[0-9A-Fa-f]{3,6})', estilo)
         if m:
             return normalizar_color(m.group(1).upper())
     return '#5A6470'
 
 
+def extraer_color(td):
+    span = td.find('span', style=True)
+    return color_de_estilo(span.get('style', '') if span else None)
+
+
 def normalizar_estado(texto):
     t = texto.strip()
     if not t or t in ('¿?', '?'):
@@ -206,51 +130,185 @@ def normalizar_estado(texto):
     return t
 
 
-def celda(td):
-    t = td.get_text(strip=True)
+def limpiar_celda(t):
     # Quitar referencias wikipedia [N] y [nota N]
     t = re.sub(r'\[\d+\]|\[nota\s*\d+\]', '', t)
     t = re.sub(r'\u200b', '', t)
     return t.strip()
 
 
-# ── Main ─────────────────────────────────────────────────────────────────────
+def celda(td):
+    return limpiar_celda(td.get_text(strip=True))
 
-def main():
-    print(f'Leyendo {HTML_IN}')
-    with open(HTML_IN, encoding='utf-8') as f:
+
+# ── Lectura de tablas ─────────────────────────────────────────────────────────
+#
+# Cada tabla se entrega como (headers, filas): headers son los <th> de la
+# primera fila; cada fila es una lista de Celda(texto, color) con todos los
+# <td>/<th> de la fila. tablas_stream() lo arma con un parser por eventos
+# que solo junta texto dentro de table.wikitable; tablas_bs() es la versión
+# con BeautifulSoup, que queda como referencia para --verificar y --bench.
+
+Celda = namedtuple('Celda', 'texto color')
+
+
+class _CeldaAbierta:
+    __slots__ = ('tag', 'strings', 'estilo')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.strings = []
+        self.estilo = None
+
+    def append(self, s):
+        self.strings.append(s)
+
+    def texto(self):
+        # = td.get_text(strip=True)
+        return ''.join(x.strip() for x in self.strings)
+
+
+class _Tabla:
+    __slots__ = ('filas', 'cerrada')
+
+    def __init__(self):
+        self.filas = []
+        self.cerrada = False
+
+
+class TablasWiki(FragmentosRuta):
+    """
+    Mismas reglas de árbol que html.parser de BeautifulSoup (ver FragmentosRuta),
+    pero sin guardar el texto del documento: solo abre buckets para las
+    celdas de filas dentro de table.wikitable. Las tablas terminadas quedan
+    en `listas`, en orden de apertura (el de find_all).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.guardar_strings = False
+        self.listas = []
+        self._tablas = []          # todas las wikitable, en orden de apertura
+        self._entregadas = 0
+        self._tablas_abiertas = []
+        self._filas_abiertas = []
+        self._celdas_abiertas = []
+
+    def _abrir(self, tag, attr):
+        if tag == 'table' and 'wikitable' in attr.get('class', '').split():
+            t = _Tabla()
+            self._tablas.append(t)
+            self._tablas_abiertas.append(t)
+            return None, t
+        if not self._tablas_abiertas:
+            return None, None
+        if tag == 'tr':
+            fila = []
+            for t in self._tablas_abiertas:
+                t.filas.append(fila)
+            self._filas_abiertas.append(fila)
+            return None, fila
+        if tag in ('td', 'th') and self._filas_abiertas:
+            c = _CeldaAbierta(tag)
+            for fila in self._filas_abiertas:
+                fila.append(c)
+            self._celdas_abiertas.append(c)
+            return c, c
+        if tag == 'span' and 'style' in attr:
+            for c in self._celdas_abiertas:
+                if c.estilo is None:
+                    c.estilo = attr['style']
+        return None, None
+
+    def _cerrar(self, tag, dato):
+        # Se cierran en orden de pila: el abierto más reciente de cada tipo
+        if isinstance(dato, _Tabla):
+            dato.cerrada = True
+            self._tablas_abiertas.pop()
+            self._entregar()
+        elif isinstance(dato, _CeldaAbierta):
+            self._celdas_abiertas.pop()
+        else:
+            self._filas_abiertas.pop()
+
+    def _entregar(self):
+        while self._entregadas < len(self._tablas) and self._tablas[self._entregadas].cerrada:
+            t = self._tablas[self._entregadas]
+            self._entregadas += 1
+            self.listas.append(_armar_tabla(t.filas))
+
+    def close(self):
+        super().close()
+        # Tablas sin </table>: BeautifulSoup las cierra al final del documento
+        for t in self._tablas:
+            t.cerrada = True
+        self._entregar()
+
+
+def _armar_tabla(filas_abiertas):
+    filas = [[Celda(limpiar_celda(c.texto()), c.estilo) for c in fila] for fila in filas_abiertas]
+    headers = [c.texto() for c in filas_abiertas[0] if c.tag == 'th'] if filas_abiertas else []
+    return headers, filas
+
+
+def tablas_stream(path, bloque=1 << 16):
+    """Genera (headers, filas) por cada table.wikitable a medida que se lee el archivo."""
+    parser = TablasWiki()
+    with open(path, encoding='utf-8') as f:
+        while True:
+            trozo = f.read(bloque)
+            if not trozo:
+                break
+            parser.feed(trozo)
+            while parser.listas:
+                yield parser.listas.pop(0)
+    parser.close()
+    while parser.listas:
+        yield parser.listas.pop(0)
+
+
+def tablas_bs(path):
+    """Referencia: el recorrido original con BeautifulSoup."""
+    with open(path, encoding='utf-8') as f:
         soup = BeautifulSoup(f, 'html.parser')
+    for table in soup.find_all('table', class_='wikitable'):
+        rows = table.find_all('tr')
+        headers = [th.get_text(strip=True) for th in rows[0].find_all('th')] if rows else []
+        filas = []
+        for row in rows:
+            cols = row.find_all(['td', 'th'])
+            filas.append([Celda(celda(td), td.find('span', style=True) and
+                                td.find('span', style=True).get('style', '')) for td in cols])
+        yield headers, filas
+
 
-    tables = soup.find_all('table', class_='wikitable')
-    print(f'Tablas encontradas: {len(tables)}')
+# ── Filas de salida ───────────────────────────────────────────────────────────
 
+def extraer_rutas(tablas):
     filas_nuevas   = []
     filas_antiguas = []
 
-    for table in tables:
-        rows = table.find_all('tr')
+    for headers, rows in tablas:
         if not rows:
             continue
 
-        headers  = [th.get_text(strip=True) for th in rows[0].find_all('th')]
         es_nueva = 'Código Anterior' in headers
         # Tablas antiguas sin columna Seudónimo (8xxx, 9xxx)
         tiene_alias = 'Seudónimo o alias' in headers
 
-        for row in rows[1:]:
-            cols = row.find_all(['td', 'th'])
+        for cols in rows[1:]:
             if not cols:
                 continue
 
             if es_nueva and len(cols) >= 6:
                 # Ruta | Cod.Anterior | Seudónimo | Origen | Destino | Empresa
-                codigo_nuevo   = celda(cols[0])
-                codigo_antiguo = celda(cols[1])
-                alias          = celda(cols[2])
-                origen         = celda(cols[3])
-                destino        = celda(cols[4])
-                empresa_raw    = celda(cols[5])
-                color          = extraer_color(cols[0])
+                codigo_nuevo   = cols[0].texto
+                codigo_antiguo = cols[1].texto
+                alias          = cols[2].texto
+                origen         = cols[3].texto
+                destino        = cols[4].texto
+                empresa_raw    = cols[5].texto
+                color          = color_de_estilo(cols[0].color)
 
                 if not re.match(r'^\d{4}$', codigo_nuevo):
                     continue
@@ -273,22 +331,22 @@ def main():
             elif not es_nueva:
                 if tiene_alias and len(cols) >= 5:
                     # Ruta | Seudónimo | Origen | Destino | Empresa | Estado
-                    codigo_antiguo = celda(cols[0])
-                    alias          = celda(cols[1])
-                    origen         = celda(cols[2])
-                    destino        = celda(cols[3])
-                    empresa_raw    = celda(cols[4])
-                    estado         = normalizar_estado(celda(cols[5])) if len(cols) >= 6 else ''
-                    color          = extraer_color(cols[0])
+                    codigo_antiguo = cols[0].texto
+                    alias          = cols[1].texto
+                    origen         = cols[2].texto
+                    destino        = cols[3].texto
+                    empresa_raw    = cols[4].texto
+                    estado         = normalizar_estado(cols[5].texto) if len(cols) >= 6 else ''
+                    color          = color_de_estilo(cols[0].color)
                 elif not tiene_alias and len(cols) >= 4:
                     # Ruta | Origen | Destino | Empresa | Estado
-                    codigo_antiguo = celda(cols[0])
+                    codigo_antiguo = cols[0].texto
                     alias          = 'Desconocido'
-                    origen         = celda(cols[1])
-                    destino        = celda(cols[2])
-                    empresa_raw    = celda(cols[3])
-                    estado         = normalizar_estado(celda(cols[4])) if len(cols) >= 5 else ''
-                    color          = extraer_color(cols[0])
+                    origen         = cols[1].texto
+                    destino        = cols[2].texto
+                    empresa_raw    = cols[3].texto
+                    estado         = normalizar_estado(cols[4].texto) if len(cols) >= 5 else ''
+                    color          = color_de_estilo(cols[0].color)
                 else:
                     continue
 
@@ -321,8 +379,80 @@ def main():
                 out.append(r)
         return out
 
-    filas_nuevas   = dedup(filas_nuevas,   'codigo_nuevo')
-    filas_antiguas = dedup(filas_antiguas, 'codigo_antiguo')
+    return dedup(filas_nuevas, 'codigo_nuevo'), dedup(filas_antiguas, 'codigo_antiguo')
+
+
+# ── Verificación y benchmark ──────────────────────────────────────────────────
+
+def verificar_fixture():
+    """Ambos extractores sobre la página sintética contra las filas de esperado.json."""
+    esperado = json.loads(FIXTURE_ESPERADO.read_text(encoding='utf-8'))
+    esperado = (esperado['nuevas'], esperado['antiguas'])
+    ok = True
+    for nombre, fn in (('stream', tablas_stream), ('bs4', tablas_bs)):
+        obtenido = extraer_rutas(fn(FIXTURE_HTML))
+        for tipo, a, b in zip(('nuevas', 'antiguas'), obtenido, esperado):
+            if a != b:
+                ok = False
+                distinta = next((y for x, y in zip(a, b) if x != y), None)
+                print(f'  [DIF] fixture {nombre} {tipo}: {len(a)} filas, esperadas {len(b)}'
+                      + (f'; primera distinta: {distinta["codigo_antiguo"]}' if distinta else ''))
+    print(f'Fixture {FIXTURE_HTML.name}: {len(esperado[0])} nuevas + {len(esperado[1])} antiguas  '
+          f'{"ok" if ok else "CON DIFERENCIAS"}')
+    return ok
+
+
+def verificar(path):
+    a = list(tablas_stream(path))
+    b = list(tablas_bs(path))
+    difs = sum(1 for x, y in zip(a, b) if x != y) + abs(len(a) - len(b))
+    print(f'Tablas: stream={len(a)} bs4={len(b)}  con diferencias: {difs}')
+    iguales = extraer_rutas(a) == extraer_rutas(b)
+    print(f'Filas de salida idénticas: {"sí" if iguales else "NO"}')
+    return difs == 0 and iguales
+
+
+def bench(path, repeticiones=3):
+    print(f'{path} ({Path(path).stat().st_size / 1024 / 1024:.1f} MB), mejor de {repeticiones}')
+    tiempos = {}
+    for nombre, fn in (('stream', tablas_stream), ('bs4', tablas_bs)):
+        mejor = None
+        for _ in range(repeticiones):
+            t0 = time.perf_counter()
+            extraer_rutas(fn(path))
+            dt = time.perf_counter() - t0
+            mejor = dt if mejor is None else min(mejor, dt)
+        tiempos[nombre] = mejor
+        print(f'  {nombre:<7} {mejor * 1000:8.0f} ms')
+    print(f'  aceleración: {tiempos["bs4"] / max(1e-9, tiempos["stream"]):.1f}x')
+
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+
+def main():
+    ap = argparse.ArgumentParser(description='Extrae las rutas de las tablas de Wikipedia')
+    ap.add_argument('--html', type=str, default=str(HTML_IN), help='HTML de Wikipedia guardado')
+    ap.add_argument('--verificar', action='store_true',
+                    help='Compara el extractor por eventos con BeautifulSoup y termina')
+    ap.add_argument('--bench', action='store_true', help='Mide ambos extractores sobre --html y termina')
+    args = ap.parse_args()
+
+    if args.verificar:
+        ok = verificar_fixture()
+        if Path(args.html).exists():
+            ok = verificar(args.html) and ok
+        else:
+            print(f'No está {args.html}: solo se verificó la fixture')
+        raise SystemExit(0 if ok else 1)
+    if args.bench:
+        bench(args.html if Path(args.html).exists() else FIXTURE_HTML)
+        return
+
+    print(f'Leyendo {args.html}')
+    tablas = list(tablas_stream(args.html))
+    print(f'Tablas encontradas: {len(tablas)}')
+
+    filas_nuevas, filas_antiguas = extraer_rutas(tablas)
 
     campos_nuevas   = ['codigo_antiguo','codigo_nuevo','distrito_origen','distrito_destino',
                        'empresa_operadora','empresa_abrev','alias','color_hex']
@@ -349,4 +479,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
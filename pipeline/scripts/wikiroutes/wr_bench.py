@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Benchmarks del scraper de WikiRoutes.
+#
+#   python wr_bench.py extract --url URL [URL ...]
+#       Segundos por ruta del modo "leaflet" (capas + clics) vs "network" (XHR vía DevTools).
+#
+#   python wr_bench.py profile --url URL [URL ...]
+#       Tiempo de carga y bytes transferidos por página con el perfil "full" vs "lean".
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from wr_scrape import DriverPool, scrape_route, wait_map_ready, EXTRACT_MODES, DRIVER_PROFILES
+
+
+def _leer_urls(args):
+    urls = list(args.url or [])
+    if args.urls_file:
+        for line in Path(args.urls_file).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+    if not urls:
+        raise SystemExit("Indica al menos una ruta con --url o --urls-file")
+    return urls
+
+
+def _resumen_salida(route_dir: Path):
+    out = {}
+    for p in sorted(route_dir.glob("route_track_trip*.geojson")) or [route_dir / "route_track.geojson"]:
+        if p.exists():
+            fc = json.loads(p.read_text(encoding="utf-8"))
+            out[p.name] = sum(len(f["geometry"]["coordinates"]) for f in fc.get("features", []))
+    return out
+
+
+def bench_extract(args):
+    urls = _leer_urls(args)
+    tiempos = {m: [] for m in EXTRACT_MODES}
+    salidas = {m: {} for m in EXTRACT_MODES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in EXTRACT_MODES:
+            out_root = Path(tmp) / mode
+            out_root.mkdir()
+            with DriverPool(size=1, headless=bool(args.headless), perf_log=(mode == "network")) as pool:
+                # Calentar el driver para no medir el arranque de Chrome
+                with pool.driver() as d:
+                    d.get("about:blank")
+                for _ in range(args.repeat):
+                    for url in urls:
+                        t0 = time.perf_counter()
+                        try:
+                            route_dir = scrape_route(url, out_root, pool=pool, mode=mode)
+                        except Exception as e:
+                            print(f"[ERROR] {mode} {url}: {e}")
+                            continue
+                        tiempos[mode].append(time.perf_counter() - t0)
+                        salidas[mode][url] = _resumen_salida(route_dir)
+
+    print("")
+    print("Segundos por ruta")
+    print(f"  {'modo':<8} {'n':>4} {'media':>8} {'mediana':>8} {'max':>8}")
+    for mode, ts in tiempos.items():
+        if ts:
+            print(f"  {mode:<8} {len(ts):>4} {statistics.mean(ts):>8.2f} {statistics.median(ts):>8.2f} {max(ts):>8.2f}")
+    a, b = tiempos["leaflet"], tiempos["network"]
+    if a and b:
+        print(f"  network / leaflet (mediana): {statistics.median(b) / statistics.median(a):.2f}x")
+
+    difieren = [u for u in urls if salidas["leaflet"].get(u) != salidas["network"].get(u)]
+    print(f"Rutas con vértices distintos entre modos: {len(difieren)} de {len(urls)}")
+    for u in difieren[:10]:
+        print(f"  {u}\n    leaflet={salidas['leaflet'].get(u)}\n    network={salidas['network'].get(u)}")
+
+
+JS_PAGE_STATS = """
+var nav = performance.getEntriesByType('navigation')[0] || {};
+var res = performance.getEntriesByType('resource');
+var bytes = nav.transferSize || 0;
+for (var i=0;i<res.length;i++) bytes += res[i].transferSize || 0;
+return {load_ms: nav.loadEventEnd || 0, dcl_ms: nav.domContentLoadedEventEnd || 0,
+        requests: res.length + 1, bytes: bytes};
+"""
+
+
+def bench_profile(args):
+    urls = _leer_urls(args)
+    filas = {p: [] for p in DRIVER_PROFILES}
+
+    for profile in DRIVER_PROFILES:
+        with DriverPool(size=1, headless=bool(args.headless), profile=profile) as pool:
+            with pool.driver() as d:
+                d.get("about:blank")
+            for _ in range(args.repeat):
+                for url in urls:
+                    with pool.driver() as d:
+                        t0 = time.perf_counter()
+                        try:
+                            d.get(url)
+                            wait_map_ready(d)
+                        except Exception as e:
+                            print(f"[ERROR] {profile} {url}: {e}")
+                            continue
+                        listo_s = time.perf_counter() - t0
+                        st = d.execute_script(JS_PAGE_STATS) or {}
+                    filas[profile].append({
+                        "listo_s": listo_s,
+                        "load_s": (st.get("load_ms") or 0) / 1000,
+                        "requests": st.get("requests") or 0,
+                        "kb": (st.get("bytes") or 0) / 1024,
+                    })
+
+    def med(profile, k):
+        vals = [f[k] for f in filas[profile]]
+        return statistics.median(vals) if vals else 0.0
+
+    print("")
+    print("Carga por página (mediana)")
+    print(f"  {'perfil':<6} {'n':>4} {'mapa listo s':>13} {'load s':>8} {'requests':>9} {'KB':>9}")
+    for profile in DRIVER_PROFILES:
+        print(f"  {profile:<6} {len(filas[profile]):>4} {med(profile, 'listo_s'):>13.2f} "
+              f"{med(profile, 'load_s'):>8.2f} {med(profile, 'requests'):>9.0f} {med(profile, 'kb'):>9.0f}")
+    if filas["full"] and filas["lean"]:
+        for k, label in (("listo_s", "mapa listo"), ("load_s", "load"), ("kb", "KB transferidos")):
+            base = med("full", k)
+            if base:
+                print(f"  reducción {label}: {100 * (1 - med('lean', k) / base):.0f}%")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks del scraper de WikiRoutes")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("extract", help="Compara segundos por ruta entre modos de extracción")
+    ex.add_argument("--url", nargs="+")
+    ex.add_argument("--urls-file", help="Archivo con una URL de ruta por línea")
+    ex.add_argument("--repeat", type=int, default=1)
+    ex.add_argument("--headless", type=int, default=1)
+    ex.set_defaults(func=bench_extract)
+
+    pr = sub.add_parser("profile", help="Compara tiempo de carga por página entre perfiles full/lean")
+    pr.add_argument("--url", nargs="+")
+    pr.add_argument("--urls-file", help="Archivo con una URL de ruta por línea")
+    pr.add_argument("--repeat", type=int, default=1)
+    pr.add_argument("--headless", type=int, default=1)
+    pr.set_defaults(func=bench_profile)
+
+    args = ap.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,378 @@
+"""
+wr_build_bundle.py
+Empaqueta los trazados y paraderos de todas las carpetas route_* en un solo
+archivo binario (data/processed/transporte/rutas.bin) que el frontend lee por
+rangos en lugar de pedir los GeoJSON de cada ruta.
+
+Formato (little-endian):
+
+    0   'WRB1'
+    4   uint32  versión
+    8   uint32  n (rutas)
+    12  uint32  T (bytes del JSON de tablas)
+    16  JSON    {"escala": 1000000, "archivos": [...], "props": [...]}
+        relleno hasta múltiplo de 4
+        uint32[n]    id numérico de cada carpeta route_<id>, ordenados
+        uint32[n+1]  offset absoluto de cada bloque (el último = fin del archivo)
+        bloques
+
+Cada bloque es una secuencia de varints (LEB128):
+
+    nArchivos
+    por archivo:  iNombre  nFeatures
+      por feature:  tipo (0 Point, 1 LineString)  iProps  [nCoords si LineString]
+                    coordenadas: lon, lat cuantizadas a 1/escala grados, en
+                    zigzag y como delta contra la coordenada anterior del archivo
+
+Los trazados ya vienen con 6 decimales, así que vuelven idénticos; los
+paraderos pierden lo que pasa de 1e-6° (~0,1 m).
+
+Uso:
+    python3 pipeline/scripts/wikiroutes/wr_build_bundle.py
+    python3 pipeline/scripts/wikiroutes/wr_build_bundle.py --verificar   # ida y vuelta + tamaños y tiempos
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import struct
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise SystemExit(
+        "Falta dependencia: numpy\n"
+        "Instala con: pip install numpy"
+    ) from e
+
+MAGIC = b"WRB1"
+VERSION = 1
+ESCALA = 1_000_000
+TOLERANCIA = 0.5 / ESCALA + 1e-12
+
+TIPOS = {"Point": 0, "LineString": 1}
+TIPOS_INV = {v: k for k, v in TIPOS.items()}
+
+
+def find_repo_root(start: Path) -> Path:
+    cur = start
+    for _ in range(8):
+        if (cur / "data" / "processed" / "transporte").is_dir():
+            return cur
+        if cur.parent == cur:
+            break
+        cur = cur.parent
+    raise SystemExit(
+        f"No se encontró 'data/processed/transporte' subiendo desde {start}."
+    )
+
+
+def repo_root() -> Path:
+    try:
+        here = Path(__file__).resolve()
+    except NameError:
+        here = Path.cwd().resolve()
+    return find_repo_root(here)
+
+
+# ── Varints ──────────────────────────────────────────────────────────────────
+
+def put_varint(out: bytearray, v: int) -> None:
+    while v >= 0x80:
+        out.append((v & 0x7F) | 0x80)
+        v >>= 7
+    out.append(v)
+
+
+def zigzag(v: int) -> int:
+    return (v << 1) if v >= 0 else ((-v << 1) - 1)
+
+
+def unzigzag(v: int) -> int:
+    return (v >> 1) ^ -(v & 1)
+
+
+def get_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    v = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        v |= (b & 0x7F) << shift
+        if b < 0x80:
+            return v, pos
+        shift += 7
+
+
+def get_varints(buf: bytes, ini: int, fin: int) -> np.ndarray:
+    """Todos los varints de buf[ini:fin] de una vez (int64)."""
+    b = np.frombuffer(buf, dtype=np.uint8, count=fin - ini, offset=ini)
+    ult = np.flatnonzero(b < 0x80)                  # último byte de cada varint
+    if not len(ult):
+        return np.empty(0, dtype=np.int64)
+    prim = np.concatenate(([0], ult[:-1] + 1))
+    b = b[:ult[-1] + 1]
+    k = np.arange(len(b)) - np.repeat(prim, ult - prim + 1)
+    return np.add.reduceat((b & 0x7F).astype(np.int64) << (7 * k), prim)
+
+
+# ── Codificación ─────────────────────────────────────────────────────────────
+
+class Tabla:
+    """Strings únicos -> índice, en orden de aparición."""
+
+    def __init__(self):
+        self.items: list[str] = []
+        self._idx: dict[str, int] = {}
+
+    def __call__(self, s: str) -> int:
+        i = self._idx.get(s)
+        if i is None:
+            i = self._idx[s] = len(self.items)
+            self.items.append(s)
+        return i
+
+
+def encode_archivos(items: list[tuple[str, dict]], archivos: Tabla, props: Tabla, origen: str = "") -> bytearray:
+    """items: (nombre, FeatureCollection) de una ruta -> bloque."""
+    out = bytearray()
+    put_varint(out, len(items))
+    for nombre, fc in items:
+        feats = fc.get("features") or []
+        put_varint(out, archivos(nombre))
+        put_varint(out, len(feats))
+        px = py = 0
+        for f in feats:
+            geom = f.get("geometry") or {}
+            tipo = TIPOS.get(geom.get("type"))
+            if tipo is None:
+                raise SystemExit(f"{origen}/{nombre}: geometría no soportada {geom.get('type')!r}")
+            put_varint(out, tipo)
+            put_varint(out, props(json.dumps(f.get("properties") or {}, ensure_ascii=False, sort_keys=True)))
+            coords = [geom["coordinates"]] if tipo == 0 else geom["coordinates"]
+            if tipo == 1:
+                put_varint(out, len(coords))
+            for c in coords:
+                x, y = round(c[0] * ESCALA), round(c[1] * ESCALA)
+                put_varint(out, zigzag(x - px))
+                put_varint(out, zigzag(y - py))
+                px, py = x, y
+    return out
+
+
+def route_dirs(data_dir: Path) -> list[tuple[int, Path]]:
+    """(id, carpeta) de las route_<id> con algún GeoJSON, ordenadas por id."""
+    out = []
+    for route_dir in data_dir.glob("route_*"):
+        rid = route_dir.name.split("_", 1)[1]
+        if route_dir.is_dir() and rid.isdigit() and any(route_dir.glob("*.geojson")):
+            out.append((int(rid), route_dir))
+    return sorted(out)
+
+
+def write_bundle(out_path: Path, ids: list[int], bloques: list[bytearray],
+                 archivos: Tabla, props: Tabla) -> dict:
+    """Escribe cabecera + bloques; ids tiene que venir ordenado."""
+    tablas = json.dumps({"escala": ESCALA, "archivos": archivos.items, "props": props.items},
+                        ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    cab = bytearray(MAGIC + struct.pack("<III", VERSION, len(ids), len(tablas)) + tablas)
+    cab += b"\0" * (-len(cab) % 4)
+    inicio = len(cab) + 4 * len(ids) + 4 * (len(ids) + 1)
+    offsets = [inicio]
+    for b in bloques:
+        offsets.append(offsets[-1] + len(b))
+    cab += struct.pack(f"<{len(ids)}I", *ids)
+    cab += struct.pack(f"<{len(offsets)}I", *offsets)
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(cab)
+        for b in bloques:
+            f.write(b)
+    os.replace(tmp, out_path)
+    return {"rutas": len(ids), "bytes": offsets[-1], "cabecera": inicio}
+
+
+def build_bundle(data_dir: Path, out_path: Path) -> dict:
+    archivos, props = Tabla(), Tabla()
+    ids: list[int] = []
+    bloques: list[bytearray] = []
+    for rid, route_dir in route_dirs(data_dir):
+        items = [(p.name, json.loads(p.read_text(encoding="utf-8"))) for p in sorted(route_dir.glob("*.geojson"))]
+        ids.append(rid)
+        bloques.append(encode_archivos(items, archivos, props, str(route_dir)))
+    return write_bundle(out_path, ids, bloques, archivos, props)
+
+
+# ── Decodificación (la misma lógica que readWrBundleRoute en parsers.js) ─────
+
+class Bundle:
+    def __init__(self, path: Path):
+        self.buf = path.read_bytes()
+        if self.buf[:4] != MAGIC:
+            raise SystemExit(f"{path}: no es un bundle WRB1")
+        version, n, t = struct.unpack_from("<III", self.buf, 4)
+        if version != VERSION:
+            raise SystemExit(f"{path}: versión {version}, se esperaba {VERSION}")
+        tablas = json.loads(self.buf[16:16 + t].decode("utf-8"))
+        self.escala = tablas["escala"]
+        self.archivos = tablas["archivos"]
+        self.props = [json.loads(p) for p in tablas["props"]]
+        pos = 16 + t + (-(16 + t) % 4)
+        self.ids = list(struct.unpack_from(f"<{n}I", self.buf, pos))
+        self.offsets = list(struct.unpack_from(f"<{n + 1}I", self.buf, pos + 4 * n))
+        self._pos = {rid: i for i, rid in enumerate(self.ids)}
+
+    def route(self, rid: int) -> dict[str, dict] | None:
+        i = self._pos.get(rid)
+        if i is None:
+            return None
+        return self.decode(self.buf, self.offsets[i], self.offsets[i + 1])
+
+    def decode(self, buf: bytes, ini: int, fin: int) -> dict[str, dict]:
+        """
+        Decodifica un bloque. Los varints salen todos juntos con numpy; en Python
+        solo se recorren las cabeceras, y las coordenadas de cada archivo se
+        des-zigzaguean y acumulan como arreglos.
+        """
+        vals = get_varints(buf, ini, fin)
+        cab = vals.tolist()
+        out: dict[str, dict] = {}
+        j = 1
+        for _ in range(cab[0]):
+            i_nombre, n_feat = cab[j], cab[j + 1]
+            j += 2
+            metas, desde, largos = [], [], []
+            for _ in range(n_feat):
+                tipo, i_props = cab[j], cab[j + 1]
+                j += 2
+                n = 1
+                if tipo == 1:
+                    n = cab[j]
+                    j += 1
+                metas.append((tipo, i_props))
+                desde.append(j)
+                largos.append(n)
+                j += 2 * n
+            coords = self._coordenadas(vals, desde, largos)
+            feats, c = [], 0
+            for (tipo, i_props), n in zip(metas, largos):
+                feats.append({
+                    "type": "Feature",
+                    "geometry": {"type": TIPOS_INV[tipo], "coordinates": coords[c] if tipo == 0 else coords[c:c + n]},
+                    "properties": dict(self.props[i_props]),
+                })
+                c += n
+            out[self.archivos[i_nombre]] = {"type": "FeatureCollection", "features": feats}
+        return out
+
+    def _coordenadas(self, vals: np.ndarray, desde: list[int], largos: list[int]) -> list[list[float]]:
+        """[lon, lat] de todas las features de un archivo; el delta sigue de una feature a la otra."""
+        if not largos:
+            return []
+        largos_a = np.asarray(largos)
+        base = np.repeat(np.asarray(desde) - 2 * np.concatenate(([0], np.cumsum(largos_a)[:-1])), largos_a)
+        pos = base + 2 * np.arange(int(largos_a.sum()))
+        d = np.column_stack((vals[pos], vals[pos + 1]))
+        xy = np.cumsum((d >> 1) ^ -(d & 1), axis=0)
+        return (xy / self.escala).tolist()
+
+
+# ── Verificación ─────────────────────────────────────────────────────────────
+
+def _max_error(a, b) -> float | None:
+    """Diferencia máxima entre dos FeatureCollection, o None si no tienen la misma forma."""
+    fa, fb = a.get("features") or [], b.get("features") or []
+    if len(fa) != len(fb):
+        return None
+    peor = 0.0
+    for x, y in zip(fa, fb):
+        gx, gy = x["geometry"], y["geometry"]
+        if gx["type"] != gy["type"] or (x.get("properties") or {}) != y["properties"]:
+            return None
+        cx = [gx["coordinates"]] if gx["type"] == "Point" else gx["coordinates"]
+        cy = [gy["coordinates"]] if gy["type"] == "Point" else gy["coordinates"]
+        if len(cx) != len(cy):
+            return None
+        for p, q in zip(cx, cy):
+            peor = max(peor, abs(p[0] - q[0]), abs(p[1] - q[1]))
+    return peor
+
+
+def verificar(data_dir: Path, out_path: Path) -> bool:
+    bundle = Bundle(out_path)
+    dirs = [data_dir / f"route_{rid}" for rid in bundle.ids]
+
+    t0 = time.perf_counter()
+    originales = {d.name: {p.name: json.loads(p.read_text(encoding="utf-8")) for p in sorted(d.glob("*.geojson"))}
+                  for d in dirs}
+    t_json = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    decodificados = {f"route_{rid}": bundle.route(rid) for rid in bundle.ids}
+    t_bundle = time.perf_counter() - t0
+
+    malos, peor = 0, 0.0
+    for nombre, archivos in originales.items():
+        dec = decodificados[nombre]
+        if set(dec) != set(archivos):
+            malos += 1
+            continue
+        for a, fc in archivos.items():
+            err = _max_error(fc, dec[a])
+            if err is None or err > TOLERANCIA:
+                malos += 1
+                print(f"  [DIF] {nombre}/{a}")
+                break
+            peor = max(peor, err)
+
+    n_arch = sum(len(a) for a in originales.values())
+    b_json = b_json_gz = 0
+    for d in dirs:
+        for p in d.glob("*.geojson"):
+            raw = p.read_bytes()
+            b_json += len(raw)
+            b_json_gz += len(gzip.compress(raw, 6))
+    b_bin = len(bundle.buf)
+    b_bin_gz = len(gzip.compress(bundle.buf, 6))
+
+    print(f"Rutas: {len(dirs)}  archivos: {n_arch}  con diferencias: {malos}  "
+          f"error máximo: {peor:.2e}° (tolerancia {TOLERANCIA:.1e}°)")
+    print(f"Tamaño  GeoJSON: {b_json / 1e6:7.1f} MB  (gzip {b_json_gz / 1e6:.1f} MB)")
+    print(f"        bundle:  {b_bin / 1e6:7.1f} MB  (gzip {b_bin_gz / 1e6:.1f} MB)  "
+          f"-> {b_json / max(1, b_bin):.1f}x más chico ({b_json_gz / max(1, b_bin_gz):.1f}x con gzip)")
+    print(f"Lectura en Python  GeoJSON (json.loads): {t_json:.2f}s   bundle: {t_bundle:.2f}s  "
+          f"-> {t_json / max(1e-9, t_bundle):.1f}x")
+    return malos == 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Empaqueta los GeoJSON de route_* en un bundle binario cuantizado.")
+    ap.add_argument("--data-dir", type=str, default=None, help="Carpeta con las route_* (por defecto, la del repo)")
+    ap.add_argument("--out", type=str, default=None, help="Archivo de salida (por defecto, <data-dir>/rutas.bin)")
+    ap.add_argument("--verificar", action="store_true",
+                    help="Después de armar el bundle, lo decodifica y lo compara con los GeoJSON")
+    args = ap.parse_args()
+
+    data_dir = Path(args.data_dir) if args.data_dir else repo_root() / "data" / "processed" / "transporte"
+    out_path = Path(args.out) if args.out else data_dir / "rutas.bin"
+    if not data_dir.is_dir():
+        raise SystemExit(f"No existe la carpeta de datos: {data_dir}")
+
+    t0 = time.perf_counter()
+    info = build_bundle(data_dir, out_path)
+    print(f"Rutas empaquetadas: {info['rutas']}  tamaño: {info['bytes'] / 1e6:.1f} MB  "
+          f"(cabecera {info['cabecera'] / 1024:.0f} KB)  en {time.perf_counter() - t0:.1f}s")
+    print(f"Archivo generado: {out_path}")
+
+    if args.verificar and not verificar(data_dir, out_path):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
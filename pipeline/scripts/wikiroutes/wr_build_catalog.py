@@ -1,20 +1,22 @@
 from __future__ import annotations
 
 import json
+import os
 import re
-import time
 from pathlib import Path
 from typing import Dict, List
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
-from wr_scrape import scrape_route, make_driver, DEFAULT_BASE
+from wr_scrape import scrape_route, make_driver, robots_allows, DriverPool, DEFAULT_BASE
+from wr_crawl import crawl, CrawlAbortado
+from wr_journal import CrawlJournal, escribir_atomico
 
-CATALOG_URL = "https://wikiroutes.info/es/lima/catalog"
+CATALOG_URL = os.environ.get("WR_CATALOG_URL", f"{DEFAULT_BASE}/es/lima/catalog")
 
 # Raíz del proyecto: pipeline/scripts/wikiroutes/ está a 3 niveles de ROOT
 ROOT = Path(__file__).resolve().parents[3]
@@ -24,9 +26,25 @@ OUT_ROOT = ROOT / "data" / "processed" / "transporte"
 WR_MAP_JSON = ROOT / "pipeline" / "output" / "wr_map.json"
 WR_OVERRIDES_JSON = ROOT / "config" / "wr_overrides.json"
 
+# Bitácora del crawl: permite retomar tras un corte sin repetir rutas
+JOURNAL_JSONL = ROOT / "pipeline" / "cache" / "wr_crawl_journal.jsonl"
+
 # Límite de nuevas rutas a descargar. None = sin límite (bajar todo).
 MAX_NUEVAS = None
 
+# Drivers Chrome reutilizados durante la descarga y páginas por driver antes de reciclarlo.
+WORKERS = 2
+RECICLAR_CADA = 50
+
+# Cortesía con wikiroutes.info: páginas por segundo entre todos los workers,
+# reintentos con backoff exponencial y corte tras demasiados errores seguidos.
+PAGINAS_POR_SEGUNDO = 0.5
+MAX_REINTENTOS = 2
+MAX_ERRORES_SEGUIDOS = 15
+
+# Guardado atómico de wr_map/wr_overrides cada N rutas descargadas
+CHECKPOINT_CADA = 25
+
 
 def normalizar(texto: str) -> str:
     return " ".join(texto.split())
@@ -45,70 +63,72 @@ def esperar_chips(driver, timeout: int = 60) -> None:
     )
 
 
-def expandir_listas(driver, timeout: int = 60) -> None:
+# Expande todas las listas y devuelve los chips en una sola llamada WebDriver:
+# primero los visibles (activas), luego activa "mostrar inactivas", vuelve a
+# expandir y devuelve todos. Cada fase espera a que el DOM quede quieto
+# (MutationObserver) en lugar de dormir un tiempo fijo.
+JS_COSECHAR_RUTAS = """
+var quietMs = arguments[0], deadline = Date.now() + arguments[1];
+var done = arguments[arguments.length-1];
+function visible(el){ return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length); }
+function norm(t){ return (t || '').replace(/\\s+/g, ' ').trim(); }
+function settle(cb){
+  var timer = null;
+  var obs = new MutationObserver(function(){ clearTimeout(timer); timer = setTimeout(fin, quietMs); });
+  function fin(){ obs.disconnect(); cb(); }
+  obs.observe(document.body, {childList: true, subtree: true, attributes: true});
+  timer = setTimeout(fin, quietMs);
+}
+function expand(cb){
+  var btns = [].filter.call(document.querySelectorAll('div.button-more.expandFullList'), visible);
+  if (!btns.length || Date.now() > deadline) return cb();
+  btns.forEach(function(b){ try{ b.click(); }catch(e){} });
+  settle(function(){ expand(cb); });
+}
+function chips(){
+  var out = [];
+  document.querySelectorAll('a.tag-btn.tag-btn--float').forEach(function(a){
+    if (!visible(a)) return;
+    out.push({name: norm(a.innerText || a.textContent),
+              href: a.getAttribute('href') || a.getAttribute('data-href') || ''});
+  });
+  return out;
+}
+expand(function(){
+  var activos = chips();
+  var label = document.querySelector("label[for='checkboxShowInactive']");
+  if (!label) return done({activos: activos, todos: activos});
+  label.click();
+  settle(function(){
+    expand(function(){ done({activos: activos, todos: chips()}); });
+  });
+});
+"""
+
+
+def cosechar_rutas(driver, quiet_ms: int = 400, timeout: int = 120) -> List[Dict]:
     """
-    Hace clic en todos los botones 'Expandir la lista' visibles
-    hasta que no quede ninguno.
+    Devuelve lista de dicts {name, url, active} para todas las rutas del catálogo,
+    activas e inactivas, sin filtrar por tipo (city / suburban / intercity).
     """
-    wait = WebDriverWait(driver, timeout)
-
-    try:
-        wait.until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, "div.button-more.expandFullList")
-            )
-        )
-    except TimeoutException:
-        return
-
-    while True:
-        botones = [
-            b
-            for b in driver.find_elements(
-                By.CSS_SELECTOR, "div.button-more.expandFullList"
-            )
-            if b.is_displayed()
-        ]
-        if not botones:
-            break
-
-        for b in botones:
-            try:
-                driver.execute_script("arguments[0].click();", b)
-            except Exception:
-                pass
-
-        time.sleep(1)
+    driver.set_script_timeout(timeout + 10)
+    res = driver.execute_async_script(JS_COSECHAR_RUTAS, quiet_ms, timeout * 1000) or {}
 
+    def absolutas(chips):
+        out = []
+        for c in chips or []:
+            if c.get("href"):
+                out.append((normalizar(c.get("name") or ""), urljoin(DEFAULT_BASE, c["href"])))
+        return out
 
-def obtener_links_rutas(driver) -> List[Dict[str, str]]:
-    """
-    Devuelve lista de dicts {name, url} para todas las rutas visibles,
-    sin filtrar por tipo (city / suburban / intercity).
-    """
-    chips = driver.find_elements(By.CSS_SELECTOR, "a.tag-btn.tag-btn--float")
+    urls_activas = {u for _, u in absolutas(res.get("activos"))}
     rutas = []
     vistos = set()
-
-    for chip in chips:
-        if not chip.is_displayed():
+    for nombre, url in absolutas(res.get("todos")):
+        if url in vistos:
             continue
-
-        txt = normalizar(chip.text)
-        href = chip.get_attribute("href") or ""
-        if not href:
-            href = chip.get_attribute("data-href") or ""
-
-        if not href:
-            continue
-
-        href_abs = urljoin(DEFAULT_BASE, href)
-        if href_abs in vistos:
-            continue
-
-        vistos.add(href_abs)
-        rutas.append({"name": txt, "url": href_abs})
-
+        vistos.add(url)
+        rutas.append({"name": nombre, "url": url, "active": url in urls_activas})
     return rutas
 
 
@@ -120,9 +140,15 @@ def cargar_json_si_existe(path: Path):
 
 
 def guardar_json(path: Path, data) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    escribir_atomico(path, json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True))
+
+
+def leer_trips(route_dir: Path) -> int:
+    try:
+        summary = json.loads((route_dir / "summary.json").read_text(encoding="utf-8"))
+        return max(1, int(summary.get("trips_detected", 1)))
+    except Exception:
+        return 0
 
 
 # Patrones para extraer el código de ruta desde el título de Wikiroutes.
@@ -267,12 +293,15 @@ def main():
     total_antes = len(existentes_antes)
     print(f"Carpetas de rutas ya existentes: {total_antes}")
 
-    driver = make_driver(headless=False, lang="es-ES")
+    # robots.txt se descarga una vez y queda en caché para todas las rutas del crawl
+    if not robots_allows(DEFAULT_BASE, urlparse(CATALOG_URL).path):
+        raise SystemExit("Robots.txt no permite scrapear el catálogo")
+
+    driver = make_driver(headless=False, lang="es-ES", profile="lean")
     wait = WebDriverWait(driver, 60)
 
     try:
         driver.get(CATALOG_URL)
-        time.sleep(3)
 
         try:
             tab_todas = wait.until(
@@ -283,27 +312,11 @@ def main():
             pass
 
         esperar_chips(driver)
-        expandir_listas(driver)
+        rutas_totales = cosechar_rutas(driver)
 
-        rutas_activas = obtener_links_rutas(driver)
-        print(f"Total rutas activas: {len(rutas_activas)}")
-
-        label_inactivas = wait.until(
-            EC.element_to_be_clickable(
-                (By.CSS_SELECTOR, "label[for='checkboxShowInactive']")
-            )
-        )
-        driver.execute_script("arguments[0].click();", label_inactivas)
-        time.sleep(2)
-
-        expandir_listas(driver)
-
-        rutas_totales = obtener_links_rutas(driver)
+        print(f"Total rutas activas: {sum(1 for r in rutas_totales if r['active'])}")
         print(f"Total rutas totales (activas + inactivas): {len(rutas_totales)}")
-
-        set_activas = {r["name"] for r in rutas_activas}
-        rutas_inactivas = [r for r in rutas_totales if r["name"] not in set_activas]
-        print(f"Total rutas inactivas: {len(rutas_inactivas)}")
+        print(f"Total rutas inactivas: {sum(1 for r in rutas_totales if not r['active'])}")
 
     finally:
         driver.quit()
@@ -311,44 +324,101 @@ def main():
     wr_map = cargar_json_si_existe(WR_MAP_JSON)
     wr_overrides = cargar_json_si_existe(WR_OVERRIDES_JSON)
 
+    journal = CrawlJournal(JOURNAL_JSONL)
+
+    # Rutas que terminaron después del último checkpoint: sus carpetas existen pero
+    # sus entradas en los índices se perdieron con el corte. Se re-aplican desde disco.
+    recuperadas = 0
+    for ev in journal.hechas_sin_checkpoint():
+        route_dir = ROOT / ev.get("folder", "")
+        if ev.get("folder") and route_dir.is_dir():
+            try:
+                actualizar_wr_jsons(route_dir, wr_map, wr_overrides)
+                recuperadas += 1
+            except Exception as e:
+                print(f"[WARN] No se pudo re-aplicar {route_dir}: {e}")
+    if recuperadas:
+        guardar_json(WR_MAP_JSON, wr_map)
+        guardar_json(WR_OVERRIDES_JSON, wr_overrides)
+        journal.checkpoint()
+        print(f"Índices recuperados desde la bitácora: {recuperadas} ruta(s)")
+
+    estado_journal = journal.estado_por_url()
+
     existentes_ids = {
         p.name.replace("route_", "") for p in existentes_antes
     }
 
-    nuevas_descargadas = 0
-
+    pendientes = []
     for idx, ruta in enumerate(rutas_totales, start=1):
-        nombre = ruta["name"]
-        url = ruta["url"]
-
-        m = re.search(r"routes=(\d+)", url)
+        m = re.search(r"routes=(\d+)", ruta["url"])
         route_id = m.group(1) if m else None
 
         if route_id and route_id in existentes_ids:
-            print(f"[{idx}/{len(rutas_totales)}] Ya existe route_{route_id}, se omite ({nombre}).")
+            print(f"[{idx}/{len(rutas_totales)}] Ya existe route_{route_id}, se omite ({ruta['name']}).")
             continue
 
-        if MAX_NUEVAS is not None and nuevas_descargadas >= MAX_NUEVAS:
-            print(f"\nSe alcanzó el límite de {MAX_NUEVAS} nuevas rutas. Se detiene.")
-            break
-
-        print(f"\n[{idx}/{len(rutas_totales)}] Scrapeando ruta nueva: {nombre} -> {url}")
-
-        try:
-            out_dir = scrape_route(url, OUT_ROOT, headless=True)
-        except Exception as e:
-            print(f"[ERROR] Falló scrape_route para {url}: {e}")
+        prev = estado_journal.get(ruta["url"])
+        if prev and prev.get("status") == "done" and (ROOT / prev.get("folder", "")).is_dir():
+            print(f"[{idx}/{len(rutas_totales)}] Hecha según bitácora ({prev.get('folder')}), se omite.")
             continue
-
+        pendientes.append(ruta)
+
+    if MAX_NUEVAS is not None and len(pendientes) > MAX_NUEVAS:
+        print(f"\nSe alcanzó el límite de {MAX_NUEVAS} nuevas rutas. Se descargan solo esas.")
+        pendientes = pendientes[:MAX_NUEVAS]
+
+    print(f"\nRutas nuevas a descargar: {len(pendientes)} "
+          f"({WORKERS} workers, {PAGINAS_POR_SEGUNDO} pág/s)")
+
+    descargadas = [0]
+
+    def checkpoint() -> None:
+        guardar_json(WR_MAP_JSON, wr_map)
+        guardar_json(WR_OVERRIDES_JSON, wr_overrides)
+        journal.checkpoint()
+
+    def registrar(res) -> None:
+        # Se ejecuta serializado por crawl(): es seguro tocar wr_map/wr_overrides aquí.
+        ruta = res.item
+        base = {"name": ruta["name"], "intentos": res.intentos, "segundos": round(res.segundos, 2)}
+        if not res.ok:
+            print(f"[ERROR] Falló scrape_route para {ruta['url']} tras {res.intentos} intento(s): {res.error}")
+            journal.ruta("failed", ruta["url"], error=res.error, **base)
+            return
+        out_dir = res.valor
         try:
             actualizar_wr_jsons(out_dir, wr_map, wr_overrides)
         except Exception as e:
             print(f"[WARN] No se pudo actualizar JSONs para {out_dir}: {e}")
+        journal.ruta(
+            "done", ruta["url"],
+            route_id=out_dir.name.replace("route_", ""),
+            folder=out_dir.relative_to(ROOT).as_posix(),
+            trips=leer_trips(out_dir),
+            **base,
+        )
+        descargadas[0] += 1
+        if descargadas[0] % CHECKPOINT_CADA == 0:
+            checkpoint()
 
-        nuevas_descargadas += 1
-
-    guardar_json(WR_MAP_JSON, wr_map)
-    guardar_json(WR_OVERRIDES_JSON, wr_overrides)
+    pool = DriverPool(size=WORKERS, headless=True, max_pages=RECICLAR_CADA, profile="lean")
+    try:
+        crawl(
+            pendientes,
+            lambda ruta: scrape_route(ruta["url"], OUT_ROOT, pool=pool),
+            workers=WORKERS,
+            rate=PAGINAS_POR_SEGUNDO,
+            max_reintentos=MAX_REINTENTOS,
+            max_errores_seguidos=MAX_ERRORES_SEGUIDOS,
+            al_terminar=registrar,
+        )
+    except CrawlAbortado as e:
+        print(f"\n[ERROR] {e}")
+    finally:
+        pool.close()
+        # También ante Ctrl-C: lo ya descargado queda indexado
+        checkpoint()
 
     existentes_despues = [p for p in OUT_ROOT.glob("route_*") if p.is_dir()]
     total_despues = len(existentes_despues)
@@ -6,15 +6,9 @@ import json
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Optional, List
 
-try:
-    from bs4 import BeautifulSoup
-except ImportError as e:
-    raise SystemExit(
-        "Falta dependencia: beautifulsoup4\n"
-        "Instala con: pip install beautifulsoup4"
-    ) from e
+from wr_route_meta import RouteMetaCache, endpoints_of
 
 
 # ==========================
@@ -159,46 +153,6 @@ def extract_display_id_from_title(route_title: str) -> Optional[str]:
     return nums[0]
 
 
-def simplify_stop_name(name: str) -> str:
-    s = " ".join((name or "").split())
-    if " - " in s:
-        s = s.split(" - ", 1)[0].strip()
-    return s
-
-
-def extract_trip_endpoints_from_html(route_html_path: Path) -> Dict[int, Tuple[str, str]]:
-    """
-    Intenta leer del HTML los extremos de los trips (ida / vuelta).
-    Si no puede, devuelve dict vacío.
-    """
-    if not route_html_path.exists():
-        return {}
-
-    html = route_html_path.read_text(encoding="utf-8", errors="replace")
-    soup = BeautifulSoup(html, "html.parser")
-
-    endpoints: Dict[int, Tuple[str, str]] = {}
-    trip_divs = soup.find_all(attrs={"trip-seq": True})
-
-    for d in trip_divs:
-        seq_raw = (d.get("trip-seq") or "").strip()
-        if not seq_raw.isdigit():
-            continue
-        seq = int(seq_raw)
-
-        text = " ".join(d.get_text(" ", strip=True).split())
-        if "→" not in text:
-            continue
-
-        left, right = text.split("→", 1)
-        start = simplify_stop_name(left.strip())
-        end = simplify_stop_name(right.strip())
-        if start and end:
-            endpoints[seq] = (start, end)
-
-    return endpoints
-
-
 # ==========================
 # Ámbito desde el título: (X - Y) o Lima
 # ==========================
@@ -330,6 +284,8 @@ def parse_args():
         default="pipeline/output/wr_codes_master.csv",
         help="Ruta de salida relativa al ROOT para el CSV maestro.",
     )
+    p.add_argument("--jobs", type=int, default=1,
+                   help="Procesos para parsear las carpetas route_* (0 = todos los núcleos). La salida es idéntica a --jobs 1.")
     return p.parse_args()
 
 
@@ -365,6 +321,8 @@ def main() -> None:
 
     folders = sorted([p for p in OUT_ROOT.glob("route_*") if p.is_dir()])
     print(f"Carpetas route_* detectadas: {len(folders)}")
+    meta_cache = RouteMetaCache(OUT_ROOT)
+    meta_cache.prefetch(folders, jobs=args.jobs)
 
     rows: List[Dict[str, str]] = []
 
@@ -376,16 +334,9 @@ def main() -> None:
 
     for folder in folders:
         total += 1
-        route_json_path = folder / "route.json"
-        route_html_path = folder / "route.html"
-
-        if not route_json_path.exists():
-            route_id = ""
-            title = ""
-        else:
-            rj = read_json(route_json_path)
-            route_id = str((rj.get("route_id") or "")).strip()
-            title = str((rj.get("title") or "")).strip()
+        meta = meta_cache.get(folder)
+        route_id = meta["route_id"]
+        title = meta["title"]
 
         display_id_raw = extract_display_id_from_title(title)
         display_id_source = "title" if display_id_raw else "route_id_fallback"
@@ -393,7 +344,7 @@ def main() -> None:
         if not display_id_raw:
             display_id_raw = route_id or folder.name
 
-        endpoints = extract_trip_endpoints_from_html(route_html_path)
+        endpoints = endpoints_of(meta)
         end1_start, end1_end = ("", "")
         end2_start, end2_end = ("", "")
 
@@ -504,6 +455,7 @@ def main() -> None:
             and r["cand_codigo_nuevo"] in seen_por_nuevo
         )
     ]
+    meta_cache.save()
     duplicados_eliminados = len(rows) - len(rows_dedup)
     rows = rows_dedup
 
@@ -517,6 +469,7 @@ def main() -> None:
     print(f"  match por codigo_antiguo: {matched_antiguo}")
     print(f"  sin match lista_rutas:    {no_match}")
     print(f"  duplicados eliminados:    {duplicados_eliminados}")
+    print(f"  metadatos parseados:      {meta_cache.parsed} (caché: {meta_cache.reused})")
     print(f"CSV escrito en: {OUT_CSV}")
 
 if __name__ == "__main__":
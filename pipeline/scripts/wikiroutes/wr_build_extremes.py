@@ -1,15 +1,11 @@
 from __future__ import annotations
 
+import argparse
 import json
-import re
-from html import unescape
 from pathlib import Path
 from collections import Counter
 
-
-SPAN_ARROW_PATTERN = re.compile(
-    r'<span[^>]*>([^<]+)</span>\s*(?:&nbsp;|\u00a0)?\s*(?:→|&rarr;)\s*(?:&nbsp;|\u00a0)?\s*<span[^>]*>([^<]+)</span>'
-)
+from wr_route_meta import RouteMetaCache, pairs_of
 
 
 def find_repo_root(start: Path) -> Path:
@@ -41,29 +37,6 @@ def repo_root() -> Path:
     return find_repo_root(here)
 
 
-def clean_label(text: str) -> str:
-    if not text:
-        return ""
-    t = unescape(text)
-    t = re.sub(r"\s+", " ", t)
-    return t.strip()
-
-
-def extract_pairs_from_html(html: str) -> list[tuple[str, str]]:
-    """
-    Extrae todos los pares Origen → Destino del HTML de route.html.
-    Devuelve lista de tuplas (from, to) ya limpias.
-    """
-    raw_pairs = SPAN_ARROW_PATTERN.findall(html)
-    pairs: list[tuple[str, str]] = []
-    for a, b in raw_pairs:
-        a_clean = clean_label(a)
-        b_clean = clean_label(b)
-        if a_clean or b_clean:
-            pairs.append((a_clean, b_clean))
-    return pairs
-
-
 def compute_ida_vuelta(pairs: list[tuple[str, str]]) -> dict:
     """
     Deduce el par ida y el par vuelta a partir de la lista de pares.
@@ -119,7 +92,7 @@ def compute_ida_vuelta(pairs: list[tuple[str, str]]) -> dict:
     }
 
 
-def build_wr_extremes():
+def build_wr_extremes(jobs: int = 1):
     root = repo_root()
     data_dir = root / "data" / "processed" / "transporte"
     out_dir = root / "pipeline" / "output"
@@ -134,6 +107,8 @@ def build_wr_extremes():
     processed = 0
     skipped_no_html = 0
     skipped_no_pairs = 0
+    meta_cache = RouteMetaCache(data_dir)
+    meta_cache.prefetch(sorted(p for p in data_dir.glob("route_*") if p.is_dir()), jobs=jobs)
 
     for route_dir in sorted(data_dir.iterdir()):
         if not route_dir.is_dir():
@@ -143,14 +118,13 @@ def build_wr_extremes():
             continue
 
         route_id = name.split("_", 1)[1] if "_" in name else name
-        html_path = route_dir / "route.html"
+        meta = meta_cache.get(route_dir)
 
-        if not html_path.is_file():
+        if not meta["has_route_html"]:
             skipped_no_html += 1
             continue
 
-        html = html_path.read_text(encoding="utf-8", errors="ignore")
-        pairs = extract_pairs_from_html(html)
+        pairs = pairs_of(meta)
 
         if not pairs:
             skipped_no_pairs += 1
@@ -166,6 +140,7 @@ def build_wr_extremes():
 
         processed += 1
 
+    meta_cache.save()
     out_path.write_text(
         json.dumps(result, ensure_ascii=False, indent=2),
         encoding="utf-8",
@@ -174,8 +149,12 @@ def build_wr_extremes():
     print(f"Rutas procesadas: {processed}")
     print(f"Rutas sin route.html: {skipped_no_html}")
     print(f"Rutas sin pares Origen → Destino: {skipped_no_pairs}")
+    print(f"Metadatos parseados: {meta_cache.parsed} (caché: {meta_cache.reused})")
     print(f"Archivo generado: {out_path}")
 
 
 if __name__ == "__main__":
-    build_wr_extremes()
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="Genera wr_extremes.json con los pares Origen → Destino de cada ruta.")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Procesos para parsear las carpetas route_* (0 = todos los núcleos)")
+    build_wr_extremes(jobs=ap.parse_args().jobs)
\ No newline at end of file
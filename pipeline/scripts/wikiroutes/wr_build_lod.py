@@ -0,0 +1,364 @@
+"""
+wr_build_lod.py
+Niveles de detalle (LOD) de los trazados: cada route_track*.geojson se
+simplifica con Douglas-Peucker para varios zooms y se guarda en
+data/processed/transporte/rutas_lod.bin, con el mismo formato que rutas.bin
+(wr_build_bundle.py). Los archivos dentro del bundle se llaman
+"z<zoom>/<archivo>"; el frontend usa el nivel del menor zoom >= al actual y
+el trazado completo por encima del último.
+
+- Tolerancia de cada nivel: TOLERANCIA_PX píxeles a ese zoom, en metros
+  (proyección equirectangular local de cada viaje).
+- Topología: si dos tramos simplificados se cruzan y los tramos originales
+  que reemplazan no se cruzaban, se reponen vértices en ambos hasta que el
+  cruce desaparece. Los cruces que ya tenía el trazado se conservan.
+
+Uso:
+    python3 pipeline/scripts/wikiroutes/wr_build_lod.py
+    python3 pipeline/scripts/wikiroutes/wr_build_lod.py --verificar   # tolerancia, subconjunto y cruces
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise SystemExit(
+        "Falta dependencia: numpy\n"
+        "Instala con: pip install numpy"
+    ) from e
+
+from wr_build_bundle import ESCALA, Bundle, Tabla, encode_archivos, repo_root, route_dirs, write_bundle
+
+ZOOMS = (10, 12, 14)
+TOLERANCIA_PX = 0.5
+METROS_PX_Z0 = 156543.03392      # metros por píxel en el ecuador a zoom 0 (tiles de 256)
+M_POR_GRADO = 111320.0
+MAX_REPAROS = 50
+
+PREFIJOS_TRAZADO = ("route_track", "line_approx")
+
+
+def tolerancia_m(zoom: int, lat: float) -> float:
+    return TOLERANCIA_PX * METROS_PX_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def proyectar(coords) -> np.ndarray:
+    """lon/lat -> metros en un plano local centrado en la latitud media."""
+    ll = np.asarray(coords, dtype=float)[:, :2]
+    cos = math.cos(math.radians(float(ll[:, 1].mean())))
+    return np.column_stack((ll[:, 0] * M_POR_GRADO * cos, ll[:, 1] * M_POR_GRADO))
+
+
+# ── Douglas-Peucker ──────────────────────────────────────────────────────────
+
+def distancias(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distancia de cada punto de p al segmento a-b (al punto a si a == b)."""
+    ab = b - a
+    l2 = float(ab @ ab)
+    if l2 == 0.0:
+        return np.hypot(p[:, 0] - a[0], p[:, 1] - a[1])
+    t = np.clip(((p - a) @ ab) / l2, 0.0, 1.0)
+    proy = a + t[:, None] * ab
+    return np.hypot(p[:, 0] - proy[:, 0], p[:, 1] - proy[:, 1])
+
+
+def mas_lejano(xy: np.ndarray, i: int, j: int) -> tuple[int, float]:
+    d = distancias(xy[i + 1:j], xy[i], xy[j])
+    k = int(d.argmax())
+    return i + 1 + k, float(d[k])
+
+
+def pesos_dp(xy: np.ndarray) -> np.ndarray:
+    """
+    Douglas-Peucker completo, por niveles de la recursión y vectorizado: el
+    peso de cada vértice es la distancia con la que entró, acotada por la de
+    su padre. Con tolerancia t, DP conserva exactamente los vértices con
+    peso > t, así que una pasada sirve para todos los zooms.
+    """
+    n = len(xy)
+    w = np.zeros(n)
+    w[0] = w[-1] = np.inf
+    ii, jj, tope = np.array([0]), np.array([n - 1]), np.array([np.inf])
+    while len(ii):
+        largo = jj - ii - 1
+        m = largo > 0
+        ii, jj, tope, largo = ii[m], jj[m], tope[m], largo[m]
+        if not len(ii):
+            break
+        inicio = np.cumsum(largo) - largo
+        seg = np.repeat(np.arange(len(ii)), largo)
+        k = ii[seg] + 1 + (np.arange(int(largo.sum())) - inicio[seg])
+
+        a, b = xy[ii[seg]], xy[jj[seg]]
+        ab = b - a
+        l2 = (ab * ab).sum(axis=1)
+        t = np.where(l2 > 0, ((xy[k] - a) * ab).sum(axis=1) / np.where(l2 > 0, l2, 1.0), 0.0)
+        proy = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+        d = np.hypot(xy[k, 0] - proy[:, 0], xy[k, 1] - proy[:, 1])
+
+        # Primer máximo de cada tramo (= argmax)
+        dmax = np.maximum.reduceat(d, inicio)
+        pos = np.flatnonzero(d == dmax[seg])
+        primero = pos[np.r_[True, seg[pos][1:] != seg[pos][:-1]]]
+        kk = k[primero]
+
+        sigue = dmax > 0
+        kk, dmax = kk[sigue], np.minimum(dmax[sigue], tope[sigue])
+        w[kk] = dmax
+        ii, jj, tope = (np.concatenate((ii[sigue], kk)), np.concatenate((kk, jj[sigue])),
+                        np.concatenate((dmax, dmax)))
+    return w
+
+
+# ── Cruces ───────────────────────────────────────────────────────────────────
+
+def _orient(ax, ay, bx, by, cx, cy):
+    return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def _se_cruzan(A, B, C, D) -> np.ndarray:
+    o1 = _orient(A[:, 0], A[:, 1], B[:, 0], B[:, 1], C[:, 0], C[:, 1])
+    o2 = _orient(A[:, 0], A[:, 1], B[:, 0], B[:, 1], D[:, 0], D[:, 1])
+    o3 = _orient(C[:, 0], C[:, 1], D[:, 0], D[:, 1], A[:, 0], A[:, 1])
+    o4 = _orient(C[:, 0], C[:, 1], D[:, 0], D[:, 1], B[:, 0], B[:, 1])
+    return (o1 * o2 < 0) & (o3 * o4 < 0)
+
+
+def _cajas(a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    return np.minimum(a, b), np.maximum(a, b)
+
+
+def cruces(p: np.ndarray, q: np.ndarray | None = None, bloque: int = 512) -> np.ndarray:
+    """
+    Pares (i, j) de segmentos que se cruzan en forma propia (sin contar
+    contactos en un extremo). Con q=None son los cruces de la polilínea p
+    consigo misma (i < j, sin segmentos contiguos); si no, los de p contra q.
+    """
+    a, b = p[:-1], p[1:]
+    if q is not None:
+        c, d = q[:-1], q[1:]
+        if not len(a) or not len(c):
+            return np.empty((0, 2), dtype=int)
+        amin, amax = _cajas(a, b)
+        cmin, cmax = _cajas(c, d)
+        cand = ((amin[:, None, :] <= cmax[None]) & (cmin[None] <= amax[:, None, :])).all(axis=2)
+        ii, jj = np.nonzero(cand)
+        ok = _se_cruzan(a[ii], b[ii], c[jj], d[jj])
+        return np.column_stack((ii[ok], jj[ok]))
+
+    n = len(a)
+    if n < 3:
+        return np.empty((0, 2), dtype=int)
+    smin, smax = _cajas(a, b)
+    # Barrido sobre el eje más largo: cada segmento solo se compara con los que
+    # empiezan después de él (en ese eje) y antes de que él termine
+    eje = int(np.ptp(p[:, 1]) > np.ptp(p[:, 0]))
+    orden = np.argsort(smin[:, eje], kind="stable")
+    inicio = smin[orden, eje]
+    out = []
+    for s in range(0, n, bloque):
+        filas = orden[s:s + bloque]
+        hi = int(np.searchsorted(inicio, smax[filas, eje].max(), side="right"))
+        cols = orden[s:hi]
+        cand = ((smin[filas][:, None, :] <= smax[cols][None]) &
+                (smin[cols][None] <= smax[filas][:, None, :])).all(axis=2)
+        cand &= np.arange(s, hi)[None, :] > np.arange(s, s + len(filas))[:, None]
+        cand &= np.abs(filas[:, None] - cols[None, :]) > 1
+        ii, jj = np.nonzero(cand)
+        if not len(ii):
+            continue
+        i, j = filas[ii], cols[jj]
+        ok = _se_cruzan(a[i], b[i], a[j], b[j])
+        out.append(np.column_stack((np.minimum(i[ok], j[ok]), np.maximum(i[ok], j[ok]))))
+    if not out:
+        return np.empty((0, 2), dtype=int)
+    pares = np.concatenate(out)
+    return pares[np.lexsort((pares[:, 1], pares[:, 0]))]
+
+
+def _refinar(xy: np.ndarray, i: int, j: int, tol: float, keep: np.ndarray) -> None:
+    pila = [(i, j)]
+    while pila:
+        i, j = pila.pop()
+        if j - i < 2:
+            continue
+        k, d = mas_lejano(xy, i, j)
+        if d > tol:
+            keep[k] = True
+            pila.append((i, k))
+            pila.append((k, j))
+
+
+def simplificar(xy: np.ndarray, tol: float, pesos: np.ndarray | None = None) -> np.ndarray:
+    """Douglas-Peucker sin cruces nuevos. Devuelve los índices conservados."""
+    keep = (pesos_dp(xy) if pesos is None else pesos) > tol
+    for _ in range(MAX_REPAROS):
+        idx = np.flatnonzero(keep)
+        repuestos = False
+        for i, j in cruces(xy[idx]):
+            a1, b1, a2, b2 = idx[i], idx[i + 1], idx[j], idx[j + 1]
+            if len(cruces(xy[a1:b1 + 1], xy[a2:b2 + 1])):
+                continue      # el original ya se cruzaba ahí
+            for a, b in ((a1, b1), (a2, b2)):
+                if b - a >= 2:
+                    # Con el vértice nuevo, cada mitad vuelve a pasar por DP para seguir dentro de tol
+                    k = mas_lejano(xy, a, b)[0]
+                    keep[k] = True
+                    _refinar(xy, a, k, tol, keep)
+                    _refinar(xy, k, b, tol, keep)
+                    repuestos = True
+        if not repuestos:
+            break
+    return np.flatnonzero(keep)
+
+
+# ── Niveles por ruta ─────────────────────────────────────────────────────────
+
+def niveles_de(fc: dict, zooms=ZOOMS) -> dict[int, dict]:
+    """{zoom: FeatureCollection simplificada}; las features quedan 1 a 1 con las originales."""
+    out = {z: [] for z in zooms}
+    for f in fc.get("features") or []:
+        geom = f.get("geometry") or {}
+        coords = geom.get("coordinates") or []
+        if geom.get("type") != "LineString" or len(coords) < 3:
+            for z in zooms:
+                out[z].append(f)
+            continue
+        xy = proyectar(coords)
+        lat = float(np.asarray(coords, dtype=float)[:, 1].mean())
+        pesos = pesos_dp(xy)
+        for z in zooms:
+            idx = simplificar(xy, tolerancia_m(z, lat), pesos)
+            out[z].append({
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [coords[k] for k in idx]},
+                "properties": f.get("properties") or {},
+            })
+    return {z: {"type": "FeatureCollection", "features": feats} for z, feats in out.items()}
+
+
+def es_trazado(path: Path) -> bool:
+    return path.name.startswith(PREFIJOS_TRAZADO)
+
+
+def build_lod(data_dir: Path, out_path: Path, zooms=ZOOMS) -> dict:
+    archivos, props = Tabla(), Tabla()
+    ids, bloques = [], []
+    vertices = {0: 0, **{z: 0 for z in zooms}}
+    for rid, route_dir in route_dirs(data_dir):
+        items = []
+        for path in sorted(p for p in route_dir.glob("*.geojson") if es_trazado(p)):
+            fc = json.loads(path.read_text(encoding="utf-8"))
+            vertices[0] += sum(len(f["geometry"]["coordinates"]) for f in fc.get("features") or [])
+            for z, nivel in niveles_de(fc, zooms).items():
+                vertices[z] += sum(len(f["geometry"]["coordinates"]) for f in nivel["features"])
+                items.append((f"z{z}/{path.name}", nivel))
+        if items:
+            ids.append(rid)
+            bloques.append(encode_archivos(items, archivos, props, str(route_dir)))
+    info = write_bundle(out_path, ids, bloques, archivos, props)
+    info["vertices"] = vertices
+    return info
+
+
+# ── Verificación ─────────────────────────────────────────────────────────────
+
+def _desvio_max(xy: np.ndarray, idx: np.ndarray) -> float:
+    """Distancia máxima de un vértice original al tramo simplificado que lo reemplaza."""
+    peor = 0.0
+    for a, b in zip(idx[:-1], idx[1:]):
+        if b - a >= 2:
+            peor = max(peor, mas_lejano(xy, a, b)[1])
+    return peor
+
+
+def _subsecuencia(coords, simpl) -> list[int] | None:
+    clave = lambda c: (round(c[0] * ESCALA), round(c[1] * ESCALA))
+    if len(simpl) < 2 or clave(simpl[0]) != clave(coords[0]) or clave(simpl[-1]) != clave(coords[-1]):
+        return None
+    idx, m = [0], 1
+    for c in simpl[1:-1]:
+        k = clave(c)
+        while m < len(coords) - 1 and clave(coords[m]) != k:
+            m += 1
+        if m >= len(coords) - 1:
+            return None
+        idx.append(m)
+        m += 1
+    return idx + [len(coords) - 1]
+
+
+def verificar(data_dir: Path, out_path: Path, zooms=ZOOMS) -> bool:
+    bundle = Bundle(out_path)
+    malos = trips = 0
+    for rid in bundle.ids:
+        lod = bundle.route(rid)
+        for path in sorted(p for p in (data_dir / f"route_{rid}").glob("*.geojson") if es_trazado(p)):
+            feats = json.loads(path.read_text(encoding="utf-8")).get("features") or []
+            for z in zooms:
+                nivel = lod.get(f"z{z}/{path.name}")
+                if nivel is None or len(nivel["features"]) != len(feats):
+                    print(f"  [DIF] route_{rid}/{path.name} z{z}: falta o no coincide")
+                    malos += 1
+                    continue
+                for f, g in zip(feats, nivel["features"]):
+                    coords = f["geometry"]["coordinates"]
+                    if len(coords) < 3:
+                        continue
+                    trips += 1
+                    # Los vértices simplificados son un subconjunto ordenado de los originales
+                    # (el último va con el último: en circuitos coincide con el primero)
+                    idx = _subsecuencia(coords, g["geometry"]["coordinates"])
+                    if idx is None:
+                        print(f"  [DIF] route_{rid}/{path.name} z{z}: no es subconjunto del original")
+                        malos += 1
+                        continue
+                    xy = proyectar(coords)
+                    lat = float(np.asarray(coords, dtype=float)[:, 1].mean())
+                    idx = np.asarray(idx)
+                    tol = tolerancia_m(z, lat)
+                    desvio = _desvio_max(xy, idx)
+                    nuevos = [(i, j) for i, j in cruces(xy[idx])
+                              if not len(cruces(xy[idx[i]:idx[i + 1] + 1], xy[idx[j]:idx[j + 1] + 1]))]
+                    if desvio > tol * (1 + 1e-9) or nuevos:
+                        print(f"  [DIF] route_{rid}/{path.name} z{z}: desvío {desvio:.1f} m "
+                              f"(tol {tol:.1f}) cruces nuevos {len(nuevos)}")
+                        malos += 1
+    print(f"Viajes x niveles verificados: {trips}  con problemas: {malos}")
+    return malos == 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Precalcula niveles de detalle de los trazados WikiRoutes.")
+    ap.add_argument("--data-dir", type=str, default=None, help="Carpeta con las route_* (por defecto, la del repo)")
+    ap.add_argument("--out", type=str, default=None, help="Archivo de salida (por defecto, <data-dir>/rutas_lod.bin)")
+    ap.add_argument("--verificar", action="store_true",
+                    help="Comprueba tolerancia, que cada nivel sea subconjunto del original y que no haya cruces nuevos")
+    args = ap.parse_args()
+
+    data_dir = Path(args.data_dir) if args.data_dir else repo_root() / "data" / "processed" / "transporte"
+    out_path = Path(args.out) if args.out else data_dir / "rutas_lod.bin"
+    if not data_dir.is_dir():
+        raise SystemExit(f"No existe la carpeta de datos: {data_dir}")
+
+    t0 = time.perf_counter()
+    info = build_lod(data_dir, out_path)
+    v = info["vertices"]
+    print(f"Rutas: {info['rutas']}  tamaño: {info['bytes'] / 1e6:.1f} MB  en {time.perf_counter() - t0:.1f}s")
+    print(f"Vértices  completo: {v[0]}  " + "  ".join(
+        f"z{z} (tol {tolerancia_m(z, -12.05):.1f} m): {v[z]} ({100 * v[z] / max(1, v[0]):.0f}%)" for z in ZOOMS))
+    print(f"Archivo generado: {out_path}")
+
+    if args.verificar and not verificar(data_dir, out_path):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
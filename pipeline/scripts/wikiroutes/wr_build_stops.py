@@ -0,0 +1,315 @@
+"""
+wr_build_stops.py
+Registro global de paraderos: agrupa los puntos de todos los
+stops_tripN.geojson (cada viaje trae su propia copia, sin id ni nombre) en
+una tabla única con ids estables y reescribe cada viaje como la lista
+ordenada de ids de sus paraderos.
+
+Agrupamiento: "líder" sobre una rejilla de RADIO_M metros. Las coordenadas
+distintas se recorren de la más usada a la menos usada y cada una que no
+tiene un centro a <= RADIO_M (buscando en las 3x3 celdas vecinas) pasa a ser
+uno. Después cada coordenada va al centro más cercano. Todo punto queda a
+<= RADIO_M de su paradero y no se encadenan puntos a lo largo de una calle
+como con un enlace simple.
+
+Ids estables: el registro anterior se carga primero y sus centros conservan
+id y posición; solo los puntos que no caen cerca de ninguno crean ids nuevos
+(desde siguiente_id, nunca se reutilizan), y un punto con un paradero
+anterior en el radio se queda con él aunque aparezca un centro nuevo más
+cerca. Un paradero que deja de usarse se queda en la tabla con 0 viajes, y
+si vuelve a aparecer recupera su id.
+
+Salida en data/processed/paraderos/:
+
+    paraderos.json  {"version": 1, "radio_m": 8.0, "siguiente_id": N,
+                     "paraderos": [[id, lon, lat, n_viajes], ...]}
+    viajes.json     {"<id ruta>": {"<trip>": [id, id, ...]}, ...}
+
+Uso:
+    python3 pipeline/scripts/wikiroutes/wr_build_stops.py
+    python3 pipeline/scripts/wikiroutes/wr_build_stops.py --desde-cero   # ignora el registro anterior
+    python3 pipeline/scripts/wikiroutes/wr_build_stops.py --verificar    # distancias, estabilidad y tamaños
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from wr_build_bundle import find_repo_root, route_dirs
+
+VERSION = 1
+RADIO_M = 8.0
+M_POR_GRADO = 111320.0
+LAT_REF = -12.05          # proyección local (Lima) para la rejilla y las distancias
+DECIMALES = 6
+
+
+def repo_root() -> Path:
+    try:
+        here = Path(__file__).resolve()
+    except NameError:
+        here = Path.cwd().resolve()
+    return find_repo_root(here)
+
+
+def _xy(lon: float, lat: float) -> tuple[float, float]:
+    return lon * M_POR_GRADO * math.cos(math.radians(LAT_REF)), lat * M_POR_GRADO
+
+
+def distancia_m(a: tuple[float, float], b: tuple[float, float]) -> float:
+    (ax, ay), (bx, by) = _xy(*a), _xy(*b)
+    return math.hypot(ax - bx, ay - by)
+
+
+# ── Lectura ──────────────────────────────────────────────────────────────────
+
+def leer_viajes(data_dir: Path) -> dict[tuple[str, str], list[tuple[float, float]]]:
+    """{(id ruta, trip): [(lon, lat), ...]} en el orden de stops_tripN.geojson."""
+    viajes = {}
+    for rid, route_dir in route_dirs(data_dir):
+        for p in route_dir.glob("stops_trip*.geojson"):
+            trip = p.stem[len("stops_trip"):]
+            if not trip.isdigit():
+                continue
+            fc = json.loads(p.read_text(encoding="utf-8"))
+            pts = [(float(c[0]), float(c[1]))
+                   for c in ((f.get("geometry") or {}).get("coordinates")
+                             for f in fc.get("features") or []
+                             if (f.get("geometry") or {}).get("type") == "Point")]
+            viajes[(str(rid), trip)] = pts
+    return dict(sorted(viajes.items(), key=lambda kv: (int(kv[0][0]), int(kv[0][1]))))
+
+
+# ── Registro ─────────────────────────────────────────────────────────────────
+
+class Registro:
+    """Centros de paraderos con id, indexados en una rejilla de RADIO_M."""
+
+    def __init__(self, radio_m: float = RADIO_M):
+        self.radio_m = radio_m
+        self.paraderos: dict[int, tuple[float, float]] = {}
+        self.previos: set[int] = set()      # ids que venían del registro anterior
+        self.siguiente_id = 1
+        self._celdas: dict[tuple[int, int], list[int]] = defaultdict(list)
+
+    def _celda(self, lon: float, lat: float) -> tuple[int, int]:
+        x, y = _xy(lon, lat)
+        return math.floor(x / self.radio_m), math.floor(y / self.radio_m)
+
+    def agregar(self, pid: int, lon: float, lat: float) -> None:
+        self.paraderos[pid] = (lon, lat)
+        self._celdas[self._celda(lon, lat)].append(pid)
+        self.siguiente_id = max(self.siguiente_id, pid + 1)
+
+    def buscar(self, lon: float, lat: float, preferir_previos: bool = False) -> int | None:
+        """
+        Id del centro más cercano a <= radio_m, o None. Con preferir_previos,
+        si hay alguno del registro anterior en el radio gana el más cercano
+        de esos: un centro nuevo no le quita puntos a un paradero existente.
+        """
+        cx, cy = self._celda(lon, lat)
+        mejor = {False: (self.radio_m, None), True: (self.radio_m, None)}
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for pid in self._celdas.get((cx + dx, cy + dy), ()):
+                    d = distancia_m((lon, lat), self.paraderos[pid])
+                    for clase in {False, preferir_previos and pid in self.previos}:
+                        md, mp = mejor[clase]
+                        if d < md or (d == md and (mp is None or pid < mp)):
+                            mejor[clase] = (d, pid)
+        return mejor[True][1] if mejor[True][1] is not None else mejor[False][1]
+
+    def crear(self, lon: float, lat: float) -> int:
+        pid = self.siguiente_id
+        self.agregar(pid, round(lon, DECIMALES), round(lat, DECIMALES))
+        return pid
+
+    @classmethod
+    def cargar(cls, path: Path, radio_m: float = RADIO_M) -> "Registro":
+        reg = cls(radio_m)
+        if not path.exists():
+            return reg
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != VERSION or float(data.get("radio_m", 0)) != radio_m:
+            print(f"[AVISO] {path.name} es de otra versión o radio: se arma el registro desde cero")
+            return reg
+        for pid, lon, lat, _ in data.get("paraderos") or []:
+            reg.agregar(int(pid), lon, lat)
+            reg.previos.add(int(pid))
+        reg.siguiente_id = max(reg.siguiente_id, int(data.get("siguiente_id") or 1))
+        return reg
+
+
+def agrupar(viajes: dict, registro: Registro) -> tuple[dict, dict]:
+    """
+    Asigna un paradero a cada punto (modifica registro) y devuelve
+    ({(ruta, trip): [ids]}, {id: n_viajes}). Paraderos repetidos seguidos
+    dentro de un viaje se colapsan en uno.
+    """
+    usos = Counter(p for pts in viajes.values() for p in pts)
+    # 1) Centros: de la coordenada más usada a la menos usada, cada una sin
+    # paradero a <= radio crea uno
+    for p, _ in sorted(usos.items(), key=lambda kv: (-kv[1], kv[0])):
+        if registro.buscar(*p) is None:
+            registro.crear(*p)
+    # 2) Cada coordenada va al paradero más cercano (primero los ya existentes),
+    # con todos los centros ya puestos: rearmar sobre el registro da lo mismo
+    asignado = {p: registro.buscar(*p, preferir_previos=True) for p in usos}
+
+    listas = {}
+    for clave, pts in viajes.items():
+        ids = []
+        for p in pts:
+            pid = asignado[p]
+            if not ids or ids[-1] != pid:
+                ids.append(pid)
+        listas[clave] = ids
+
+    n_viajes = Counter(pid for ids in listas.values() for pid in set(ids))
+    return listas, n_viajes
+
+
+def escribir(out_dir: Path, registro: Registro, listas: dict, n_viajes: Counter) -> dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tabla = {"version": VERSION, "radio_m": registro.radio_m, "siguiente_id": registro.siguiente_id,
+             "paraderos": [[pid, lon, lat, n_viajes.get(pid, 0)]
+                           for pid, (lon, lat) in sorted(registro.paraderos.items())]}
+    por_ruta: dict[str, dict[str, list[int]]] = {}
+    for (rid, trip), ids in listas.items():
+        por_ruta.setdefault(rid, {})[trip] = ids
+
+    tamanos = {}
+    for nombre, data in (("paraderos.json", tabla), ("viajes.json", por_ruta)):
+        path = out_dir / nombre
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+        tamanos[nombre] = path.stat().st_size
+    return tamanos
+
+
+def build(data_dir: Path, out_dir: Path, desde_cero: bool = False) -> dict:
+    t0 = time.perf_counter()
+    viajes = leer_viajes(data_dir)
+    registro = Registro() if desde_cero else Registro.cargar(out_dir / "paraderos.json")
+    previos = len(registro.paraderos)
+    listas, n_viajes = agrupar(viajes, registro)
+    tamanos = escribir(out_dir, registro, listas, n_viajes)
+    return {"viajes": len(viajes), "puntos": sum(len(p) for p in viajes.values()),
+            "coordenadas": len({p for pts in viajes.values() for p in pts}),
+            "paraderos": len(registro.paraderos), "activos": len(n_viajes),
+            "nuevos": len(registro.paraderos) - previos,
+            "colapsados": sum(len(p) for p in viajes.values()) - sum(len(i) for i in listas.values()),
+            "tamanos": tamanos, "t": time.perf_counter() - t0}
+
+
+# ── Verificación ─────────────────────────────────────────────────────────────
+
+def verificar(data_dir: Path, out_dir: Path) -> bool:
+    viajes = leer_viajes(data_dir)
+    tabla = json.loads((out_dir / "paraderos.json").read_text(encoding="utf-8"))
+    por_ruta = json.loads((out_dir / "viajes.json").read_text(encoding="utf-8"))
+    centros = {pid: (lon, lat) for pid, lon, lat, _ in tabla["paraderos"]}
+    problemas = 0
+
+    # 1) Cada punto está a <= radio de su paradero y el orden se conserva
+    peor = 0.0
+    for (rid, trip), pts in viajes.items():
+        ids = por_ruta.get(rid, {}).get(trip)
+        if ids is None:
+            problemas += 1
+            print(f"  [FALTA] {rid}/{trip}")
+            continue
+        # Posiciones de la lista que pueden corresponder al punto actual: la
+        # misma que el anterior o la siguiente (repetidos colapsados)
+        posibles = {0} if ids else set()
+        for i, p in enumerate(pts):
+            candidatas = posibles if i == 0 else posibles | {j + 1 for j in posibles}
+            posibles = set()
+            for j in candidatas:
+                if j < len(ids):
+                    d = distancia_m(p, centros[ids[j]])
+                    if d <= tabla["radio_m"] + 1e-6:
+                        posibles.add(j)
+                        peor = max(peor, d)
+            if not posibles:
+                break
+        if pts and len(ids) - 1 not in posibles:
+            problemas += 1
+            print(f"  [ORDEN] {rid}/{trip}: los puntos no siguen la lista de paraderos a <= radio")
+
+    # 2) Estabilidad: con el registro ya armado, quitar una ruta y mover
+    # otra no cambia los ids de los demás viajes, y armar todo de nuevo
+    # sobre el registro da lo mismo
+    base = Registro.cargar(out_dir / "paraderos.json", tabla["radio_m"])
+    listas, _ = agrupar(viajes, base)
+    distintos = sum(1 for (rid, trip), ids in listas.items() if por_ruta[rid][trip] != ids)
+    if distintos:
+        problemas += 1
+        print(f"  [ESTABLE] rearmar sobre el registro cambia {distintos} viajes")
+
+    rng = random.Random(0)
+    claves = list(viajes)
+    quitada, movida = rng.sample(claves, 2)
+    cambiados = {k: v for k, v in viajes.items() if k != quitada}
+    cambiados[movida] = [(lon + 0.0005, lat) for lon, lat in viajes[movida]]   # ~55 m al este
+    listas, _ = agrupar(cambiados, Registro.cargar(out_dir / "paraderos.json", tabla["radio_m"]))
+    distintos = sum(1 for (rid, trip), ids in listas.items()
+                    if (rid, trip) != movida and por_ruta[rid][trip] != ids)
+    if distintos:
+        problemas += 1
+        print(f"  [ESTABLE] quitar {quitada} y mover {movida} cambia {distintos} viajes más")
+
+    # Tamaños: puntos sueltos en GeoJSON contra registro + listas
+    b_geojson = sum(p.stat().st_size for _, d in route_dirs(data_dir) for p in d.glob("stops_trip*.geojson"))
+    b_reg = sum((out_dir / n).stat().st_size for n in ("paraderos.json", "viajes.json"))
+    n_puntos = sum(len(p) for p in viajes.values())
+    usados = [n for *_, n in tabla["paraderos"] if n]
+    usados.sort()
+    print(f"Viajes: {len(viajes)}  puntos: {n_puntos}  paraderos: {len(centros)} "
+          f"({n_puntos / max(1, len(centros)):.1f} puntos por paradero)")
+    print(f"Viajes por paradero: mediana {usados[len(usados) // 2]}  máx {usados[-1]}  "
+          f"compartidos por 2 o más: {sum(1 for n in usados if n > 1)}")
+    print(f"Distancia máxima punto-paradero: {peor:.2f} m (radio {tabla['radio_m']} m)")
+    print(f"Tamaño  stops_trip*.geojson: {b_geojson / 1e6:.1f} MB   registro + listas: {b_reg / 1e6:.2f} MB "
+          f"-> {b_geojson / max(1, b_reg):.0f}x más chico")
+    print(f"Problemas: {problemas}")
+    return problemas == 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Registro global de paraderos con ids estables.")
+    ap.add_argument("--data-dir", type=str, default=None, help="Carpeta con las route_* (por defecto, la del repo)")
+    ap.add_argument("--out-dir", type=str, default=None,
+                    help="Carpeta de salida (por defecto, data/processed/paraderos)")
+    ap.add_argument("--desde-cero", action="store_true", help="Ignora el registro anterior (los ids pueden cambiar)")
+    ap.add_argument("--verificar", action="store_true",
+                    help="Después de armar el registro, revisa distancias, orden, estabilidad y tamaños")
+    args = ap.parse_args()
+
+    root = repo_root()
+    data_dir = Path(args.data_dir) if args.data_dir else root / "data" / "processed" / "transporte"
+    out_dir = Path(args.out_dir) if args.out_dir else root / "data" / "processed" / "paraderos"
+    if not data_dir.is_dir():
+        raise SystemExit(f"No existe la carpeta de datos: {data_dir}")
+
+    info = build(data_dir, out_dir, args.desde_cero)
+    print(f"Viajes: {info['viajes']}  puntos: {info['puntos']}  coordenadas distintas: {info['coordenadas']}")
+    print(f"Paraderos: {info['paraderos']} (en uso {info['activos']}, nuevos {info['nuevos']})  "
+          f"repetidos seguidos colapsados: {info['colapsados']}  en {info['t']:.1f}s")
+    print("Archivos: " + "  ".join(f"{n} {b / 1e6:.2f} MB" for n, b in info["tamanos"].items())
+          + f"  -> {out_dir}")
+
+    if args.verificar and not verificar(data_dir, out_dir):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
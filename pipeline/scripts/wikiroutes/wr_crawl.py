@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import queue
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+
+class TokenBucket:
+    """
+    Limitador global de peticiones: `rate` tokens por segundo con ráfaga `burst`.
+    Lo comparten todos los workers, así el total hacia el host nunca supera `rate`.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate debe ser > 0")
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, stop: Optional[threading.Event] = None) -> bool:
+        """Bloquea hasta obtener un token. Devuelve False si `stop` se activó mientras esperaba."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop is not None:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class CrawlAbortado(RuntimeError):
+    pass
+
+
+@dataclass
+class ResultadoTarea:
+    item: Any
+    ok: bool
+    valor: Any = None
+    error: str = ""
+    intentos: int = 0
+    segundos: float = 0.0
+
+
+def backoff_delay(intento: int, base: float, maximo: float) -> float:
+    """Backoff exponencial con jitter: base * 2^(intento-1), acotado y +-25 %."""
+    d = min(maximo, base * (2 ** max(0, intento - 1)))
+    return d * random.uniform(0.75, 1.25)
+
+
+def _fmt_duracion(s: float) -> str:
+    s = int(max(0, s))
+    h, r = divmod(s, 3600)
+    m, sec = divmod(r, 60)
+    if h:
+        return f"{h}h{m:02d}m"
+    return f"{m}m{sec:02d}s"
+
+
+class _Progreso:
+    def __init__(self, total: int, stream=sys.stderr, cada: float = 1.0):
+        self.total = total
+        self.stream = stream
+        self.cada = cada
+        self.ok = 0
+        self.err = 0
+        self.t0 = time.monotonic()
+        self._stop = threading.Event()
+        self._th = threading.Thread(target=self._loop, daemon=True)
+
+    def linea(self) -> str:
+        hechos = self.ok + self.err
+        dt = max(1e-9, time.monotonic() - self.t0)
+        ritmo = hechos / dt
+        eta = (self.total - hechos) / ritmo if ritmo > 0 else 0
+        return (f"[crawl] {hechos}/{self.total} ok={self.ok} err={self.err} "
+                f"{ritmo * 60:.1f} rutas/min  transcurrido {_fmt_duracion(dt)}  ETA {_fmt_duracion(eta)}")
+
+    def _loop(self):
+        while not self._stop.wait(self.cada):
+            self.stream.write("\r" + self.linea())
+            self.stream.flush()
+
+    def start(self):
+        self._th.start()
+
+    def stop(self):
+        self._stop.set()
+        self._th.join()
+        self.stream.write("\r" + self.linea() + "\n")
+        self.stream.flush()
+
+
+def crawl(
+    items: Iterable[Any],
+    trabajo: Callable[[Any], Any],
+    workers: int = 2,
+    rate: float = 0.5,
+    burst: int = 1,
+    max_reintentos: int = 3,
+    backoff_base: float = 5.0,
+    backoff_max: float = 120.0,
+    max_errores_seguidos: int = 20,
+    al_terminar: Optional[Callable[[ResultadoTarea], None]] = None,
+    progreso: bool = True,
+) -> List[ResultadoTarea]:
+    """
+    Reparte `items` entre `workers` hilos que llaman a `trabajo(item)`.
+
+    - Cada intento consume un token del TokenBucket global (`rate` peticiones/s).
+    - Un intento fallido se reintenta con backoff exponencial hasta `max_reintentos`.
+    - Si se acumulan `max_errores_seguidos` fallos definitivos sin ningún éxito
+      entre medio, se deja de repartir trabajo y se lanza CrawlAbortado.
+    - `al_terminar(resultado)` se llama serializado (bajo lock) al cerrar cada item.
+
+    Devuelve los resultados en el orden en que terminaron.
+    """
+    pendientes: "queue.Queue[Any]" = queue.Queue()
+    for it in items:
+        pendientes.put(it)
+    total = pendientes.qsize()
+
+    bucket = TokenBucket(rate, burst)
+    stop = threading.Event()
+    lock = threading.Lock()
+    resultados: List[ResultadoTarea] = []
+    seguidos = [0]
+    prog = _Progreso(total) if progreso else None
+
+    def ejecutar(item) -> ResultadoTarea:
+        t0 = time.monotonic()
+        intento = 0
+        while True:
+            intento += 1
+            if not bucket.take(stop):
+                return ResultadoTarea(item, False, error="abortado", intentos=intento - 1,
+                                      segundos=time.monotonic() - t0)
+            try:
+                valor = trabajo(item)
+                return ResultadoTarea(item, True, valor=valor, intentos=intento,
+                                      segundos=time.monotonic() - t0)
+            except Exception as e:
+                if intento > max_reintentos or stop.is_set():
+                    return ResultadoTarea(item, False, error=f"{type(e).__name__}: {e}",
+                                          intentos=intento, segundos=time.monotonic() - t0)
+                if stop.wait(backoff_delay(intento, backoff_base, backoff_max)):
+                    return ResultadoTarea(item, False, error=f"{type(e).__name__}: {e}",
+                                          intentos=intento, segundos=time.monotonic() - t0)
+
+    def worker():
+        while not stop.is_set():
+            try:
+                item = pendientes.get_nowait()
+            except queue.Empty:
+                return
+            res = ejecutar(item)
+            with lock:
+                resultados.append(res)
+                if res.ok:
+                    seguidos[0] = 0
+                    if prog: prog.ok += 1
+                else:
+                    seguidos[0] += 1
+                    if prog: prog.err += 1
+                    if max_errores_seguidos and seguidos[0] >= max_errores_seguidos:
+                        stop.set()
+                if al_terminar is not None:
+                    try:
+                        al_terminar(res)
+                    except Exception as e:
+                        print(f"[WARN] al_terminar falló para {res.item}: {e}")
+
+    hilos = [threading.Thread(target=worker, name=f"crawl-{i}", daemon=True)
+             for i in range(max(1, int(workers)))]
+    if prog: prog.start()
+    try:
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            while h.is_alive():
+                h.join(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+        for h in hilos:
+            h.join()
+        raise
+    finally:
+        if prog: prog.stop()
+
+    if stop.is_set() and seguidos[0] >= max_errores_seguidos > 0:
+        raise CrawlAbortado(
+            f"Se detuvo el crawl tras {seguidos[0]} errores seguidos "
+            f"({len(resultados)}/{total} procesadas)"
+        )
+    return resultados
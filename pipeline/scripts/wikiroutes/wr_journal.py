@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+
+def escribir_atomico(path: Path, texto: str) -> None:
+    """
+    Escribe a un temporal único en la misma carpeta y lo renombra: nunca deja el
+    archivo a medias, aunque varios procesos (etapas paralelas de run_pipeline)
+    guarden el mismo archivo a la vez; gana el último os.replace.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        # mkstemp crea con 0600: conservar los permisos del archivo que se reemplaza
+        os.chmod(tmp, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(texto)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class CrawlJournal:
+    """
+    Bitácora append-only (JSONL) con el resultado de cada ruta del crawl.
+
+    Cada línea es un evento:
+      {"event": "route", "status": "done"|"failed", "url", "route_id", "name",
+       "folder", "trips", "intentos", "segundos", "error", "ts"}
+      {"event": "checkpoint", "ts"}   -> los índices JSON quedaron guardados
+
+    Cada línea se escribe con flush + fsync, así un corte (crash, Ctrl-C) pierde
+    como mucho la línea en curso; una última línea truncada se ignora al leer.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def leer(self) -> List[Dict]:
+        if not self.path.exists():
+            return []
+        eventos = []
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    eventos.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return eventos
+
+    def _append(self, rec: Dict) -> None:
+        rec = {"ts": datetime.now(timezone.utc).isoformat(timespec="seconds"), **rec}
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def ruta(self, status: str, url: str, **campos) -> None:
+        self._append({"event": "route", "status": status, "url": url, **campos})
+
+    def checkpoint(self) -> None:
+        self._append({"event": "checkpoint"})
+
+    def estado_por_url(self) -> Dict[str, Dict]:
+        """Último evento de ruta registrado para cada URL."""
+        out: Dict[str, Dict] = {}
+        for ev in self.leer():
+            if ev.get("event") == "route" and ev.get("url"):
+                out[ev["url"]] = ev
+        return out
+
+    def hechas_sin_checkpoint(self) -> List[Dict]:
+        """Rutas 'done' registradas después del último checkpoint de índices."""
+        pendientes: List[Dict] = []
+        for ev in self.leer():
+            if ev.get("event") == "checkpoint":
+                pendientes = []
+            elif ev.get("event") == "route" and ev.get("status") == "done":
+                pendientes.append(ev)
+        return pendientes
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# Grabación y reproducción offline de wikiroutes.info.
+#
+#   python wr_replay.py record --out DIR --catalog --routes 20
+#   python wr_replay.py record --out DIR --url URL [URL ...]
+#       Abre Chrome, carga el catálogo y/o las rutas, hace clic en los viajes y guarda
+#       cada respuesta (HTML, JS, CSS, XHR) leída vía DevTools en DIR/index.json + DIR/bodies/.
+#
+#   python wr_replay.py serve --dir DIR --port 8765 --latency-ms 150 --jitter-ms 50
+#       Sirve lo grabado en http://127.0.0.1:8765 con la latencia indicada por respuesta.
+#
+# Para correr el scraper contra la copia local:
+#   WR_BASE_URL=http://127.0.0.1:8765 python wr_build_catalog.py
+#   WR_BASE_URL=http://127.0.0.1:8765 python wr_bench.py extract --url http://127.0.0.1:8765/es/lima/routes/...
+#
+# El host original se sirve en la raíz; el resto (CDN, librerías) bajo /__ext__/<host>/...
+# En los cuerpos de texto se reescriben las URLs absolutas hacia el servidor local.
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, urljoin
+
+EXT_PREFIX = "/__ext__/"
+TEXT_MIMES = ("text/", "javascript", "json", "xml", "svg")
+# Únicos a los que se sirve la grabación de la misma ruta con otra query (p. ej. app.js?v=2)
+STATIC_EXTS = (".js", ".mjs", ".css", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+               ".woff", ".woff2", ".ttf", ".otf", ".eot", ".map")
+STATIC_MIMES = ("text/css", "application/javascript", "text/javascript", "image/", "font/",
+                "application/font", "application/x-font")
+# Cabeceras que no se reenvían: el cuerpo ya viene decodificado y se recalcula el largo
+HOP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection",
+               "set-cookie", "strict-transport-security", "content-security-policy", "alt-svc"}
+
+
+def _leer_urls(args):
+    urls = list(args.url or [])
+    if args.urls_file:
+        for line in Path(args.urls_file).read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                urls.append(line)
+    return urls
+
+
+# ---------------------------------------------------------------------------
+# Grabación
+# ---------------------------------------------------------------------------
+
+class Grabacion:
+    """index.json: {"base": ..., "entries": {url: {status, mime, headers, body}}} + bodies/<sha1>."""
+
+    def __init__(self, out: Path, base: str):
+        self.out = Path(out)
+        self.bodies = self.out / "bodies"
+        self.bodies.mkdir(parents=True, exist_ok=True)
+        idx = self.out / "index.json"
+        data = json.loads(idx.read_text(encoding="utf-8")) if idx.exists() else {}
+        self.base = data.get("base") or base
+        self.entries = data.get("entries", {})
+
+    def guardar_cuerpo(self, raw: bytes) -> str:
+        name = hashlib.sha1(raw).hexdigest()
+        p = self.bodies / name
+        if not p.exists():
+            p.write_bytes(raw)
+        return name
+
+    def agregar(self, url, status, mime, headers, raw=None, location=None):
+        prev = self.entries.get(url)
+        # Una entrada con cuerpo no se pisa con otra sin cuerpo (p. ej. un 304 o una caché)
+        if prev and prev.get("body") and raw is None:
+            return
+        rec = {"status": int(status), "mime": mime or "",
+               "headers": {k: v for k, v in (headers or {}).items() if k.lower() not in HOP_HEADERS}}
+        if raw is not None:
+            rec["body"] = self.guardar_cuerpo(raw)
+        if location:
+            rec["location"] = location
+        self.entries[url] = rec
+
+    def escribir(self):
+        data = {"base": self.base, "entries": dict(sorted(self.entries.items()))}
+        (self.out / "index.json").write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def volcar_respuestas(driver, grab: Grabacion) -> int:
+    """Lee el log de performance y guarda cada respuesta con su cuerpo (vía Network.getResponseBody)."""
+    from wr_scrape import drain_performance_log
+
+    n = 0
+    for e in drain_performance_log(driver):
+        try:
+            msg = json.loads(e["message"])["message"]
+        except Exception:
+            continue
+        method, p = msg.get("method"), msg.get("params", {})
+        if method == "Network.requestWillBeSent" and p.get("redirectResponse"):
+            r = p["redirectResponse"]
+            grab.agregar(r.get("url", ""), r.get("status", 302), r.get("mimeType"),
+                         r.get("headers"), location=p.get("request", {}).get("url"))
+            continue
+        if method != "Network.responseReceived":
+            continue
+        r = p.get("response", {})
+        url = r.get("url", "")
+        if not url.startswith("http"):
+            continue
+        try:
+            body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": p.get("requestId")})
+        except Exception:
+            grab.agregar(url, r.get("status", 200), r.get("mimeType"), r.get("headers"))
+            continue
+        text = body.get("body") or ""
+        raw = base64.b64decode(text) if body.get("base64Encoded") else text.encode("utf-8")
+        grab.agregar(url, r.get("status", 200), r.get("mimeType"), r.get("headers"), raw)
+        n += 1
+    return n
+
+
+def cmd_record(args):
+    from wr_scrape import (DEFAULT_BASE, DRIVER_PROFILES, make_driver, http_session,
+                           wait_map_ready, find_trip_toggles, extract_leaflet)
+
+    if "://127.0.0.1" in DEFAULT_BASE or "://localhost" in DEFAULT_BASE:
+        raise SystemExit("WR_BASE_URL apunta a un servidor local: la grabación debe hacerse contra el sitio real")
+    if args.profile not in DRIVER_PROFILES:
+        raise SystemExit(f"--profile debe ser uno de {DRIVER_PROFILES}")
+
+    grab = Grabacion(Path(args.out), DEFAULT_BASE)
+    urls = _leer_urls(args)
+
+    # robots.txt lo pide requests, no Chrome
+    try:
+        r = http_session().get(urljoin(DEFAULT_BASE, "/robots.txt"), timeout=10)
+        grab.agregar(r.url, r.status_code, r.headers.get("Content-Type", "text/plain"), {}, r.content)
+    except Exception as e:
+        print(f"[WARN] robots.txt: {e}")
+
+    d = make_driver(headless=bool(args.headless), perf_log=True, profile=args.profile)
+    try:
+        if args.catalog:
+            from wr_build_catalog import CATALOG_URL, esperar_chips, cosechar_rutas
+            d.get(CATALOG_URL)
+            esperar_chips(d)
+            rutas = cosechar_rutas(d)
+            print(f"[OK] catálogo: {len(rutas)} rutas, {volcar_respuestas(d, grab)} respuestas")
+            if args.routes:
+                urls += [r["url"] for r in rutas[:args.routes]]
+
+        for i, url in enumerate(urls, 1):
+            try:
+                d.get(url)
+                wait_map_ready(d)
+                extract_leaflet(d, find_trip_toggles(d))
+            except Exception as e:
+                print(f"[WARN] {url}: {e}")
+            print(f"[{i}/{len(urls)}] {url}: {volcar_respuestas(d, grab)} respuestas")
+            grab.escribir()
+    finally:
+        try:
+            d.quit()
+        except Exception:
+            pass
+        grab.escribir()
+    print(f"[OK] {len(grab.entries)} URLs grabadas en {grab.out}")
+
+
+# ---------------------------------------------------------------------------
+# Reproducción
+# ---------------------------------------------------------------------------
+
+def es_estatico(url: str, rec: dict) -> bool:
+    """Recurso estático (js, css, imagen, fuente) por extensión o por el mime grabado."""
+    path = urlsplit(url).path.lower()
+    if path.endswith(STATIC_EXTS):
+        return True
+    mime = (rec.get("mime") or "").lower()
+    return mime.startswith(STATIC_MIMES)
+
+
+class Reproduccion:
+    def __init__(self, carpeta: Path, origen: str):
+        data = json.loads((Path(carpeta) / "index.json").read_text(encoding="utf-8"))
+        self.carpeta = Path(carpeta)
+        self.origen = origen.rstrip("/")
+        self.base = data["base"].rstrip("/")
+        self.base_host = urlsplit(self.base).netloc
+        self.entries = data["entries"]
+        # Sin query: primera URL grabada para cada scheme://host/path, solo de estáticos
+        # (?v=123 de caché); una página o un XHR con otra query es otro contenido
+        self.sin_query = {}
+        for url, rec in self.entries.items():
+            if es_estatico(url, rec):
+                self.sin_query.setdefault(url.split("?", 1)[0], url)
+        hosts = sorted({urlsplit(u).netloc for u in self.entries} | {self.base_host}, key=len, reverse=True)
+        # https://host, http://host, //host y sus variantes escapadas en JSON (https:\/\/host)
+        self._re_host = re.compile(
+            r"(?:https?:)?(?:\\?/){2}(" + "|".join(re.escape(h) for h in hosts) + r")(?![\w.-])")
+
+    def url_original(self, path: str) -> str:
+        if path.startswith(EXT_PREFIX):
+            return "https://" + path[len(EXT_PREFIX):]
+        return self.base + path
+
+    def buscar(self, url: str):
+        for cand in (url, url.replace("https://", "http://", 1)):
+            if cand in self.entries:
+                return self.entries[cand]
+            alt = self.sin_query.get(cand.split("?", 1)[0])
+            if alt:
+                return self.entries[alt]
+        return None
+
+    def local(self, url: str) -> str:
+        parts = urlsplit(url)
+        if parts.netloc == self.base_host:
+            return self.origen + url[len(f"{parts.scheme}://{parts.netloc}"):]
+        return self.origen + EXT_PREFIX + url.split("://", 1)[-1]
+
+    def reescribir(self, text: str) -> str:
+        def sub(m):
+            host = m.group(1)
+            escapado = "\\/" in m.group(0)
+            dest = self.origen if host == self.base_host else f"{self.origen}{EXT_PREFIX}{host}"
+            return dest.replace("/", "\\/") if escapado else dest
+        return self._re_host.sub(sub, text)
+
+    def cuerpo(self, rec) -> bytes:
+        if not rec.get("body"):
+            return b""
+        raw = (self.carpeta / "bodies" / rec["body"]).read_bytes()
+        if any(t in rec.get("mime", "") for t in TEXT_MIMES):
+            raw = self.reescribir(raw.decode("utf-8", errors="replace")).encode("utf-8")
+        return raw
+
+
+def make_handler(rep: Reproduccion, latency_ms: float, jitter_ms: float, quiet: bool):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _servir(self, con_cuerpo=True):
+            demora = latency_ms + (random.uniform(0, jitter_ms) if jitter_ms else 0)
+            if demora > 0:
+                time.sleep(demora / 1000)
+            rec = rep.buscar(rep.url_original(self.path))
+            if rec is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            raw = rep.cuerpo(rec)
+            self.send_response(rec["status"])
+            for k, v in rec.get("headers", {}).items():
+                if k.lower() not in ("content-type", "location"):
+                    for linea in str(v).split("\n"):
+                        self.send_header(k, linea)
+            if rec.get("mime"):
+                self.send_header("Content-Type", rec["mime"])
+            if rec.get("location"):
+                self.send_header("Location", rep.local(rec["location"]))
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            if con_cuerpo:
+                self.wfile.write(raw)
+
+        def do_GET(self):
+            self._servir()
+
+        def do_HEAD(self):
+            self._servir(con_cuerpo=False)
+
+        def do_POST(self):
+            # Los XHR por POST se reproducen con la respuesta grabada para esa URL
+            n = int(self.headers.get("Content-Length") or 0)
+            if n:
+                self.rfile.read(n)
+            self._servir()
+
+        def log_message(self, fmt, *a):
+            if not quiet:
+                super().log_message(fmt, *a)
+
+    return Handler
+
+
+def cmd_serve(args):
+    origen = f"http://{args.host}:{args.port}"
+    rep = Reproduccion(Path(args.dir), origen)
+    srv = ThreadingHTTPServer((args.host, args.port), make_handler(rep, args.latency_ms, args.jitter_ms, args.quiet))
+    srv.daemon_threads = True
+    print(f"[OK] {len(rep.entries)} URLs de {rep.base} en {origen} "
+          f"(latencia {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms)")
+    print(f"     export WR_BASE_URL={origen}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.server_close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Grabación y reproducción offline de wikiroutes.info")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="Graba catálogo y rutas desde el sitio real")
+    rec.add_argument("--out", required=True, help="Carpeta de la grabación (se amplía si ya existe)")
+    rec.add_argument("--catalog", action="store_true", help="Graba también el catálogo completo")
+    rec.add_argument("--routes", type=int, default=0, help="Con --catalog, graba las primeras N rutas")
+    rec.add_argument("--url", nargs="+")
+    rec.add_argument("--urls-file", help="Archivo con una URL de ruta por línea")
+    rec.add_argument("--profile", default="lean")
+    rec.add_argument("--headless", type=int, default=1)
+    rec.set_defaults(func=cmd_record)
+
+    srv = sub.add_parser("serve", help="Sirve una grabación en local")
+    srv.add_argument("--dir", required=True)
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    srv.add_argument("--latency-ms", type=float, default=0.0, help="Demora fija por respuesta")
+    srv.add_argument("--jitter-ms", type=float, default=0.0, help="Demora aleatoria extra (0..jitter)")
+    srv.add_argument("--quiet", action="store_true", help="No imprime cada petición")
+    srv.set_defaults(func=cmd_serve)
+
+    args = ap.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -0,0 +1,687 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html import unescape
+from html.entities import html5 as HTML5_ENTITIES
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError as e:
+    raise SystemExit(
+        "Falta dependencia: beautifulsoup4\n"
+        "Instala con: pip install beautifulsoup4"
+    ) from e
+
+from wr_journal import escribir_atomico
+
+
+# Subir si cambia lo que se extrae del HTML: invalida toda la caché
+PARSER_VERSION = 3
+
+TRIP_FILES = ("route_track_trip1.geojson", "route_track_trip2.geojson")
+
+# Páginas sintéticas con el marcado de WikiRoutes (trip-seq, spans con flecha,
+# ficha con Itinerario/Empresa) y lo que se espera extraer de cada una
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "route_html"
+
+SPAN_ARROW_PATTERN = re.compile(
+    r'<span[^>]*>([^<]+)</span>\s*(?:&nbsp;|\u00a0)?\s*(?:→|&rarr;)\s*(?:&nbsp;|\u00a0)?\s*<span[^>]*>([^<]+)</span>'
+)
+ITINERARIO_RE = re.compile(r'Itinerario\s*:\s*(.*?)(?:Fechas|Horario|Ciudad|Empresa|\Z)', re.DOTALL)
+EMPRESA_RE = re.compile(r'Empresa(?:\s+de\s+transportes?)?\s*:\s*(.*?)(?:Fechas|Horario|Ciudad|Itinerario|Tarifa|\Z)',
+                        re.DOTALL | re.IGNORECASE)
+# "Ruta de autobús Lima - Trujillo (Ittsa Bus) en el mapa de Lima": el paréntesis es la
+# empresa solo si el nombre ya es un par origen - destino; en "EO44 (Ricardo Palma - Callao)"
+# el paréntesis es el recorrido
+TITULO_EMPRESA_RE = re.compile(r'^Ruta de \S+ (?P<nombre>.+?) \((?P<empresa>[^()]+)\)(?: en el mapa de .*)?$')
+
+
+# ==========================
+# Extracción desde route.html
+# ==========================
+
+def simplify_stop_name(name: str) -> str:
+    s = " ".join((name or "").split())
+    if " - " in s:
+        s = s.split(" - ", 1)[0].strip()
+    return s
+
+
+def clean_label(text: str) -> str:
+    if not text:
+        return ""
+    t = unescape(text)
+    t = re.sub(r"\s+", " ", t)
+    return t.strip()
+
+
+def endpoints_from_soup(soup) -> Dict[int, Tuple[str, str]]:
+    """Extremos (inicio, fin) de cada trip-seq del HTML, p. ej. {1: (A, B), 2: (B, A)}."""
+    endpoints: Dict[int, Tuple[str, str]] = {}
+    for d in soup.find_all(attrs={"trip-seq": True}):
+        seq_raw = (d.get("trip-seq") or "").strip()
+        if not seq_raw.isdigit():
+            continue
+        text = " ".join(d.get_text(" ", strip=True).split())
+        if "→" not in text:
+            continue
+        left, right = text.split("→", 1)
+        start = simplify_stop_name(left.strip())
+        end = simplify_stop_name(right.strip())
+        if start and end:
+            endpoints[int(seq_raw)] = (start, end)
+    return endpoints
+
+
+def pairs_from_html(html: str) -> List[Tuple[str, str]]:
+    """Todos los pares Origen → Destino (spans separados por flecha), ya limpios."""
+    pairs: List[Tuple[str, str]] = []
+    for a, b in SPAN_ARROW_PATTERN.findall(html):
+        a_clean = clean_label(a)
+        b_clean = clean_label(b)
+        if a_clean or b_clean:
+            pairs.append((a_clean, b_clean))
+    return pairs
+
+
+def itinerario_from_soup(soup) -> Tuple[str, str]:
+    return itinerario_from_text(soup.get_text(separator=" "))
+
+
+# ==========================
+# Extractor por eventos (sin árbol)
+# ==========================
+
+# Mismas reglas que el tree builder html.parser de BeautifulSoup, para que el
+# texto salga idéntico: etiquetas vacías, contenedores cuyo texto get_text()
+# ignora (script, style...) y tags que preservan espacios.
+EMPTY_ELEMENT_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link",
+    "menuitem", "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+}
+STRING_CONTAINER_TAGS = {"rt", "rp", "style", "script", "template"}
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+ASCII_SPACES = set("\x20\x0a\x09\x0c\x0d")
+
+
+class FragmentosRuta(HTMLParser):
+    """
+    Recorre route.html una vez y guarda solo lo que usan los indexadores:
+    el texto de cada elemento [trip-seq] y los strings visibles del documento
+    (lo que devolvería soup.get_text()). No construye árbol.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings: List[str] = []            # strings de texto, en orden de documento
+        self.guardar_strings = True
+        self.trips: List[Tuple[str, List[str]]] = []   # (trip-seq, strings) en orden de apertura
+        self._stack: List[Tuple[str, Optional[List[str]], object]] = []
+        self._buckets: List = []                # buckets de los elementos abiertos, en orden de pila
+        self._counts: Dict[str, int] = {}
+        self._data: List[str] = []
+        self._containers = 0
+        self._preserve = 0
+        self._already_closed: List[str] = []
+
+    # -- texto --
+    def _flush(self, visible=True):
+        if not self._data:
+            return
+        s = "".join(self._data)
+        self._data = []
+        if not self._preserve and all(c in ASCII_SPACES for c in s):
+            s = "\n" if "\n" in s else " "
+        if not visible or self._containers:
+            return
+        if self.guardar_strings:
+            self.strings.append(s)
+        for bucket in self._buckets:
+            bucket.append(s)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_charref(self, name):
+        m = re.match(r"([xX][0-9a-fA-F]+|[0-9]+)(.*)", name, re.DOTALL)
+        if m:
+            self.handle_data(unescape(f"&#{m.group(1)};"))
+            if m.group(2):
+                self.handle_data(m.group(2))
+        else:
+            self.handle_data(name)
+
+    def handle_entityref(self, name):
+        self.handle_data(HTML5_ENTITIES.get(name + ";", "&" + name))
+
+    def _no_texto(self, data, visible=False):
+        # Comentarios, doctype, PIs: cortan el string en curso y no cuentan como texto
+        self._flush()
+        self._data = [data]
+        self._flush(visible)
+
+    def handle_comment(self, data):
+        self._no_texto(data)
+
+    def handle_decl(self, decl):
+        self._no_texto(decl)
+
+    def handle_pi(self, data):
+        self._no_texto(data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self._no_texto(data[len("CDATA["):], visible=True)
+        else:
+            self._no_texto(data)
+
+    # -- etiquetas --
+    def _abrir(self, tag, attr):
+        """
+        (bucket, dato) para un elemento que se abre: bucket (o None) recibe los
+        strings de su contenido; dato (o None) se le pasa a _cerrar al cerrarlo.
+        """
+        if "trip-seq" in attr:
+            bucket = []
+            self.trips.append((attr["trip-seq"], bucket))
+            return bucket, None
+        return None, None
+
+    def _cerrar(self, tag, dato):
+        pass
+
+    def _push(self, tag, attrs):
+        self._flush()
+        attr = dict((k, v if v is not None else "") for k, v in attrs)
+        bucket, dato = self._abrir(tag, attr)
+        self._stack.append((tag, bucket, dato))
+        if bucket is not None:
+            self._buckets.append(bucket)
+        self._counts[tag] = self._counts.get(tag, 0) + 1
+        if tag in STRING_CONTAINER_TAGS:
+            self._containers += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve += 1
+
+    def _pop_to(self, tag):
+        self._flush()
+        if not self._counts.get(tag):
+            return
+        while self._stack:
+            name, bucket, dato = self._stack.pop()
+            if bucket is not None:
+                self._buckets.pop()
+            if dato is not None:
+                self._cerrar(name, dato)
+            self._counts[name] -= 1
+            if name in STRING_CONTAINER_TAGS:
+                self._containers -= 1
+            if name in PRESERVE_WHITESPACE_TAGS:
+                self._preserve -= 1
+            if name == tag:
+                return
+
+    def handle_starttag(self, tag, attrs):
+        self._push(tag, attrs)
+        if tag in EMPTY_ELEMENT_TAGS:
+            self._pop_to(tag)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._push(tag, attrs)
+        self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+        else:
+            self._pop_to(tag)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def endpoints_from_fragments(frag: FragmentosRuta) -> Dict[int, Tuple[str, str]]:
+    endpoints: Dict[int, Tuple[str, str]] = {}
+    for seq_raw, strings in frag.trips:
+        seq_raw = seq_raw.strip()
+        if not seq_raw.isdigit():
+            continue
+        text = " ".join(" ".join(x.strip() for x in strings if x.strip()).split())
+        if "→" not in text:
+            continue
+        left, right = text.split("→", 1)
+        start = simplify_stop_name(left.strip())
+        end = simplify_stop_name(right.strip())
+        if start and end:
+            endpoints[int(seq_raw)] = (start, end)
+    return endpoints
+
+
+def itinerario_from_text(texto: str) -> Tuple[str, str]:
+    """Texto tras 'Itinerario:' y un código de error ('' si se encontró)."""
+    m = ITINERARIO_RE.search(texto)
+    if not m:
+        return "", "no_itinerario"
+    itin = m.group(1).strip()
+    # Cortar en el primer punto seguido de espacio y mayuscula
+    # para no capturar texto de UI que viene despues del itinerario
+    corte = re.search(r'\.\s+(?=[A-Z])', itin)
+    if corte:
+        itin = itin[:corte.start() + 1]
+    return itin, ""
+
+
+def empresa_from_title(title: str) -> str:
+    """Operador entre paréntesis en el title de route.json ('' si el title no lo trae)."""
+    m = TITULO_EMPRESA_RE.match(" ".join((title or "").split()))
+    if not m or " - " not in m.group("nombre"):
+        return ""
+    return m.group("empresa").strip()
+
+
+def empresa_from_text(texto: str) -> str:
+    """
+    Operador tras 'Empresa:' en la ficha de la ruta ('' si no aparece). Ningún route.html
+    del corpus actual trae ese campo: los cortes de EMPRESA_RE salen de las etiquetas
+    vecinas de la ficha y solo están probados con las páginas sintéticas de --verificar.
+    """
+    m = EMPRESA_RE.search(texto)
+    if not m:
+        return ""
+    # Sin cortar en ". Mayúscula" como el itinerario: las siglas (E.T. Translima) lo romperían
+    return " ".join(m.group(1).split())[:120].strip(" ,;")
+
+
+def fragmentos(html: str) -> FragmentosRuta:
+    frag = FragmentosRuta()
+    frag.feed(html)
+    frag.close()
+    return frag
+
+
+def _decodificar(raw: bytes) -> Tuple[str, str]:
+    """
+    route.html decodificado con 'replace' (extremos) y con 'ignore' (pares e
+    itinerario), igual que lo hacía cada script por separado. Si el archivo es
+    UTF-8 válido ambos textos son el mismo objeto y basta con un recorrido.
+    """
+    html_replace = raw.decode("utf-8", errors="replace")
+    try:
+        raw.decode("utf-8")
+        return html_replace, html_replace
+    except UnicodeDecodeError:
+        return html_replace, raw.decode("utf-8", errors="ignore")
+
+
+def parse_route_html(raw: bytes) -> Dict:
+    """Un solo recorrido de route.html para todos los indexadores (extractor por eventos)."""
+    html_replace, html_ignore = _decodificar(raw)
+    frag = fragmentos(html_replace)
+    frag_ignore = frag if html_ignore is html_replace else fragmentos(html_ignore)
+    texto = " ".join(frag_ignore.strings)
+    itinerario, itinerario_error = itinerario_from_text(texto)
+    return {
+        "endpoints": {str(k): list(v) for k, v in endpoints_from_fragments(frag).items()},
+        "pairs": [list(p) for p in pairs_from_html(html_ignore)],
+        "itinerario": itinerario,
+        "itinerario_error": itinerario_error,
+        "empresa": empresa_from_text(texto),
+    }
+
+
+def parse_route_html_bs(raw: bytes) -> Dict:
+    """Versión de referencia con BeautifulSoup (árbol completo); la usa --verificar."""
+    html_replace, html_ignore = _decodificar(raw)
+    soup = BeautifulSoup(html_replace, "html.parser")
+    soup_ignore = soup if html_ignore is html_replace else BeautifulSoup(html_ignore, "html.parser")
+    itinerario, itinerario_error = itinerario_from_soup(soup_ignore)
+    return {
+        "endpoints": {str(k): list(v) for k, v in endpoints_from_soup(soup).items()},
+        "pairs": [list(p) for p in pairs_from_html(html_ignore)],
+        "itinerario": itinerario,
+        "itinerario_error": itinerario_error,
+        "empresa": empresa_from_text(soup_ignore.get_text(separator=" ")),
+    }
+
+
+# ==========================
+# Caché por carpeta
+# ==========================
+
+def _sha1(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest()
+
+
+def _firma(path: Path, raw: Optional[bytes] = None) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    st = path.stat()
+    sha1 = hashlib.sha1(raw).hexdigest() if raw is not None else _sha1(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": sha1}
+
+
+def _sin_cambios(path: Path, prev: Optional[Dict]) -> bool:
+    """size/mtime iguales -> sin cambios; mismo tamaño pero otro mtime -> decide el sha1."""
+    if prev is None:
+        return not path.exists()
+    if not path.exists():
+        return False
+    st = path.stat()
+    if st.st_size != prev.get("size"):
+        return False
+    if st.st_mtime_ns == prev.get("mtime_ns"):
+        return True
+    if _sha1(path) == prev.get("sha1"):
+        prev["mtime_ns"] = st.st_mtime_ns
+        return True
+    return False
+
+
+def detect_trips(folder: Path) -> List[int]:
+    return [i for i, name in enumerate(TRIP_FILES, start=1) if (folder / name).exists()]
+
+
+def build_folder_meta(folder: Path) -> Dict:
+    route_json_path = folder / "route.json"
+    route_html_path = folder / "route.html"
+
+    meta: Dict = {"route_id": "", "title": "", "has_route_json": route_json_path.exists(),
+                  "has_route_html": route_html_path.exists()}
+    if meta["has_route_json"]:
+        rj = json.loads(route_json_path.read_text(encoding="utf-8"))
+        meta["route_id"] = str((rj.get("route_id") or "")).strip()
+        meta["title"] = str((rj.get("title") or "")).strip()
+
+    raw = route_html_path.read_bytes() if meta["has_route_html"] else None
+    if raw is not None:
+        try:
+            meta.update(parse_route_html(raw))
+        except Exception:
+            # HTML que el extractor por eventos no digiere: árbol completo
+            meta.update(parse_route_html_bs(raw))
+    else:
+        meta.update({"endpoints": {}, "pairs": [], "itinerario": "", "itinerario_error": "no_html",
+                     "empresa": ""})
+
+    # El title (probado sobre los de WikiRoutes) manda; 'Empresa:' del HTML queda de respaldo
+    meta["empresa"] = empresa_from_title(meta["title"]) or meta["empresa"]
+
+    meta["trips"] = detect_trips(folder)
+    meta["_files"] = {
+        "route.json": _firma(route_json_path),
+        "route.html": _firma(route_html_path, raw),
+    }
+    return meta
+
+
+def endpoints_of(meta: Dict) -> Dict[int, Tuple[str, str]]:
+    return {int(k): (v[0], v[1]) for k, v in (meta.get("endpoints") or {}).items()}
+
+
+def pairs_of(meta: Dict) -> List[Tuple[str, str]]:
+    return [(a, b) for a, b in meta.get("pairs") or []]
+
+
+class RouteMetaCache:
+    """
+    Metadatos parseados de cada carpeta route_* (title, route_id, extremos,
+    pares con flecha, itinerario, empresa y archivos de trips), compartidos por
+    wr_sync_indexes, wr_build_codes, wr_build_extremes, comparar_rutas y operadores.
+
+    Se guarda en pipeline/cache/wr_route_meta.json. Una carpeta se vuelve a
+    parsear solo si cambió route.json o route.html (tamaño/mtime, con sha1
+    como desempate) o si cambió el conjunto de route_track_trip*.geojson.
+    """
+
+    def __init__(self, data_dir: Path, path: Optional[Path] = None):
+        self.data_dir = Path(data_dir)
+        root = self.data_dir.resolve().parents[2]
+        self.path = Path(path) if path else root / "pipeline" / "cache" / "wr_route_meta.json"
+        self.folders: Dict[str, Dict] = {}
+        self.parsed = 0
+        self.reused = 0
+        self._dirty = False
+        self._frescos = set()   # carpetas parseadas en esta ejecución
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                if data.get("version") == PARSER_VERSION:
+                    self.folders = data.get("folders", {})
+            except (json.JSONDecodeError, OSError):
+                self.folders = {}
+
+    def _vigente(self, folder: Path) -> Optional[Dict]:
+        """Entrada de la caché si la carpeta no cambió; None si hay que parsearla."""
+        prev = self.folders.get(folder.name)
+        if prev is None:
+            return None
+        files = prev.get("_files", {})
+        mtimes = {k: (v or {}).get("mtime_ns") for k, v in files.items()}
+        if (_sin_cambios(folder / "route.json", files.get("route.json"))
+                and _sin_cambios(folder / "route.html", files.get("route.html"))
+                and detect_trips(folder) == prev.get("trips")):
+            if mtimes != {k: (v or {}).get("mtime_ns") for k, v in files.items()}:
+                self._dirty = True
+            return prev
+        return None
+
+    def _guardar(self, folder: Path, meta: Dict) -> Dict:
+        self.folders[folder.name] = meta
+        self._frescos.add(folder.name)
+        self.parsed += 1
+        self._dirty = True
+        return meta
+
+    def get(self, folder: Path) -> Dict:
+        if folder.name in self._frescos:
+            return self.folders[folder.name]
+        prev = self._vigente(folder)
+        if prev is not None:
+            self.reused += 1
+            return prev
+        return self._guardar(folder, build_folder_meta(folder))
+
+    def prefetch(self, folders: List[Path], jobs: int = 1) -> None:
+        """
+        Parsea en un pool de procesos las carpetas que no están vigentes en la caché.
+        Los resultados se guardan en el orden de `folders`, así que lo que venga
+        después (get / all / save) es idéntico a la ejecución en serie.
+        """
+        jobs = resolve_jobs(jobs)
+        if jobs <= 1:
+            return
+        pendientes = [f for f in folders if f.name not in self._frescos and self._vigente(f) is None]
+        if len(pendientes) < 2:
+            return
+        chunksize = max(1, len(pendientes) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            for folder, meta in zip(pendientes, ex.map(build_folder_meta, pendientes, chunksize=chunksize)):
+                self._guardar(folder, meta)
+
+    def all(self, jobs: int = 1) -> Dict[str, Dict]:
+        """Metadatos de todas las carpetas route_*, en orden de nombre; descarta las que ya no existen."""
+        folders = sorted(p for p in self.data_dir.glob("route_*") if p.is_dir())
+        self.prefetch(folders, jobs)
+        out = {f.name: self.get(f) for f in folders}
+        if set(self.folders) - set(out):
+            self.folders = {k: v for k, v in self.folders.items() if k in out}
+            self._dirty = True
+        return out
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        payload = {"version": PARSER_VERSION, "folders": dict(sorted(self.folders.items()))}
+        escribir_atomico(self.path, json.dumps(payload, ensure_ascii=False))
+        self._dirty = False
+
+
+def resolve_jobs(jobs: int) -> int:
+    """--jobs: 0 = todos los núcleos, 1 = en serie."""
+    return (os.cpu_count() or 1) if jobs <= 0 else jobs
+
+
+def load_route_meta(data_dir: Path, cache_path: Optional[Path] = None, jobs: int = 1) -> Dict[str, Dict]:
+    """Atajo: metadatos de todas las carpetas, guardando la caché al terminar."""
+    cache = RouteMetaCache(data_dir, cache_path)
+    out = cache.all(jobs)
+    cache.save()
+    print(f"Metadatos WR: {cache.parsed} carpetas parseadas, {cache.reused} desde caché ({cache.path})")
+    return out
+
+
+# ==========================
+# CLI: equivalencia y benchmark del extractor
+# ==========================
+
+def _route_htmls(data_dir: Path) -> List[Path]:
+    return sorted(p / "route.html" for p in data_dir.glob("route_*") if (p / "route.html").is_file())
+
+
+# (title de route.json, empresa esperada): formatos reales de WikiRoutes
+_CASOS_TITULO = [
+    ("Ruta de autobús Lima - Trujillo (Ittsa Bus) en el mapa de Lima", "Ittsa Bus"),
+    ("Ruta de autobús Lima - Huancayo (Nazareno - Hidalgo Express) en el mapa de Lima",
+     "Nazareno - Hidalgo Express"),
+    ("Ruta de autobús Arequipa - Lima (Cruz del Sur) en el mapa de Arequipa", "Cruz del Sur"),
+    ("Ruta de autobús EO44 (Ricardo Palma - Callao) en el mapa de Ricardo Palma District", ""),
+    ("Ruta de autobús IM51 (Lima - Callao) en el mapa de Lima", ""),
+    ("Ruta de autobús Express (Mi Bus) en el mapa de Lima", ""),
+    ("Ruta de autobús EM40 en el mapa de Lima", ""),
+    ("", ""),
+]
+
+# Ficha sintética con 'Empresa:' entre las etiquetas que ya corta ITINERARIO_RE
+_FICHA_SINTETICA = (
+    "<html><body><h1>Ruta de autobús 1004</h1><div class='route-info'>"
+    "<p>Itinerario: Av. Túpac Amaru, Av. Abancay.</p>"
+    "<p>Empresa de transportes: <b>E.T. Translima S.A.</b></p>"
+    "<p>Fechas de operación: todos los días</p></div></body></html>"
+).encode("utf-8")
+
+
+def verificar_empresa() -> int:
+    """Casos fijos de empresa_from_title y de 'Empresa:' en una ficha sintética. Devuelve nº de fallos."""
+    fallos = [(t, esperado, empresa_from_title(t)) for t, esperado in _CASOS_TITULO
+              if empresa_from_title(t) != esperado]
+    for nombre, fn in (("eventos", parse_route_html), ("bs4", parse_route_html_bs)):
+        obtenido = fn(_FICHA_SINTETICA)["empresa"]
+        if obtenido != "E.T. Translima S.A.":
+            fallos.append((f"ficha sintética ({nombre})", "E.T. Translima S.A.", obtenido))
+    print(f"empresa: {len(_CASOS_TITULO)} titles + ficha sintética  fallos: {len(fallos)}")
+    for caso, esperado, obtenido in fallos:
+        print(f"  {caso!r}: esperado {esperado!r}, obtenido {obtenido!r}")
+    return len(fallos)
+
+
+def verificar_fixtures(fixtures_dir: Path = FIXTURES_DIR) -> int:
+    """
+    Ambos extractores sobre las páginas de fixtures/route_html contra esperado.json.
+    Devuelve nº de fallos; que falten las páginas también cuenta como fallo.
+    """
+    esperado_path = fixtures_dir / "esperado.json"
+    if not esperado_path.is_file():
+        print(f"fixtures: falta {esperado_path}")
+        return 1
+    esperados = json.loads(esperado_path.read_text(encoding="utf-8"))
+    fallos = []
+    for nombre, esperado in esperados.items():
+        path = fixtures_dir / nombre
+        if not path.is_file():
+            fallos.append((nombre, "falta el archivo"))
+            continue
+        raw = path.read_bytes()
+        for parser, fn in (("eventos", parse_route_html), ("bs4", parse_route_html_bs)):
+            obtenido = fn(raw)
+            campos = [k for k in esperado if obtenido.get(k) != esperado[k]]
+            if campos:
+                fallos.append((f"{nombre} ({parser})", ", ".join(campos)))
+    print(f"fixtures route.html: {len(esperados)}  fallos: {len(fallos)}")
+    for caso, detalle in fallos:
+        print(f"  {caso}: {detalle}")
+    return len(fallos) + (0 if esperados else 1)
+
+
+def verificar(data_dir: Path, mostrar: int = 10) -> int:
+    """Compara extractor por eventos vs BeautifulSoup en todo el corpus. Devuelve nº de diferencias."""
+    htmls = _route_htmls(data_dir)
+    difieren = []
+    for path in htmls:
+        raw = path.read_bytes()
+        a, b = parse_route_html(raw), parse_route_html_bs(raw)
+        if a != b:
+            difieren.append((path, [k for k in a if a[k] != b.get(k)]))
+    print(f"route.html verificados: {len(htmls)}  con diferencias: {len(difieren)}")
+    if not htmls:
+        print(f"  (no hay route.html en {data_dir}: solo cuentan las fixtures)")
+    for path, campos in difieren[:mostrar]:
+        print(f"  {path.parent.name}: {', '.join(campos)}")
+    return len(difieren)
+
+
+def bench(data_dir: Path, limite: int = 0) -> None:
+    """Tiempo de parseo por archivo: extractor por eventos vs BeautifulSoup."""
+    htmls = _route_htmls(data_dir)
+    if not htmls:
+        htmls = sorted(FIXTURES_DIR.glob("*.html"))
+        print(f"No hay route.html en {data_dir}: se miden las fixtures de {FIXTURES_DIR}")
+    if limite:
+        htmls = htmls[:limite]
+    if not htmls:
+        return
+    raws = [p.read_bytes() for p in htmls]
+    tiempos = {}
+    for nombre, fn in (("eventos", parse_route_html), ("bs4", parse_route_html_bs)):
+        ts = []
+        for raw in raws:
+            t0 = time.perf_counter()
+            fn(raw)
+            ts.append((time.perf_counter() - t0) * 1000)
+        tiempos[nombre] = ts
+    ts_sorted = {k: sorted(v) for k, v in tiempos.items()}
+    print(f"{len(raws)} archivos, {sum(map(len, raws)) / 1024 / 1024:.1f} MB")
+    print(f"  {'parser':<8} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'total s':>8}")
+    for k, v in ts_sorted.items():
+        print(f"  {k:<8} {statistics.mean(v):>9.2f} {v[len(v) // 2]:>8.2f} "
+              f"{v[min(len(v) - 1, int(.95 * len(v)))]:>8.2f} {sum(v) / 1000:>8.2f}")
+    print(f"  aceleración (total): {sum(tiempos['bs4']) / max(1e-9, sum(tiempos['eventos'])):.1f}x")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Caché de metadatos de rutas WikiRoutes")
+    ap.add_argument("--dir", default=str(Path(__file__).resolve().parents[3] / "data" / "processed" / "transporte"),
+                    help="Carpeta con las route_*")
+    ap.add_argument("--verificar", action="store_true",
+                    help="Casos fijos de empresa, fixtures de route.html y extractor por eventos "
+                         "vs BeautifulSoup en todo el corpus")
+    ap.add_argument("--bench", action="store_true", help="Tiempo de parseo por archivo de ambos extractores")
+    ap.add_argument("--limite", type=int, default=0, help="Con --bench, usa solo los primeros N archivos")
+    ap.add_argument("--jobs", type=int, default=1, help="Procesos para parsear carpetas (0 = todos los núcleos)")
+    args = ap.parse_args(argv)
+
+    data_dir = Path(args.dir)
+    if args.verificar:
+        if verificar_empresa() + verificar_fixtures() + verificar(data_dir):
+            raise SystemExit(1)
+    if args.bench:
+        bench(data_dir, args.limite)
+    if not (args.verificar or args.bench):
+        load_route_meta(data_dir, jobs=args.jobs)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])
@@ -3,11 +3,14 @@
 # Requisitos:
 #   pip install "selenium==4.*" webdriver-manager beautifulsoup4 requests
 
-import re, json, time, argparse
+import re, os, json, time, argparse, threading, queue
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs, urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
 from selenium import webdriver
@@ -15,34 +18,108 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
-DEFAULT_BASE = "https://wikiroutes.info"
+# WR_BASE_URL permite apuntar a otro host (p. ej. el servidor de wr_replay.py)
+DEFAULT_BASE = os.environ.get("WR_BASE_URL", "https://wikiroutes.info").rstrip("/")
 UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
 PAGE_TIMEOUT_S = 30
 
+# Pool de drivers: cuántos Chrome vivos y cada cuántas páginas se reciclan
+POOL_WORKERS = 2
+POOL_MAX_PAGES = 50
+
 SEL_MAP_ANY = ".leaflet-pane, #map, .leaflet-container"
 SEL_ROUTE_TITLE = "h1, .MEcFqLPlaQKg.RSZfWQHoH"
 SEL_CITY_LABEL  = ".vGyZhDoaGCm.khuKVSRut"
 
+# Perfil "lean": recursos que no aportan nada a las capas vectoriales y que
+# dominan el tiempo de carga (imágenes y teselas raster, fuentes, ads, analítica)
+DRIVER_PROFILES = ("lean", "full")
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*adservice.google.*", "*mc.yandex.ru*",
+    "*an.yandex.ru*", "*yandex.ru/ads*", "*adfox.ru*", "*facebook.net*",
+    "*connect.facebook.*", "*hotjar.com*",
+]
+
+ROBOTS_TTL_S = 3600
+ROBOTS_RETRY_S = 60   # si robots.txt no se pudo leer, se reintenta antes
+
+# Tiempos por fase de cada ruta (una línea JSON por ruta); --report los agrega
+METRICS_JSONL = Path(__file__).resolve().parents[2] / "cache" / "wr_scrape_metrics.jsonl"
+
+_session = None
+_session_lock = threading.Lock()
+
+def http_session() -> requests.Session:
+    """Sesión HTTP compartida por el proceso (keep-alive y pool de conexiones)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers["User-Agent"] = UA
+            _session = s
+        return _session
+
+def parse_robots_disallow(text: str):
+    dis = []
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        if line.lower().startswith("user-agent:"):
+            current = line.split(":", 1)[1].strip()
+        elif line.lower().startswith("disallow:") and (current == "*" or current == None):
+            dis.append(line.split(":", 1)[1].strip())
+    return [d for d in dis if d]
+
+class RobotsCache:
+    """Reglas Disallow por host, descargadas una vez y válidas durante `ttl` segundos."""
+
+    def __init__(self, ttl=ROBOTS_TTL_S):
+        self.ttl = ttl
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def disallow(self, base: str):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._rules.get(base)
+            if hit and now < hit[0]:
+                return hit[1]
+            ttl = self.ttl
+            try:
+                r = http_session().get(urljoin(base, "/robots.txt"), timeout=10)
+                rules = parse_robots_disallow(r.text) if r.status_code == 200 else []
+            except Exception:
+                rules = []
+                ttl = min(self.ttl, ROBOTS_RETRY_S)
+            self._rules[base] = (now + ttl, rules)
+            return rules
+
+    def allows(self, base: str, path: str) -> bool:
+        return not any(path.startswith(d) for d in self.disallow(base))
+
+ROBOTS = RobotsCache()
+
 def robots_allows(base: str, path: str) -> bool:
-    try:
-        r = requests.get(urljoin(base, "/robots.txt"), timeout=10)
-        if r.status_code != 200: return True
-        dis = []
-        current = None
-        for line in r.text.splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"): continue
-            if line.lower().startswith("user-agent:"):
-                current = line.split(":", 1)[1].strip()
-            elif line.lower().startswith("disallow:") and (current == "*" or current == None):
-                dis.append(line.split(":", 1)[1].strip())
-        return not any(path.startswith(d) for d in dis if d)
-    except Exception:
-        return True
+    return ROBOTS.allows(base, path)
 
-def make_driver(headless=True, lang="es-ES"):
+@lru_cache(maxsize=1)
+def chromedriver_path() -> str:
+    """Resuelve chromedriver una sola vez por proceso (evita el lookup de webdriver-manager por ruta)."""
+    return ChromeDriverManager().install()
+
+def make_driver(headless=True, lang="es-ES", perf_log=False, profile="lean"):
+    if profile not in DRIVER_PROFILES:
+        raise ValueError(f"profile debe ser uno de {DRIVER_PROFILES}")
     opts = webdriver.ChromeOptions()
     if headless:
         opts.add_argument("--headless=new")
@@ -54,47 +131,194 @@ def make_driver(headless=True, lang="es-ES"):
     opts.add_argument(f"--lang={lang}")
     opts.add_experimental_option("excludeSwitches", ["enable-automation"])
     opts.add_experimental_option("useAutomationExtension", False)
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=opts)
+    if profile == "lean":
+        opts.add_argument("--blink-settings=imagesEnabled=false")
+        opts.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+    if perf_log:
+        # Log de DevTools (eventos Network.*) para el modo de extracción "network"
+        opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    driver = webdriver.Chrome(service=Service(chromedriver_path()), options=opts)
     driver.set_page_load_timeout(PAGE_TIMEOUT_S)
+    driver.set_script_timeout(PAGE_TIMEOUT_S + 5)
+    if profile == "lean":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": LEAN_BLOCKED_URLS})
     return driver
 
+def reset_driver(driver):
+    """Limpia cookies y storage del sitio y deja la pestaña en blanco para la siguiente ruta."""
+    driver.delete_all_cookies()
+    driver.execute_script("try{localStorage.clear();sessionStorage.clear();}catch(e){}")
+    driver.get("about:blank")
+
+class DriverPool:
+    """
+    Pool de drivers headless de larga vida que comparten las rutas scrapeadas.
+    - size: máximo de drivers vivos a la vez (uno por worker)
+    - max_pages: páginas que sirve un driver antes de reciclarlo
+    Un driver que falló durante una ruta se descarta y se crea otro cuando haga falta.
+    """
+
+    def __init__(self, size=POOL_WORKERS, headless=True, lang="es-ES", max_pages=POOL_MAX_PAGES, perf_log=False,
+                 profile="lean"):
+        self.size = max(1, int(size))
+        self.headless = headless
+        self.lang = lang
+        self.perf_log = perf_log
+        self.profile = profile
+        self.max_pages = max(1, int(max_pages))
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    return self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            d = make_driver(headless=self.headless, lang=self.lang, perf_log=self.perf_log,
+                            profile=self.profile)
+            with self._lock:
+                self._pages[id(d)] = 0
+            return d
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver, broken=False):
+        try:
+            with self._lock:
+                pages = self._pages.get(id(driver), 0) + 1
+                self._pages[id(driver)] = pages
+            recycle = broken or self._closed or pages >= self.max_pages
+            if not recycle:
+                try:
+                    reset_driver(driver)
+                except Exception:
+                    recycle = True
+            if recycle:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self):
+        d = self.acquire()
+        try:
+            yield d
+        except BaseException:
+            self.release(d, broken=True)
+            raise
+        self.release(d)
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def _single_use_driver(headless=True, perf_log=False, profile="lean"):
+    d = make_driver(headless=headless, perf_log=perf_log, profile=profile)
+    try:
+        yield d
+    finally:
+        d.quit()
+
+# Prelude común: localiza el mapa Leaflet una sola vez por página (cacheado en
+# window.__wrMap) y engancha layeradd/layerremove para contar cambios de polilíneas.
+JS_MAP_PRELUDE = """
+function __wrIsLine(l){
+  return typeof L!=='undefined' && l instanceof L.Polyline && !(l instanceof L.Polygon);
+}
+function __wrFindMap(){
+  var m = window.__wrMap;
+  if (m && typeof m.eachLayer==='function') return m;
+  for (var k in window){
+    try{
+      var v=window[k];
+      if (v && typeof v.eachLayer==='function' && typeof v.getCenter==='function'){
+        window.__wrMap=v; return v;
+      }
+    }catch(e){}
+  }
+  return null;
+}
+function __wrWatch(map){
+  if (!map || map.__wrWatched) return;
+  map.__wrWatched = true;
+  window.__wrLayerEpoch = window.__wrLayerEpoch || 0;
+  var bump = function(e){
+    try{ if (__wrIsLine(e.layer)) window.__wrLayerEpoch++; }catch(err){}
+  };
+  map.on('layeradd', bump);
+  map.on('layerremove', bump);
+}
+function __wrCountLines(map){
+  var n=0;
+  map.eachLayer(function(l){ try{ if (__wrIsLine(l)) n++; }catch(e){} });
+  return n;
+}
+"""
+
 def wait_map_ready(driver):
     WebDriverWait(driver, PAGE_TIMEOUT_S).until(
         EC.presence_of_element_located((By.CSS_SELECTOR, SEL_MAP_ANY))
     )
-    # Espera a que aparezca al menos 1 polyline en alguna instancia de Leaflet
-    def has_lines(drv):
-        js = """
-        return (function(){
-          var map=null;
-          for (var k in window){
-            try{
-              var v=window[k];
-              if (v && typeof v.eachLayer==='function' && typeof v.getCenter==='function'){
-                map=v; break;
-              }
-            }catch(e){}
-          }
-          if(!map) return 0;
-          var n=0;
-          map.eachLayer(function(l){
-            try{
-              if (typeof L!=='undefined' && l instanceof L.Polyline && !(l instanceof L.Polygon)){ n++; }
-            }catch(e){}
-          });
-          return n;
-        })();
-        """
-        try:
-            n = drv.execute_script(js)
-            return int(n) > 0
-        except Exception:
-            return False
-    WebDriverWait(driver, PAGE_TIMEOUT_S).until(lambda d: has_lines(d))
+    # Espera (dentro del navegador) a que el mapa exista y tenga al menos 1 polyline
+    js = JS_MAP_PRELUDE + """
+    var done = arguments[arguments.length-1];
+    var deadline = Date.now() + arguments[0];
+    (function waitMap(){
+      var map = __wrFindMap();
+      if (!map){
+        if (Date.now() > deadline) return done(0);
+        return setTimeout(waitMap, 100);
+      }
+      __wrWatch(map);
+      if (__wrCountLines(map) > 0) return done(1);
+      var guard = setTimeout(function(){ map.off('layeradd', onAdd); done(0); },
+                             Math.max(0, deadline - Date.now()));
+      function onAdd(e){
+        if (!__wrIsLine(e.layer)) return;
+        clearTimeout(guard); map.off('layeradd', onAdd); done(1);
+      }
+      map.on('layeradd', onAdd);
+    })();
+    """
+    ok = driver.execute_async_script(js, PAGE_TIMEOUT_S * 1000)
+    if not ok:
+        raise TimeoutException("El mapa no mostró polilíneas a tiempo")
 
 def leaflet_layers_signature(driver):
     """Devuelve una firma ligera del conjunto de polilíneas visibles para detectar cambios."""
-    js = """
+    js = JS_MAP_PRELUDE + """
     return (function(){
       function flattenLatLngs(arr, out){
         if (!arr) return;
@@ -106,20 +330,12 @@ def leaflet_layers_signature(driver):
           for (var j=0;j<arr.length;j++) flattenLatLngs(arr[j], out);
         }
       }
-      var map=null;
-      for (var k in window){
-        try{
-          var v=window[k];
-          if (v && typeof v.eachLayer==='function' && typeof v.getCenter==='function'){
-            map=v; break;
-          }
-        }catch(e){}
-      }
+      var map=__wrFindMap();
       if(!map) return "";
       var sigs=[];
       map.eachLayer(function(l){
         try{
-          if (typeof L!=='undefined' && l instanceof L.Polyline && !(l instanceof L.Polygon)){
+          if (__wrIsLine(l)){
             var ll=[]; flattenLatLngs(l.getLatLngs(), ll);
             var n = ll.length;
             var a = ll[0], b = ll[n-1];
@@ -139,17 +355,58 @@ def leaflet_layers_signature(driver):
     except Exception:
         return ""
 
-def wait_layers_changed(driver, previous_sig, timeout=15):
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        sig = leaflet_layers_signature(driver)
-        if sig and sig != previous_sig:
-            return sig
-        time.sleep(0.4)
-    return previous_sig  # no cambió, devolvemos la anterior
+def layer_epoch(driver) -> int:
+    """Contador de altas/bajas de polilíneas en el mapa (instala el listener si falta)."""
+    js = JS_MAP_PRELUDE + """
+    var map = __wrFindMap();
+    if (!map) return -1;
+    __wrWatch(map);
+    return window.__wrLayerEpoch;
+    """
+    try:
+        return int(driver.execute_script(js))
+    except Exception:
+        return -1
+
+def wait_layers_changed(driver, previous_epoch, timeout=15, quiet_ms=150):
+    """
+    Espera a que el mapa cambie de viaje: resuelve cuando hubo eventos layeradd/layerremove
+    de polilíneas desde `previous_epoch` y luego `quiet_ms` sin eventos nuevos (el swap
+    quita unas capas y añade otras). Devuelve el epoch final; si vence `timeout`, el actual.
+    """
+    js = JS_MAP_PRELUDE + """
+    var prev = arguments[0], quiet = arguments[1], timeoutMs = arguments[2];
+    var done = arguments[arguments.length-1];
+    var map = __wrFindMap();
+    if (!map) return done(prev);
+    __wrWatch(map);
+    var timer = null, finished = false;
+    function finish(){
+      if (finished) return;
+      finished = true;
+      clearTimeout(timer); clearTimeout(guard);
+      map.off('layeradd', onEv); map.off('layerremove', onEv);
+      done(window.__wrLayerEpoch);
+    }
+    function arm(){
+      clearTimeout(timer);
+      timer = setTimeout(function(){
+        if (__wrCountLines(map) > 0) finish(); else arm();
+      }, quiet);
+    }
+    function onEv(e){ if (__wrIsLine(e.layer)) arm(); }
+    var guard = setTimeout(finish, timeoutMs);
+    map.on('layeradd', onEv);
+    map.on('layerremove', onEv);
+    if (window.__wrLayerEpoch !== prev) arm();
+    """
+    try:
+        return int(driver.execute_async_script(js, previous_epoch, quiet_ms, int(timeout * 1000)))
+    except Exception:
+        return previous_epoch
 
 def grab_leaflet_layers(driver):
-    js = """
+    js = JS_MAP_PRELUDE + """
     return (function(){
       function convLatLng(ll){
         if (Array.isArray(ll)){
@@ -164,20 +421,12 @@ def grab_leaflet_layers(driver):
         return null;
       }
       var out = {lines:[], points:[]};
-      var map=null;
-      for (var k in window){
-        try{
-          var v=window[k];
-          if (v && typeof v.eachLayer==='function' && typeof v.getCenter==='function'){
-            map=v; break;
-          }
-        }catch(e){}
-      }
+      var map=__wrFindMap();
       if(!map) return out;
 
       map.eachLayer(function(l){
         try{
-          if (typeof L!=='undefined' && l instanceof L.Polyline && !(l instanceof L.Polygon)){
+          if (__wrIsLine(l)){
             var coords  = convLatLng(l.getLatLngs());
             if (!Array.isArray(coords) || coords.length===0) return;
             var segments = (coords.length && typeof coords[0][0] === 'number') ? [coords] : coords;
@@ -199,6 +448,209 @@ def grab_leaflet_layers(driver):
     """
     return driver.execute_script(js)
 
+# ---------- Modo "network": geometrías leídas del tráfico XHR vía log de DevTools ----------
+
+EXTRACT_MODES = ("leaflet", "network")
+
+# Segundos sin respuestas XHR nuevas tras la primera con líneas para dar la carga por terminada
+NETWORK_QUIET_S = 2.0
+
+# Claves que, en un payload JSON, agrupan geometrías por viaje (ida/vuelta)
+TRIP_KEYS = ("trip", "trip_id", "tripId", "trip_seq", "tripSeq", "direction", "direction_id")
+STOP_HINT_KEYS = ("name", "title", "stop_id", "stopId", "station")
+
+def drain_performance_log(driver):
+    try:
+        return driver.get_log("performance")
+    except Exception:
+        return []
+
+def network_json_responses(entries):
+    """De las entradas del log devuelve [(request_id, url)] de respuestas XHR/Fetch con JSON."""
+    out = []
+    for e in entries:
+        try:
+            msg = json.loads(e["message"])["message"]
+        except Exception:
+            continue
+        if msg.get("method") != "Network.responseReceived":
+            continue
+        p = msg.get("params", {})
+        resp = p.get("response", {})
+        mime = (resp.get("mimeType") or "").lower()
+        if p.get("type") in ("XHR", "Fetch") or "json" in mime:
+            out.append((p.get("requestId"), resp.get("url", "")))
+    return out
+
+def response_json(driver, request_id):
+    try:
+        body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+    except Exception:
+        return None
+    text = body.get("body") or ""
+    if body.get("base64Encoded"):
+        import base64
+        try:
+            text = base64.b64decode(text).decode("utf-8", errors="ignore")
+        except Exception:
+            return None
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+def _is_num(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def _pair_to_lnglat(a, b):
+    # Misma heurística que el front (fixIfLatLon): en Lima |lat| < |lng|
+    return [b, a] if abs(a) < abs(b) else [a, b]
+
+def _as_coord(v):
+    if isinstance(v, (list, tuple)) and len(v) >= 2 and _is_num(v[0]) and _is_num(v[1]):
+        return _pair_to_lnglat(v[0], v[1])
+    if isinstance(v, dict):
+        lat = v.get("lat", v.get("latitude"))
+        lng = v.get("lng", v.get("lon", v.get("longitude")))
+        if _is_num(lat) and _is_num(lng):
+            return [lng, lat]
+    return None
+
+def geometries_from_payload(obj):
+    """
+    Recorre un payload JSON y devuelve {trip_label: {"lines": [...], "points": [...]}} con
+    el mismo formato que grab_leaflet_layers. Reconoce geometrías GeoJSON, listas de pares
+    [lat, lng] y listas de objetos {lat, lng}. Las etiquetas de viaje salen de TRIP_KEYS;
+    sin etiqueta todo cae en None.
+    """
+    trips = {}
+
+    def bucket(label):
+        return trips.setdefault(label, {"lines": [], "points": []})
+
+    def add_line(coords, label, color=None, weight=None):
+        if len(coords) >= 2:
+            bucket(label)["lines"].append({"color": color, "weight": weight, "segments": [coords]})
+
+    def walk(v, label, color):
+        if isinstance(v, dict):
+            for k in TRIP_KEYS:
+                if k in v and isinstance(v[k], (str, int)) and not isinstance(v[k], bool):
+                    label = str(v[k])
+                    break
+            color = v.get("color") or v.get("stroke") or color
+            gtype = v.get("type")
+            coords = v.get("coordinates")
+            if gtype == "LineString" and isinstance(coords, list):
+                add_line([c[:2] for c in coords if _as_coord(c)], label, color)
+                return
+            if gtype == "MultiLineString" and isinstance(coords, list):
+                for seg in coords:
+                    add_line([c[:2] for c in seg if _as_coord(c)], label, color)
+                return
+            if gtype == "Point" and isinstance(coords, list) and len(coords) >= 2:
+                bucket(label)["points"].append(coords[:2])
+                return
+            for k, sub in v.items():
+                walk(sub, label, color)
+            return
+        if isinstance(v, list) and v:
+            coords = [_as_coord(x) for x in v]
+            if all(c is not None for c in coords):
+                if all(isinstance(x, dict) and any(h in x for h in STOP_HINT_KEYS) for x in v):
+                    bucket(label)["points"].extend(coords)
+                elif len(coords) >= 2:
+                    add_line(coords, label, color)
+                return
+            for sub in v:
+                walk(sub, label, color)
+
+    walk(obj, None, None)
+    return trips
+
+def wait_network_geometries(driver, esperados=1, timeout=PAGE_TIMEOUT_S, quieto=NETWORK_QUIET_S):
+    """
+    Lee del log de rendimiento las respuestas JSON de la página y devuelve
+    {trip_label: {"lines", "points"}} (en orden de llegada) con los viajes que traen
+    líneas. Espera (sin tocar el DOM) hasta tener `esperados` viajes con etiqueta,
+    hasta que pasan `quieto` segundos sin respuestas nuevas después de la primera
+    con líneas (rutas que cargan cada viaje en su propio XHR), o hasta `timeout`.
+    """
+    seen = set()
+    merged = {}
+    order = []
+    t0 = time.time()
+    ultima = t0
+    while True:
+        for rid, _url in network_json_responses(drain_performance_log(driver)):
+            if rid in seen:
+                continue
+            seen.add(rid)
+            ultima = time.time()
+            payload = response_json(driver, rid)
+            if payload is None:
+                continue
+            for label, layers in geometries_from_payload(payload).items():
+                if label not in merged:
+                    merged[label] = {"lines": [], "points": []}
+                    order.append(label)
+                merged[label]["lines"].extend(layers["lines"])
+                merged[label]["points"].extend(layers["points"])
+        con_lineas = [l for l in order if merged[l]["lines"]]
+        ahora = time.time()
+        if len([l for l in con_lineas if l is not None]) >= esperados:
+            break
+        if con_lineas and ahora - ultima > quieto:
+            break
+        if ahora - t0 > timeout:
+            break
+        time.sleep(0.25)
+    return {l: merged[l] for l in order if merged[l]["lines"]}
+
+def _trip_id_norm(v):
+    """'trip2', 'trip-2', ' 2 ' -> '2'; ids no numéricos quedan en minúsculas."""
+    v = str(v).strip().lower()
+    m = re.fullmatch(r"trip[-_ ]?(\w+)", v)
+    return m.group(1) if m else v
+
+def trip_toggle_ids(el):
+    """Ids con los que un toggle de viaje puede aparecer en los XHR (data-tab-toggle, trip-seq, ...)."""
+    ids = set()
+    for attr in ("data-tab-toggle", "trip-seq", "data-trip-seq", "data-trip-id", "trip-id"):
+        try:
+            v = el.get_attribute(attr)
+        except Exception:
+            v = None
+        if v and v.strip():
+            ids.add(_trip_id_norm(v))
+    return ids
+
+def match_network_trips(buckets, toggle_ids):
+    """
+    Empareja cada toggle (en orden) con el bucket de XHR cuya etiqueta de viaje coincide
+    con alguno de sus ids. Devuelve la lista de viajes o None si algún toggle queda sin
+    bucket, sobra algún bucket o hay ambigüedad; en ese caso se usa leaflet.
+    Sin toggles solo vale un único bucket.
+    """
+    if not toggle_ids:
+        return list(buckets.values()) if len(buckets) == 1 else None
+    if len(buckets) != len(toggle_ids):
+        return None
+    by_id = {}
+    for label, layers in buckets.items():
+        if label is None:
+            return None
+        by_id.setdefault(_trip_id_norm(label), []).append(layers)
+    trips = []
+    used = set()
+    for ids in toggle_ids:
+        hits = [i for i in ids if i in by_id]
+        if len(hits) != 1 or len(by_id[hits[0]]) != 1 or hits[0] in used:
+            return None
+        used.add(hits[0])
+        trips.append(by_id[hits[0]][0])
+    return trips
+
 def meta_from_html(html, url):
     soup = BeautifulSoup(html, "html.parser")
     title = soup.select_one(SEL_ROUTE_TITLE)
@@ -257,100 +709,268 @@ def find_trip_toggles(driver):
     return ordered
 
 def click_element_js(driver, el):
-    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-    time.sleep(0.2)
-    driver.execute_script("arguments[0].click();", el)
+    driver.execute_script("arguments[0].scrollIntoView({block:'center'}); arguments[0].click();", el)
+
+def extract_leaflet(d, toggles, crono=None):
+    """Lee los viajes de las capas Leaflet, haciendo clic en cada toggle de viaje."""
+    crono = crono or Cronometro()
+    with crono.fase("grab", trip=1):
+        trips = [grab_leaflet_layers(d)]
+    if toggles:
+        epoch = layer_epoch(d)
+        for idx in range(1, len(toggles)):
+            with crono.fase("toggle", trip=idx + 1):
+                try:
+                    click_element_js(d, toggles[idx])
+                except Exception:
+                    # reintento simple
+                    click_element_js(d, toggles[idx])
+
+            with crono.fase("wait_layers", trip=idx + 1):
+                epoch = wait_layers_changed(d, epoch, timeout=15)
+            with crono.fase("grab", trip=idx + 1):
+                trips.append(grab_leaflet_layers(d))
+    return trips
+
+def save_trips(out_dir: Path, trips, has_toggles: bool):
+    """Escribe route_track*/stops* con el mismo esquema para ambos modos de extracción."""
+    all_lines = []
+    all_points = []
+    if not has_toggles:
+        # Un solo trazado (como antes)
+        layers0 = trips[0] if trips else {}
+        save_geojson_lines(out_dir, layers0.get("lines", []))
+        if layers0.get("points"):
+            save_geojson_points(out_dir, layers0["points"])
+        all_lines.extend(layers0.get("lines", []))
+        all_points.extend(layers0.get("points", []))
+        return all_lines, all_points
+
+    for idx, layersN in enumerate(trips):
+        suffix = f"_trip{idx+1}"
+        save_geojson_lines(out_dir, layersN.get("lines", []), suffix=suffix)
+        if layersN.get("points"):
+            save_geojson_points(out_dir, layersN["points"], suffix=suffix)
+        all_lines.extend(layersN.get("lines", []))
+        all_points.extend(layersN.get("points", []))
+
+    # Al final, escribe también los combinados estándar para tu front
+    save_geojson_lines(out_dir, all_lines, suffix="")  # route_track.geojson
+    if all_points:
+        save_geojson_points(out_dir, all_points, suffix="")  # stops_from_map.geojson
+    return all_lines, all_points
+
+class Cronometro:
+    """Acumula (fase, segundos) de una ruta; escribir() añade una línea al JSONL de métricas."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, url: str = "", mode: str = ""):
+        self.url = url
+        self.mode = mode
+        self.route_id = None
+        self.error = None
+        self.fases = []
+        self.t0 = time.perf_counter()
+
+    @contextmanager
+    def fase(self, nombre: str, **extra):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nombre, time.perf_counter() - t0, **extra)
+
+    def registrar(self, nombre: str, segundos: float, **extra):
+        self.fases.append({"fase": nombre, "s": round(segundos, 4), **extra})
+
+    def registro(self):
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": self.url,
+            "route_id": self.route_id,
+            "mode": self.mode,
+            "ok": self.error is None,
+            "error": self.error,
+            "total_s": round(time.perf_counter() - self.t0, 4),
+            "fases": self.fases,
+        }
+
+    def escribir(self, path: Path):
+        line = json.dumps(self.registro(), ensure_ascii=False) + "\n"
+        with Cronometro._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line)
 
-def scrape_route(url: str, out_root: Path, headless=True) -> Path:
+def scrape_route(url: str, out_root: Path, headless=True, pool: DriverPool = None, mode: str = "leaflet",
+                 metrics: Path = METRICS_JSONL, profile: str = "lean") -> Path:
+    """
+    Scrapea una ruta. Si se pasa `pool`, toma prestado un driver en vez de abrir Chrome.
+    mode="network" lee las geometrías de las respuestas XHR (requiere drivers con
+    perf_log=True); cada viaje se empareja con su toggle por id (ver match_network_trips)
+    y si no cuadran con los viajes de la página, cae al modo "leaflet". `profile` solo
+    aplica al driver de un solo uso (sin `pool`).
+    Los tiempos de cada fase se añaden a `metrics` (None para no registrarlos).
+    """
+    if mode not in EXTRACT_MODES:
+        raise ValueError(f"mode debe ser uno de {EXTRACT_MODES}")
+    if mode == "network" and pool is not None and not pool.perf_log:
+        # Sin log de rendimiento no llega ningún XHR y se esperaría el timeout entero
+        raise ValueError('mode="network" requiere un DriverPool creado con perf_log=True')
     base = f"{urlparse(url).scheme}://{urlparse(url).netloc}"
     if not robots_allows(base, urlparse(url).path):
         raise RuntimeError("Robots.txt no permite scrapear esta ruta")
 
-    d = make_driver(headless=headless)
+    crono = Cronometro(url, mode)
     try:
-        d.get(url)
-        wait_map_ready(d)
-
-        html = d.page_source
-        meta = meta_from_html(html, url)
-        rid = meta.get("route_id") or re.sub(r"[^A-Za-z0-9_-]+","_", meta.get("title") or "ruta")
-
-        out_dir = out_root / f"route_{rid}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        (out_dir/"route.html").write_text(html, encoding="utf-8", errors="ignore")
-        (out_dir/"route.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
-
-        # Acumuladores combinados
-        all_lines = []
-        all_points = []
-
-        # Detectar toggles de viajes
-        toggles = find_trip_toggles(d)
-        if not toggles:
-            # Un solo trazado (como antes)
-            layers0 = grab_leaflet_layers(d)
-            save_geojson_lines(out_dir, layers0.get("lines", []))
-            if layers0.get("points"):
-                save_geojson_points(out_dir, layers0["points"])
-            all_lines.extend(layers0.get("lines", []))
-            all_points.extend(layers0.get("points", []))
+        if pool is not None:
+            lease = pool.driver()
         else:
-            # Recorremos todos los viajes (ida/vuelta)
-            # 1) El primero ya está activo
-            sig_prev = leaflet_layers_signature(d)
-            layers1 = grab_leaflet_layers(d)
-            save_geojson_lines(out_dir, layers1.get("lines", []), suffix="_trip1")
-            if layers1.get("points"):
-                save_geojson_points(out_dir, layers1["points"], suffix="_trip1")
-            all_lines.extend(layers1.get("lines", []))
-            all_points.extend(layers1.get("points", []))
-
-            # 2) Para los siguientes, clic + espera a cambio y lee
-            for idx in range(1, len(toggles)):
-                try:
-                    click_element_js(d, toggles[idx])
-                except Exception:
-                    # reintento simple
-                    time.sleep(0.5)
-                    click_element_js(d, toggles[idx])
+            lease = _single_use_driver(headless=headless, perf_log=(mode == "network"), profile=profile)
+        t_acquire = time.perf_counter()
+        with lease as d:
+            crono.registrar("acquire", time.perf_counter() - t_acquire)
+            if mode == "network":
+                drain_performance_log(d)
+                with crono.fase("get"):
+                    d.get(url)
+                with crono.fase("wait_map_dom"):
+                    WebDriverWait(d, PAGE_TIMEOUT_S).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, SEL_MAP_ANY))
+                    )
+                with crono.fase("find_toggles"):
+                    toggles = find_trip_toggles(d)
+                with crono.fase("network_wait"):
+                    net_trips = wait_network_geometries(d, esperados=max(1, len(toggles)))
+            else:
+                with crono.fase("get"):
+                    d.get(url)
+                with crono.fase("wait_map_ready"):
+                    wait_map_ready(d)
 
-                sig_prev = wait_layers_changed(d, sig_prev, timeout=15)
-                layersN = grab_leaflet_layers(d)
-                suffix = f"_trip{idx+1}"
-                save_geojson_lines(out_dir, layersN.get("lines", []), suffix=suffix)
-                if layersN.get("points"):
-                    save_geojson_points(out_dir, layersN["points"], suffix=suffix)
-                all_lines.extend(layersN.get("lines", []))
-                all_points.extend(layersN.get("points", []))
+            with crono.fase("html"):
+                html = d.page_source
+                meta = meta_from_html(html, url)
+            rid = meta.get("route_id") or re.sub(r"[^A-Za-z0-9_-]+","_", meta.get("title") or "ruta")
+            crono.route_id = rid
 
-            # Al final, escribe también los combinados estándar para tu front
-            save_geojson_lines(out_dir, all_lines, suffix="")  # route_track.geojson
-            if all_points:
-                save_geojson_points(out_dir, all_points, suffix="")  # stops_from_map.geojson
+            out_dir = out_root / f"route_{rid}"
+            with crono.fase("write_html"):
+                out_dir.mkdir(parents=True, exist_ok=True)
+                (out_dir/"route.html").write_text(html, encoding="utf-8", errors="ignore")
+                (out_dir/"route.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+            # Detectar toggles de viajes (en modo network ya se buscaron para saber cuántos esperar)
+            if mode != "network":
+                with crono.fase("find_toggles"):
+                    toggles = find_trip_toggles(d)
+            used = mode
+            trips = None
+            if mode == "network":
+                trips = match_network_trips(net_trips, [trip_toggle_ids(t) for t in toggles])
+            if trips is None:
+                if mode == "network":
+                    print(f"[WARN] modo network: viajes en XHR {list(net_trips)} no cuadran con "
+                          f"{len(toggles)} toggle(s); se usa leaflet")
+                    with crono.fase("wait_map_ready"):
+                        wait_map_ready(d)
+                    used = "leaflet"
+                trips = extract_leaflet(d, toggles, crono)
+
+        with crono.fase("write_geojson"):
+            all_lines, all_points = save_trips(out_dir, trips, bool(toggles))
 
         # Resumen
         summary = {
             "route_folder": str(out_dir),
             "trips_detected": max(1, len(toggles)),
             "line_segments_total": sum(len(x.get("segments", [])) for x in all_lines),
-            "points_total": len(all_points)
+            "points_total": len(all_points),
+            "extract_mode": used
         }
         (out_dir/"summary.json").write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
         print(json.dumps(summary, ensure_ascii=False, indent=2))
         return out_dir
+    except Exception as e:
+        crono.error = f"{type(e).__name__}: {e}"
+        raise
     finally:
-        d.quit()
+        if metrics is not None:
+            try:
+                crono.escribir(Path(metrics))
+            except Exception as e:
+                print(f"[WARN] no se pudieron escribir métricas: {e}")
+
+def _percentil(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))] if vals else 0.0
+
+def report_metrics(path: Path, top: int = 10):
+    """Agrega el JSONL de métricas: p50/p95/max por fase y las rutas más lentas."""
+    recs = []
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                recs.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    if not recs:
+        print(f"Sin métricas en {path}")
+        return
+
+    por_fase, suma_fase = {}, {}
+    for r in recs:
+        for f in r.get("fases", []):
+            por_fase.setdefault(f["fase"], []).append(f["s"])
+            suma_fase[f["fase"]] = suma_fase.get(f["fase"], 0.0) + f["s"]
+    totales = [r["total_s"] for r in recs]
+    tiempo_total = sum(totales) or 1.0
+    fallidas = sum(1 for r in recs if not r.get("ok"))
+
+    print(f"{len(recs)} rutas ({fallidas} fallidas) en {path}")
+    print(f"  {'fase':<15} {'n':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8} {'% total':>8}")
+    for nombre, vals in sorted(por_fase.items(), key=lambda kv: -suma_fase[kv[0]]):
+        print(f"  {nombre:<15} {len(vals):>6} {_percentil(vals, .5):>8.2f} {_percentil(vals, .95):>8.2f} "
+              f"{max(vals):>8.2f} {100 * suma_fase[nombre] / tiempo_total:>7.1f}%")
+    print(f"  {'(ruta)':<15} {len(totales):>6} {_percentil(totales, .5):>8.2f} {_percentil(totales, .95):>8.2f} "
+          f"{max(totales):>8.2f}")
+
+    print("Rutas más lentas")
+    for r in sorted(recs, key=lambda r: -r["total_s"])[:top]:
+        peor = max(r.get("fases") or [{"fase": "-", "s": 0}], key=lambda f: f["s"])
+        estado = "ok" if r.get("ok") else f"ERROR {r.get('error')}"
+        print(f"  {r['total_s']:>7.2f}s  {r.get('route_id') or '-':<10} fase más lenta {peor['fase']} "
+              f"({peor['s']:.2f}s)  {estado}  {r['url']}")
 
 # CLI
 def main(argv=None):
     ap = argparse.ArgumentParser(description="Leaflet grabber para rutas de WikiRoutes (ambos sentidos)")
-    ap.add_argument("--url", required=True)
+    ap.add_argument("--url", nargs="+")
     ap.add_argument("--out", default="data/raw/wikiroutes")
     ap.add_argument("--headless", type=int, default=0)
+    ap.add_argument("--max-pages", type=int, default=POOL_MAX_PAGES,
+                    help="Páginas por driver antes de reciclarlo")
+    ap.add_argument("--mode", choices=EXTRACT_MODES, default="leaflet",
+                    help="leaflet: lee capas del mapa; network: lee los XHR vía log de DevTools")
+    ap.add_argument("--profile", choices=DRIVER_PROFILES, default="lean",
+                    help="lean: bloquea imágenes, fuentes, ads y analítica; full: página completa")
+    ap.add_argument("--metrics", default=str(METRICS_JSONL), help="JSONL con los tiempos por fase de cada ruta")
+    ap.add_argument("--report", action="store_true", help="Agrega --metrics (p50/p95/max por fase) y sale")
+    ap.add_argument("--top", type=int, default=10, help="Rutas más lentas a listar con --report")
     args = ap.parse_args(argv)
 
+    if args.report:
+        report_metrics(Path(args.metrics), top=args.top)
+        return
+    if not args.url:
+        ap.error("--url es obligatorio salvo con --report")
+
     out_root = Path(args.out); out_root.mkdir(parents=True, exist_ok=True)
-    scrape_route(args.url, out_root, headless=bool(args.headless))
+    with DriverPool(size=1, headless=bool(args.headless), max_pages=args.max_pages,
+                    perf_log=(args.mode == "network"), profile=args.profile) as pool:
+        for url in args.url:
+            scrape_route(url, out_root, pool=pool, mode=args.mode, metrics=Path(args.metrics))
 
 if __name__ == "__main__":
     import sys
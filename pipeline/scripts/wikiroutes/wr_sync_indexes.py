@@ -2,20 +2,20 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
 import json
+import time
 import re
 from collections import Counter
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Optional, Tuple, List
 
-try:
-    from bs4 import BeautifulSoup
-except ImportError as e:
-    raise SystemExit(
-        "Falta dependencia: beautifulsoup4\n"
-        "Instala con: pip install beautifulsoup4"
-    ) from e
+from wr_route_meta import RouteMetaCache, endpoints_of
+from wr_journal import escribir_atomico
+
+# Versión del formato del manifiesto de --mode incremental
+MANIFEST_VERSION = 2
 
 
 HEX_RE = re.compile(r"^#[0-9A-Fa-f]{6}$")
@@ -114,52 +114,6 @@ def extract_display_id(route_title: str) -> Optional[str]:
     return nums[0]
 
 
-def simplify_stop_name(name: str) -> str:
-    s = " ".join((name or "").split())
-    if " - " in s:
-        s = s.split(" - ", 1)[0].strip()
-    return s
-
-
-def extract_trip_endpoints_from_html(route_html_path: Path) -> Dict[int, Tuple[str, str]]:
-    if not route_html_path.exists():
-        return {}
-
-    html = route_html_path.read_text(encoding="utf-8", errors="replace")
-    soup = BeautifulSoup(html, "html.parser")
-
-    endpoints: Dict[int, Tuple[str, str]] = {}
-    trip_divs = soup.find_all(attrs={"trip-seq": True})
-
-    for d in trip_divs:
-        seq_raw = (d.get("trip-seq") or "").strip()
-        if not seq_raw.isdigit():
-            continue
-
-        seq = int(seq_raw)
-        text = " ".join(d.get_text(" ", strip=True).split())
-        if "→" not in text:
-            continue
-
-        left, right = text.split("→", 1)
-        start = simplify_stop_name(left.strip())
-        end = simplify_stop_name(right.strip())
-
-        if start and end:
-            endpoints[seq] = (start, end)
-
-    return endpoints
-
-
-def detect_trips(folder: Path) -> List[int]:
-    trips = []
-    if (folder / "route_track_trip1.geojson").exists():
-        trips.append(1)
-    if (folder / "route_track_trip2.geojson").exists():
-        trips.append(2)
-    return trips
-
-
 def stable_route_key_sort(k: str) -> Tuple[str, int, int, str]:
     """
     Orden estable:
@@ -200,12 +154,209 @@ def find_repo_root(start: Path) -> Optional[Path]:
     return None
 
 
+@dataclass
+class SyncContexto:
+    ROOT: Path
+    lista: Dict[str, ListaRutaRow]
+    lista_by_codigo_antiguo: Dict[str, ListaRutaRow]
+    existing_overrides: Dict
+
+
+def _endpoints_dump(endpoints: Dict[int, Tuple[str, str]]) -> Dict:
+    return {str(k): {"start": v[0], "end": v[1]} for k, v in endpoints.items()}
+
+
+def derive_folder(folder: Path, meta: Dict, ctx: SyncContexto) -> Dict:
+    """
+    Todo lo que una carpeta aporta a los índices, sin mirar las demás:
+    display_id, color, nombres por trip, contadores y entradas de los dumps.
+    Es JSON serializable para guardarlo en el manifiesto del modo incremental.
+    """
+    rec: Dict = {"folder": folder.name, "folder_rel": folder.resolve().relative_to(ctx.ROOT).as_posix(),
+                 "route_id": meta["route_id"], "skip": None, "stats": [],
+                 "no_display": None, "unmatched": None}
+
+    if not meta["has_route_json"]:
+        rec["skip"] = "skip_missing_route_json"
+        rec["stats"].append("skip_missing_route_json")
+        return rec
+
+    route_id = meta["route_id"]
+    title = meta["title"]
+
+    trips = meta["trips"]
+    if not trips:
+        rec["skip"] = "skip_no_trip_files"
+        rec["stats"].append("skip_no_trip_files")
+        return rec
+
+    endpoints = endpoints_of(meta)
+
+    display_id = extract_display_id(title)
+    display_id_source = "title"
+
+    # Respetar override manual si existe para esta carpeta o route_id
+    _ovr = ctx.existing_overrides.get(folder.name) or (ctx.existing_overrides.get(route_id) if route_id else None)
+    lookup_id = display_id or route_id
+    if _ovr and _ovr.get("display_id"):
+        display_id = _ovr["display_id"]
+        display_id_source = "override"
+
+    if not display_id:
+        # Fallback: nunca descartamos por esto. Usamos route_id para que "exista" en wr_map.
+        display_id = route_id or folder.name
+        display_id_source = "route_id_fallback"
+        rec["stats"].append("fallback_display_id_used")
+
+        rec["no_display"] = {
+            "folder": folder.name,
+            "folder_rel": rec["folder_rel"],
+            "route_id": route_id,
+            "display_id": display_id,
+            "display_id_source": display_id_source,
+            "title": title,
+            "title_numbers_all": re.findall(r"\d+", title),
+            "trips_detected": trips,
+            "has_route_html": meta["has_route_html"],
+            "endpoints_from_html": _endpoints_dump(endpoints),
+        }
+
+    # Primero intentamos matchear display_id como codigo_nuevo
+    lr = ctx.lista.get(lookup_id) or ctx.lista.get(display_id)
+
+    # Si no hay match directo por codigo_nuevo, probar como codigo_antiguo (solo numérico)
+    if lr is None:
+        normalized = (lookup_id or "").strip()
+        if normalized.isdigit():
+            lr_alt = ctx.lista_by_codigo_antiguo.get(normalized)
+            if lr_alt is not None:
+                if lr_alt.codigo_nuevo and lr_alt.codigo_nuevo != display_id:
+                    rec["stats"].append("display_id_from_codigo_antiguo")
+                    display_id = lr_alt.codigo_nuevo
+                    display_id_source = f"{display_id_source}+from_codigo_antiguo"
+                lr = lr_alt
+
+    if lr is None:
+        rec["stats"].append("unmatched_lista_rutas")
+        rec["unmatched"] = {
+            "folder": folder.name,
+            "folder_rel": rec["folder_rel"],
+            "route_id": route_id,
+            "display_id": display_id,
+            "display_id_source": display_id_source,
+            "title": title,
+            "title_numbers_all": re.findall(r"\d+", title),
+            "trips_detected": trips,
+            "endpoints_from_html": _endpoints_dump(endpoints),
+        }
+
+    color = safe_hex(lr.color_hex) if lr else None
+    if not color:
+        color = "#888888"
+
+    def fallback_name_pair() -> Tuple[str, str]:
+        if lr and lr.distrito_origen and lr.distrito_destino:
+            return (lr.distrito_origen, lr.distrito_destino)
+        return ("Origen", "Destino")
+
+    names: Dict[str, str] = {}
+    if 1 in trips:
+        start1, end1 = endpoints.get(1, fallback_name_pair())
+        names["1"] = f"{display_id} · {start1} → {end1}"
+
+    if 2 in trips:
+        if 2 in endpoints:
+            start2, end2 = endpoints[2]
+        elif 1 in endpoints:
+            s1, e1 = endpoints[1]
+            start2, end2 = e1, s1
+        else:
+            s1, e1 = fallback_name_pair()
+            start2, end2 = e1, s1
+        names["2"] = f"{display_id} · {start2} → {end2}"
+
+    rec.update({"display_id": display_id, "color": color, "names": names})
+    rec["stats"].append("ok_folders")
+    return rec
+
+
+def merge_folder(rec: Dict, routes_out: Dict[str, Dict], overrides_out: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Escribe la carpeta en wr_map / wr_overrides y devuelve las keys y overrides que generó."""
+    produced: Dict = {"keys": [], "overrides": {}}
+    if rec["skip"]:
+        return produced
+
+    folder_rel = rec["folder_rel"]
+    route_id = rec["route_id"]
+    display_id = rec["display_id"]
+    color = rec["color"]
+
+    # Colisión de keys (por si se repite display_id): añadimos sufijo route_id
+    def _route_key(base: str, side: str) -> str:
+        k = f"{base}-{side}"
+        if k in routes_out and routes_out[k].get("folder") != folder_rel:
+            return f"{base}_{route_id}-{side}" if route_id else f"{base}_{rec['folder']}-{side}"
+        return k
+
+    for trip, side in ((1, "ida"), (2, "vuelta")):
+        name = rec["names"].get(str(trip))
+        if name is None:
+            continue
+        key = _route_key(display_id, side)
+        routes_out[key] = {"folder": folder_rel, "trip": trip, "color": color, "name": name}
+        produced["keys"].append(key)
+
+    base_name = None
+    # Intentar usar el name de ida, aunque exista colisión, buscamos cualquier key que termine en -ida
+    for k in (f"{display_id}-ida", f"{display_id}_{route_id}-ida" if route_id else ""):
+        if k and k in routes_out:
+            base_name = routes_out[k].get("name")
+            break
+    if not base_name:
+        base_name = f"{display_id} · Ruta"
+
+    produced["overrides"][rec["folder"]] = {"display_id": display_id, "color": color, "name": base_name}
+    if route_id:
+        produced["overrides"][route_id] = {"display_id": display_id, "color": color}
+    overrides_out.update(produced["overrides"])
+    return produced
+
+
+def _sha1_json(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def folder_fingerprint(meta: Dict, overrides: Dict, folder_name: str) -> str:
+    """
+    Huella de lo que determina la salida de una carpeta: contenido de route.json y
+    route.html, trips presentes y sus entradas en wr_overrides.json (por nombre de
+    carpeta y por route_id), para que una edición del override la re-derive.
+    """
+    files = meta.get("_files") or {}
+    route_id = meta.get("route_id") or ""
+    return _sha1_json({
+        "files": {k: (v or {}).get("sha1") for k, v in files.items()},
+        "trips": meta.get("trips"),
+        "override_folder": overrides.get(folder_name),
+        "override_route": overrides.get(route_id) if route_id else None,
+    })
+
+
+def file_sha1(path: Path) -> str:
+    return hashlib.sha1(path.read_bytes()).hexdigest() if path.exists() else ""
+
+
 def parse_args():
     p = argparse.ArgumentParser(description="Sincroniza wr_map.json y wr_overrides.json desde rutas descargadas.")
     p.add_argument("--root", type=str, default="", help="Ruta a la carpeta base del proyecto (Rutas).")
-    p.add_argument("--mode", choices=["overwrite", "merge"], default="overwrite",
-                   help="Si es merge, mantiene entries existentes en wr_map/wr_overrides.")
+    p.add_argument("--mode", choices=["overwrite", "merge", "incremental"], default="overwrite",
+                   help="merge: mantiene entries existentes en wr_map/wr_overrides. "
+                        "incremental: solo re-deriva carpetas nuevas, cambiadas o borradas según el manifiesto.")
+    p.add_argument("--manifest", type=str, default="pipeline/cache/wr_sync_manifest.json",
+                   help="Ruta (relativa al ROOT) del manifiesto por carpeta que usa --mode incremental.")
     p.add_argument("--verbose", action="store_true")
+    p.add_argument("--jobs", type=int, default=1,
+                   help="Procesos para parsear las carpetas route_* (0 = todos los núcleos). La salida es idéntica a --jobs 1.")
     p.add_argument("--max-ok", type=int, default=80)
     p.add_argument("--max-skip", type=int, default=120)
 
@@ -300,162 +451,120 @@ def main() -> None:
     routes_out: Dict[str, Dict] = dict(wr_map.get("routes", {}))
     overrides_out: Dict[str, Dict] = dict(wr_overrides)
 
+    t0 = time.perf_counter()
     folders = sorted([p for p in OUT_ROOT.glob("route_*") if p.is_dir()])
     print(f"Folders route_* detectados: {len(folders)}")
+    meta_cache = RouteMetaCache(OUT_ROOT)
+
+    ctx = SyncContexto(ROOT, lista, lista_by_codigo_antiguo, existing_overrides)
+    manifest_path = (ROOT / args.manifest).resolve()
+    lista_hash = file_sha1(LISTA_RUTAS_CSV)
+
+    # Manifiesto previo: solo sirve si es del mismo formato y con la misma lista_rutas.csv
+    previous: Dict[str, Dict] = {}
+    incremental = args.mode == "incremental"
+    if incremental:
+        try:
+            man = read_json(manifest_path) if manifest_path.exists() else {}
+        except Exception:
+            man = {}
+        if man.get("version") == MANIFEST_VERSION and man.get("lista_hash") == lista_hash:
+            previous = man.get("folders", {})
+            routes_out = dict(read_json(WR_MAP_JSON).get("routes", {})) if WR_MAP_JSON.exists() else {}
+        else:
+            print("Manifiesto ausente o desactualizado: se reconstruye todo (como overwrite)")
+            incremental = False
 
     stats = Counter()
-    ok_list = []
-    skip_list = []
+    manifest_folders: Dict[str, Dict] = {}
+    metas: Dict[str, Dict] = {}
+
+    if incremental:
+        # Clasificar carpetas con solo stat() vía la caché de metadatos
+        current = {f.name: f for f in folders}
+        metas = {name: meta_cache.get(f) for name, f in current.items()}
+        fps = {name: folder_fingerprint(metas[name], existing_overrides, name) for name in current}
+        added = [n for n in current if n not in previous]
+        changed = [n for n in current if n in previous and previous[n]["fp"] != fps[n]]
+        deleted = [n for n in previous if n not in current]
+        stats["incremental_added"] = len(added)
+        stats["incremental_changed"] = len(changed)
+        stats["incremental_deleted"] = len(deleted)
+
+        # Las keys con display_id repetido dependen del orden ("1004-ida" es de la primera
+        # carpeta, las demás llevan "_<route_id>"), así que se vuelve a fusionar en orden
+        # todo el grupo de cada display_id que aparece, cambia o desaparece
+        rederive = set(added) | set(changed)
+        records = {name: derive_folder(current[name], metas[name], ctx) for name in sorted(rederive)}
+        touched_ids = {rec.get("display_id") for rec in records.values()}
+        touched_ids |= {previous[n]["record"].get("display_id") for n in changed + deleted}
+        touched_ids.discard(None)
+        remerge = rederive | {n for n in current if n in previous
+                              and previous[n]["record"].get("display_id") in touched_ids}
+        stats["incremental_remerged"] = len(remerge - rederive)
+
+        # Quitar lo que producían las carpetas a re-fusionar o borradas
+        for name in sorted(remerge | set(deleted)):
+            old = previous.get(name)
+            if old is None:
+                continue
+            for k in old.get("keys", []):
+                if k in routes_out and routes_out[k].get("folder") == old["record"]["folder_rel"]:
+                    del routes_out[k]
+
+        for folder in folders:
+            name = folder.name
+            if name in remerge:
+                rec = records[name] if name in records else previous[name]["record"]
+                produced = merge_folder(rec, routes_out, {})
+                manifest_folders[name] = {"record": rec, **produced}
+            else:
+                manifest_folders[name] = previous[name]
 
-    # Casos donde no se pudo sacar display_id del title (se usará fallback route_id)
+        # wr_overrides.json como en overwrite: solo lo que generan las carpetas, en orden
+        overrides_out = {}
+        for name in sorted(manifest_folders):
+            overrides_out.update(manifest_folders[name].get("overrides", {}))
+    else:
+        meta_cache.prefetch(folders, jobs=args.jobs)
+        for folder in folders:
+            meta = metas[folder.name] = meta_cache.get(folder)
+            rec = derive_folder(folder, meta, ctx)
+            produced = merge_folder(rec, routes_out, overrides_out)
+            manifest_folders[folder.name] = {"record": rec, **produced}
+
+    # Huellas con los overrides que se usaron para derivar: si esta corrida los cambia
+    # (p. ej. la primera vez que se escribe un display_id), la próxima re-deriva esas carpetas
+    for name, entry in manifest_folders.items():
+        entry["fp"] = folder_fingerprint(metas[name], existing_overrides, name)
+
+    # Contadores y dumps salen de los registros de todas las carpetas, en orden
     no_display_id_dump: List[Dict] = []
-
-    # Casos donde display_id existe pero no está en lista_rutas.csv
     unmatched_lista_dump: List[Dict] = []
-
-    for folder in folders:
+    for name in sorted(manifest_folders):
+        rec = manifest_folders[name]["record"]
         stats["folders_total"] += 1
+        stats.update(rec.get("stats", []))
+        if rec.get("no_display"):
+            no_display_id_dump.append(rec["no_display"])
+        if rec.get("unmatched"):
+            unmatched_lista_dump.append(rec["unmatched"])
 
-        route_json_path = folder / "route.json"
-        route_html_path = folder / "route.html"
-
-        if not route_json_path.exists():
-            stats["skip_missing_route_json"] += 1
-            if len(skip_list) < args.max_skip:
-                skip_list.append((folder.name, "missing route.json", ""))
-            continue
-
-        rj = read_json(route_json_path)
-        route_id = str((rj.get("route_id") or "")).strip()
-        title = str((rj.get("title") or "")).strip()
-
-        trips = detect_trips(folder)
-        if not trips:
-            stats["skip_no_trip_files"] += 1
-            if len(skip_list) < args.max_skip:
-                skip_list.append((folder.name, "no route_track_trip*.geojson", ""))
-            continue
-
-        endpoints = extract_trip_endpoints_from_html(route_html_path)
-
-        display_id = extract_display_id(title)
-        display_id_source = "title"
-
-        # Respetar override manual si existe para esta carpeta o route_id
-        _ovr = existing_overrides.get(folder.name) or (existing_overrides.get(route_id) if route_id else None)
-        lookup_id = display_id or route_id
-        if _ovr and _ovr.get("display_id"):
-            display_id = _ovr["display_id"]
-            display_id_source = "override"
-
-        if not display_id:
-            # Fallback: nunca descartamos por esto. Usamos route_id para que "exista" en wr_map.
-            display_id = route_id or folder.name
-            display_id_source = "route_id_fallback"
-            stats["fallback_display_id_used"] += 1
-
-            no_display_id_dump.append({
-                "folder": folder.name,
-                "folder_rel": folder.resolve().relative_to(ROOT).as_posix(),
-                "route_id": route_id,
-                "display_id": display_id,
-                "display_id_source": display_id_source,
-                "title": title,
-                "title_numbers_all": re.findall(r"\d+", title),
-                "trips_detected": trips,
-                "has_route_html": route_html_path.exists(),
-                "endpoints_from_html": {str(k): {"start": v[0], "end": v[1]} for k, v in endpoints.items()},
-            })
-
-        # Primero intentamos matchear display_id como codigo_nuevo
-        lr = lista.get(lookup_id) or lista.get(display_id)
-
-        # Si no hay match directo por codigo_nuevo, probar como codigo_antiguo (solo numérico)
-        if lr is None:
-            normalized = (lookup_id or "").strip()
-            if normalized.isdigit():
-                lr_alt = lista_by_codigo_antiguo.get(normalized)
-                if lr_alt is not None:
-                    if lr_alt.codigo_nuevo and lr_alt.codigo_nuevo != display_id:
-                        stats["display_id_from_codigo_antiguo"] += 1
-                        display_id = lr_alt.codigo_nuevo
-                        display_id_source = f"{display_id_source}+from_codigo_antiguo"
-                    lr = lr_alt
-
-        if lr is None:
-            stats["unmatched_lista_rutas"] += 1
-            unmatched_lista_dump.append({
-                "folder": folder.name,
-                "folder_rel": folder.resolve().relative_to(ROOT).as_posix(),
-                "route_id": route_id,
-                "display_id": display_id,
-                "display_id_source": display_id_source,
-                "title": title,
-                "title_numbers_all": re.findall(r"\d+", title),
-                "trips_detected": trips,
-                "endpoints_from_html": {str(k): {"start": v[0], "end": v[1]} for k, v in endpoints.items()},
-            })
-
-        color = safe_hex(lr.color_hex) if lr else None
-        if not color:
-            color = "#888888"
-
-        def fallback_name_pair() -> Tuple[str, str]:
-            if lr and lr.distrito_origen and lr.distrito_destino:
-                return (lr.distrito_origen, lr.distrito_destino)
-            return ("Origen", "Destino")
-
-        folder_rel = folder.resolve().relative_to(ROOT).as_posix()
-
-        # Colisión de keys (por si se repite display_id): añadimos sufijo route_id
-        def _route_key(base: str, side: str) -> str:
-            k = f"{base}-{side}"
-            if k in routes_out and routes_out[k].get("folder") != folder_rel:
-                return f"{base}_{route_id}-{side}" if route_id else f"{base}_{folder.name}-{side}"
-            return k
-
-        if 1 in trips:
-            start1, end1 = endpoints.get(1, fallback_name_pair())
-            name1 = f"{display_id} · {start1} → {end1}"
-            key1 = _route_key(display_id, "ida")
-            routes_out[key1] = {"folder": folder_rel, "trip": 1, "color": color, "name": name1}
-
-        if 2 in trips:
-            if 2 in endpoints:
-                start2, end2 = endpoints[2]
-            elif 1 in endpoints:
-                s1, e1 = endpoints[1]
-                start2, end2 = e1, s1
-            else:
-                s1, e1 = fallback_name_pair()
-                start2, end2 = e1, s1
-
-            name2 = f"{display_id} · {start2} → {end2}"
-            key2 = _route_key(display_id, "vuelta")
-            routes_out[key2] = {"folder": folder_rel, "trip": 2, "color": color, "name": name2}
-
-        base_name = None
-        # Intentar usar el name de ida, aunque exista colisión, buscamos cualquier key que termine en -ida
-        for k in (f"{display_id}-ida", f"{display_id}_{route_id}-ida" if route_id else ""):
-            if k and k in routes_out:
-                base_name = routes_out[k].get("name")
-                break
-        if not base_name:
-            base_name = f"{display_id} · Ruta"
-
-        overrides_out[folder.name] = {"display_id": display_id, "color": color, "name": base_name}
-        if route_id:
-            overrides_out[route_id] = {"display_id": display_id, "color": color}
-
-        stats["ok_folders"] += 1
-        if len(ok_list) < args.max_ok:
-            ok_list.append((folder.name, route_id, display_id, trips, title[:140]))
+    meta_cache.save()
+    stats["meta_parsed"] = meta_cache.parsed
+    stats["meta_from_cache"] = meta_cache.reused
 
     ordered_keys = sorted(routes_out.keys(), key=stable_route_key_sort)
     wr_map_final = {"routes": {k: routes_out[k] for k in ordered_keys}}
 
     write_json(WR_MAP_JSON, wr_map_final)
     write_json(WR_OVERRIDES_JSON, overrides_out)
+    escribir_atomico(manifest_path, json.dumps({
+        "version": MANIFEST_VERSION,
+        "lista_hash": lista_hash,
+        "folders": dict(sorted(manifest_folders.items())),
+    }, ensure_ascii=False))
+    stats["ms_total"] = int((time.perf_counter() - t0) * 1000)
 
     print("")
     print("Resumen:")
@@ -467,6 +576,11 @@ def main() -> None:
         "fallback_display_id_used",
         "display_id_from_codigo_antiguo",
         "unmatched_lista_rutas",
+        "meta_parsed",
+        "meta_from_cache",
+    ] + (["incremental_added", "incremental_changed", "incremental_deleted",
+          "incremental_remerged"] if incremental else []) + [
+        "ms_total",
     ]:
         print(f"  {k}: {stats.get(k, 0)}")
 